@@ -6,9 +6,10 @@
 
 import re
 import logging
-logging.basicConfig(format='%(levelname)s %(pathname)s %(lineno)s:%(message)s', level=logging.DEBUG)
-#logging.basicConfig(format='%(levelname)s %(filename)s %(lineno)s:%(message)s', level=logging.DEBUG)
+# Debug output is off unless a tracer is installed, see locator.tracing
 logger = logging.getLogger(__name__)
+from locator import tracing
+from locator import profiling
 
 
 from itertools import zip_longest
@@ -48,11 +49,13 @@ def remove_chars(line, remove_chars, to_string=b''):
     '''Remove a list of chars from a line
     replacing with empty string by default or passed in variable
     .'''
+    tracer = tracing.get_tracer()
     for character in (remove_chars):
         m = re.search(character, line)
         if m:
             line = re.sub(character, to_string, line)
-            logger.debug(b"Replaced [%s] with [%s] in input", character, to_string)
+            if tracer is not None:
+                tracer.replace(character, to_string)
     return line
 
 
@@ -66,6 +69,187 @@ def translate_chars(line, mapping):
     return line
 
 
+# Spans clean_line() removes around the REMOVE_CHARS and MAPPING passes.
+# \x07I32/\x07I33 run up to the next I32/I33 or the end of the line, SO/SI
+# (\x0E..\x0F) and \xa8..\xad stop at the first closing char (or a literal
+# | or $, the character class has always read that way).
+I32_I33_SPAN = b'\x07I3[23].+?(?=\x07I3[23]|$)'
+SHIFT_SPAN = b'\x0E.+?[\x0F|$]'
+XA8_SPAN = b'\xa8.+?[\xad|$]'
+
+# kinds of match the normalizer can make
+_LEADING, _SPAN, _REMOVE, _TRANSLATE = range(4)
+
+
+class _Scanner(object):
+    '''One compiled alternation over a list of (pattern, replacement, kind,
+    earlier) stages, tried in the order the chained passes used to run.
+    '''
+
+    # bytes either side of a removal that are re-scanned for new matches
+    window = 16
+
+    def __init__(self, stages):
+        self.stages = []
+        for pattern, replacement, kind, earlier in stages:
+            self.stages.append((re.compile(pattern), replacement, kind,
+                                re.compile(earlier) if earlier else None))
+        # No capturing groups, so re can skip ahead on the set of first bytes
+        # instead of trying every alternative at every position.
+        self.pattern = re.compile(
+            b'|'.join(b'(?:' + stage[0] + b')' for stage in stages))
+        # short matched text -> stage, e.g. b'\x19' -> the \x19 translation
+        self._known = {}
+
+    def stage(self, line, found):
+        '''Which stage made the match: the first one that matches at the same
+        place and to the same end.'''
+        text = found.group()
+        stage = self._known.get(text)
+        if stage is None:
+            start, end = found.span()
+            for stage in self.stages:
+                m = stage[0].match(line, start)
+                if m and m.end() == end:
+                    break
+            if len(text) <= 4 and stage[2] in (_REMOVE, _TRANSLATE):
+                self._known[text] = stage
+        return stage
+
+    def scan(self, line):
+        '''Return the rewritten line, or None if the single scan can not
+        promise the same result as the chained passes.
+        '''
+        pieces = []
+        last = 0
+        removed_to = -1
+        for found in self.pattern.finditer(line):
+            _, replacement, kind, earlier = self.stage(line, found)
+            start, end = found.span()
+            if kind != _TRANSLATE:
+                if start == removed_to:
+                    # two removals back to back, a later pass could have
+                    # matched across both
+                    return None
+                if kind == _SPAN:
+                    # an earlier pass would have removed part of the span
+                    # before it was looked for
+                    inside = earlier.search(line, start + 1)
+                    if inside and inside.start() < end:
+                        return None
+                if start:
+                    if kind == _LEADING or self._joins(line, end, pieces, line[last:start]):
+                        return None
+                removed_to = end
+            pieces.append(line[last:start])
+            pieces.append(replacement)
+            last = end
+        if not last:
+            return line
+        pieces.append(line[last:])
+        return b''.join(pieces)
+
+    def _joins(self, line, end, pieces, before):
+        '''True if closing the gap left by a removal ending at end creates a
+        match that spans it.'''
+        tail = before
+        for piece in reversed(pieces):
+            if len(tail) >= self.window:
+                break
+            tail = piece + tail
+        tail = tail[-self.window:]
+        window = tail + line[end:end + self.window]
+        for position in range(len(tail)):
+            found = self.pattern.match(window, position)
+            if found and found.end() > len(tail):
+                return True
+        return False
+
+
+class LineNormalizer(object):
+    '''Compiled replacement for the chained passes of clean_line() and
+    remove_chars(line, REMOVE_CHARS).
+
+    clean_line() ran the I32/I33 strip, SO/SI removal, one re.sub() per
+    REMOVE_CHARS entry, one per MAPPING key and the \xa8..\xad strip, copying
+    the line each time.  Here all of those patterns are folded into a single
+    alternation built once, in the order the passes ran, and the line is
+    rebuilt in one scan.
+
+    The chained passes can interact: a removal can join its neighbours into a
+    new match for a later pass (b'\xff\xac09' ends up as an ndash) and a span
+    can contain bytes an earlier pass removed first.  The scan checks for
+    those cases and hands such lines to the chained passes, so the output is
+    byte for byte what the passes produce.
+
+    normalizer = LineNormalizer(REMOVE_CHARS, MAPPING)
+    normalizer(line)          # clean_line(line)
+    normalizer.remove(line)   # remove_chars(line, REMOVE_CHARS)
+
+    The scans are compiled the first time a line is cleaned (or by
+    compile()), not when the normalizer is made, so importing locator stays
+    quick.
+    '''
+    # attributes compile() sets
+    _scans = ('_clean', '_remove', 'fused')
+
+    def __init__(self, remove=REMOVE_CHARS, mapping=MAPPING):
+        self.remove_chars = list(remove)
+        self.mapping = dict(mapping)
+
+    def __getattr__(self, name):
+        if name not in LineNormalizer._scans:
+            raise AttributeError(name)
+        self.compile()
+        return self.__dict__[name]
+
+    def compile(self):
+        '''Build the scans now rather than on the first line.'''
+        removals = b'|'.join(self.remove_chars)
+        leading = (I32_I33_SPAN, b'', _LEADING, None)
+        shift = (SHIFT_SPAN, b'', _SPAN, b'\x07I3[23]')
+        xa8 = (XA8_SPAN, b'', _SPAN,
+               b'|'.join([b'\x07I3[23]', b'\x0E', removals]))
+        removes = [(pattern, b'', _REMOVE, None) for pattern in self.remove_chars]
+        translates = [(k, v, _TRANSLATE, None) for k, v in self.mapping.items()]
+        self._clean = _Scanner([leading, shift] + removes + translates + [xa8])
+        self._remove = _Scanner(removes)
+        # A replacement could itself start a match for a later MAPPING key or
+        # end a \xa8 span, in which case only the chained passes are exact.
+        special = set(b''.join(self.mapping) + b'\xa8\xad|$\n')
+        self.fused = not any(special.intersection(v) for v in self.mapping.values())
+
+    def __call__(self, line):
+        '''clean and translate a line'''
+        cleaned = None
+        if self.fused:
+            cleaned = self._clean.scan(line)
+        if cleaned is None:
+            cleaned = self.chained(line)
+        return cleaned
+
+    def remove(self, line):
+        '''remove REMOVE_CHARS from the line'''
+        cleaned = self._remove.scan(line)
+        if cleaned is None:
+            cleaned = remove_chars(line, self.remove_chars)
+        return cleaned
+
+    def chained(self, full_line):
+        '''The original pass by pass clean_line().'''
+        full_line = re.sub(I32_I33_SPAN, b'', full_line)
+        # remove SO->SI 14-15
+        full_line = re.sub(SHIFT_SPAN, b'', full_line)
+        full_line = remove_chars(full_line, self.remove_chars)  # remove bad chars
+        full_line = translate_chars(full_line, self.mapping)   # tab to space
+        # remove stuff between \xa8 and \xad e.g.g: b'\xa8D382\xad'
+        full_line = re.sub(XA8_SPAN, b'', full_line)
+        return full_line
+
+
+NORMALIZER = LineNormalizer(REMOVE_CHARS, MAPPING)
+
+
 def find_page(data):
     '''I90.*\{(D\d+)\}
     '''
@@ -74,30 +258,32 @@ def find_page(data):
     m = re.match(b'\x07I90.+?\{(D\d+)\}', data)
     if m:
         page = m.group(1)
-    logger.debug("find_page->(%s)", page)
+    tracer = tracing.get_tracer()
+    if tracer is not None:
+        tracer.page(page)
     return page, m
 
+LOCATOR_PATTERN = re.compile(b'\x07(?P<locator>I67H|I66F|T\d?|g\d{0,3}|[a-su-zA-SU-Z]\d{0,2})')
+
 def find_locators(line):
     '''given a line return a regex match for locator codes in the line.
     match.start gives position start,  match.end gives position end
     match.group('locator') gives the locator code without the Bell
     '''
     code = None
-    m = re.finditer(b'\x07(?P<locator>I67H|I66F|T\d?|g\d{0,3}|[a-su-zA-SU-Z]\d{0,2})', line)
+    m = LOCATOR_PATTERN.finditer(line)
     if m:
         code = m
     return code
 
+#ESCAPE_PATTERN = re.compile(b'(?P<replace>\w)?\xff(?P<esc>\w{2,3})')
+ESCAPE_PATTERN = re.compile(b'(?P<replace>.?)\xff(?P<esc>AE\d|AF\d|0\d|\dA|E\d)')
+
 def find_escape(line, current_grid=b'G1'):
     ''' Escape sequences usually replace a preceding char, like an accented
     e in resume or in foreign accented chars.
     '''
-    code = None
-    #m = re.finditer(b'(?P<replace>\w)?\xff(?P<esc>\w{2,3})', line)
-    m = re.finditer(b'(?P<replace>.?)\xff(?P<esc>AE\d|AF\d|0\d|\dA|E\d)', line)
-    if m:
-        code = m
-    return code
+    return ESCAPE_PATTERN.finditer(line)
 
 def translate_locator(locator, grid=b'G2',
                       locator_table=None,
@@ -119,6 +305,118 @@ def translate_locator(locator, grid=b'G2',
         return {'start':'', 'end':'', 'grid':grid }
 
 
+def encode_fragment(fragment):
+    '''The utf-8 bytes output() writes for a start/end fragment,
+    bytes are taken to be latin1.'''
+    if not fragment:
+        return b''
+    if isinstance(fragment, bytes):
+        return fragment.decode('latin1').encode('utf-8')
+    return fragment.encode('utf-8')
+
+
+class CompiledAction(dict):
+    '''A LOCATOR_TABLE/FONT_TABLE action as found in a DispatchTable.
+    Still reads (and compares) like the action dictionary, with the start and
+    end html already encoded and the grid to hand.
+    Compiled actions are shared by every parse, so they are read only.
+    '''
+    __slots__ = ('start_bytes', 'end_bytes', 'grid')
+
+    def __init__(self, action):
+        dict.__init__(self, action)
+        self.start_bytes = encode_fragment(action.get('start'))
+        self.end_bytes = encode_fragment(action.get('end'))
+        self.grid = action.get('grid')
+
+    def __reduce__(self):
+        return (CompiledAction, (dict(self),))
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("compiled actions are shared, use dict(action) for a copy")
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+class DispatchTable(dict):
+    '''(grid, locator code) -> CompiledAction, the same action
+    translate_locator() finds in locator_table and font_table.
+    Codes in neither table get one shared blank action per grid.
+    Pairs outside the tables are worked out the first time they are seen.
+    '''
+
+    def __init__(self, locator_table=None, font_table=None):
+        self.locator_table = locator_table or {}
+        self.font_table = font_table or {}
+        self.fallbacks = {}
+        compiled = {}
+        grids = set(self.font_table)
+        for action in self.locator_table.values():
+            grids.add(action.get('grid'))
+        for grid in grids:
+            codes = list(self.locator_table) + list(self.font_table.get(grid) or ())
+            for code in codes:
+                action = self.lookup(code, grid)
+                if action:
+                    if id(action) not in compiled:
+                        compiled[id(action)] = CompiledAction(action)
+                    self[grid, code] = compiled[id(action)]
+
+    def lookup(self, locator, grid):
+        '''The table entry for locator in grid, or None'''
+        action = self.locator_table.get(locator)
+        if not action:
+            font_grid = self.font_table.get(grid)
+            if font_grid:
+                action = font_grid.get(locator)
+        return action
+
+    def key_of(self, action):
+        '''A (grid, locator) key that gives action, None if there is none.'''
+        for key, value in self.items():
+            if value is action:
+                return key
+
+    def fallback(self, grid):
+        '''The blank action for codes not in the tables.'''
+        action = self.fallbacks.get(grid)
+        if action is None:
+            action = self.fallbacks[grid] = CompiledAction(
+                {'start': '', 'end': '', 'grid': grid})
+        return action
+
+    def __missing__(self, key):
+        grid, locator = key
+        action = self.lookup(locator, grid)
+        if action:
+            action = CompiledAction(action)
+        else:
+            action = self.fallback(grid)
+        self[key] = action
+        return action
+
+
+_DISPATCH_TABLES = {}
+
+def compile_tables(locator_table, font_table):
+    '''The DispatchTable for a locator_table and font_table, compiled once
+    and kept for as long as both tables are in use.  Tables are not expected
+    to change once compiled.
+    '''
+    key = (id(locator_table), id(font_table))
+    compiled = _DISPATCH_TABLES.get(key)
+    if compiled is None or compiled[0] is not locator_table or compiled[1] is not font_table:
+        if len(_DISPATCH_TABLES) > 64:
+            _DISPATCH_TABLES.clear()
+        compiled = _DISPATCH_TABLES[key] = (
+            locator_table, font_table, DispatchTable(locator_table, font_table))
+    table = compiled[2]
+    return table
+
+
+import io
+import os
 import sys
 def output(input_line, prefix=None, postfix=None, outf=sys.stdout):
     ''' Print output to filehandle outf or sys.stdout if no filehandle
@@ -131,6 +429,9 @@ def output(input_line, prefix=None, postfix=None, outf=sys.stdout):
 
 def _output(input_line, prefix=None, postfix=None, outf=sys.stdout):
     #logger.debug("[%s] %s [%s]", prefix, input_line, postfix)
+    if isinstance(outf, OutputSink):
+        outf.output(input_line, prefix, postfix)
+        return
     if isinstance(input_line, bytes):
         line = input_line.decode('latin1').encode('utf-8')
     else:
@@ -153,6 +454,151 @@ def _output(input_line, prefix=None, postfix=None, outf=sys.stdout):
             else:
                 outf.write (postfix)
 
+# bytes an OutputSink collects before writing them out
+OUTPUT_BUFFER_SIZE = 256 * 1024
+
+class OutputSink(object):
+    '''Buffered writer for the converted html, output() without the
+    per fragment codec round trips and small writes.
+
+    Text from the input is latin1 bytes, markup (the start/end html of the
+    tables) is utf-8 bytes.  Both are collected as bytes: a run of input text
+    is converted once when the buffer is flushed, ascii markup simply joins
+    the run, and ascii only runs going to a binary target are not converted
+    at all.  The target gets one write per buffer_size bytes.
+
+    outf can be a text stream (StringIO, sys.stdout), a binary stream or an
+    int file descriptor.  Call flush() when done.
+
+        sink = OutputSink(outf)
+        sink.text(line)                 # latin1 input bytes
+        sink.markup(action.start_bytes) # utf-8 bytes
+        sink.flush()
+
+    process_lines() writes actions with start()/end() and the rest of a
+    line with escaped(), a locator.tokens.TokenStream takes the same calls
+    and records tokens instead.
+    '''
+
+    def __init__(self, outf, buffer_size=OUTPUT_BUFFER_SIZE):
+        self.outf = outf
+        self.buffer_size = buffer_size
+        if isinstance(outf, int):
+            self.binary = True
+            self._write = self._write_fd
+        else:
+            self.binary = isinstance(outf, (io.RawIOBase, io.BufferedIOBase))
+            self._write = outf.write
+        # input text not yet converted, and converted output not yet written
+        self._run = []
+        self._chunks = []
+        self._size = 0
+
+    def text(self, data):
+        '''Write latin1 bytes from the input.'''
+        if data:
+            self._run.append(data)
+            self._size += len(data)
+            if self._size >= self.buffer_size:
+                self.flush()
+
+    def markup(self, data):
+        '''Write utf-8 bytes, e.g. CompiledAction.start_bytes.'''
+        if data:
+            if data.isascii():
+                # reads the same as latin1
+                self._run.append(data)
+            else:
+                self._convert_run()
+                self._chunks.append(data if self.binary else data.decode('utf-8'))
+            self._size += len(data)
+            if self._size >= self.buffer_size:
+                self.flush()
+
+    def write(self, data):
+        '''Write str, or utf-8 bytes.'''
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.markup(data)
+
+    def start(self, action):
+        '''Write the start html of a LOCATOR_TABLE or FONT_TABLE action.'''
+        self.markup(fragment_bytes(action, 'start'))
+
+    def end(self, action):
+        '''Write the end html of an action.'''
+        self.markup(fragment_bytes(action, 'end'))
+
+    def escaped(self, line, line_start, current_grid):
+        '''Write line[line_start:] of line with its escapes converted, as
+        process_lines() does for the rest of a line, and return it.'''
+        output_line = process_escapes_in_line(line, current_grid)[line_start:]
+        if output_line:
+            self.text(output_line)
+        return output_line
+
+    def output(self, input_line, prefix=None, postfix=None):
+        '''output() to this sink.'''
+        if not input_line:
+            return
+        if prefix:
+            if isinstance(prefix, bytes):
+                self.markup(prefix)
+            else:
+                # output() has always written the line in place of a str prefix
+                self.output(input_line)
+        if isinstance(input_line, bytes):
+            self.text(input_line)
+        else:
+            self.write(input_line)
+        if postfix:
+            self.write(postfix)
+
+    def _convert_run(self):
+        if self._run:
+            run = b''.join(self._run)
+            self._run = []
+            if not self.binary:
+                run = run.decode('latin1')
+            elif not run.isascii():
+                run = run.decode('latin1').encode('utf-8')
+            self._chunks.append(run)
+
+    def flush(self):
+        '''Convert and write out everything collected so far.'''
+        profiler = profiling.get_profiler()
+        if profiler is not None and (self._run or self._chunks):
+            start = profiler.start()
+            size = self._size
+        else:
+            profiler = None
+        self._convert_run()
+        chunks = self._chunks
+        if chunks:
+            self._chunks = []
+            self._size = 0
+            if len(chunks) == 1:
+                data = chunks[0]
+            elif self.binary:
+                data = b''.join(chunks)
+            else:
+                data = ''.join(chunks)
+            self._write(data)
+            if profiler is not None:
+                profiler.stop('write', start, size, len(data))
+
+    def _write_fd(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.outf, view):]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
 ESCAPE_SEQUENCES = {#esc    # action
                     b'1A' : { 'desc' :'Thin space' , 'html':b'&#160;' },
                     b'09' : { 'desc' :'N dash' ,     'html':b'&#150;' },   #TODO: check
@@ -235,26 +681,113 @@ def none2empty(input):
         return input
     return b''
 
+class _EscapeLookup(dict):
+    '''(replace, esc) -> replacement bytes, filled in from the table the
+    first time a pair is seen.'''
+
+    def __init__(self, table):
+        self.table = table
+
+    def __missing__(self, key):
+        replacement = self[key] = self.table.resolve(*key)
+        return replacement
+
+
+class EscapeTable(object):
+    '''An escape_sequences dictionary flattened into a
+    (replace char, esc) -> replacement bytes lookup, applied to a line in one
+    ESCAPE_PATTERN.sub() pass.
+
+    The replacements are the same process_escapes() works out for each match:
+    escape_sequences[esc][replace]['html'] replaces the char, otherwise the
+    char is kept and escape_sequences[esc]['html'] (or nothing) follows it.
+    Pairs are worked out the first time they are seen, so building a table is
+    cheap and a table can be swapped in per call:
+
+        EscapeTable()                   # ESCAPE_SEQUENCES
+        EscapeTable(blank=True)         # drop every escape, keep the char
+        process_escapes_in_line(line, b'G2', escape_sequences=table)
+    '''
+
+    def __init__(self, escape_sequences=None, blank=False):
+        if escape_sequences is None:
+            escape_sequences = ESCAPE_SEQUENCES
+        self.escape_sequences = escape_sequences
+        self.blank = blank
+        self.lookup = _EscapeLookup(self)
+
+    def resolve(self, replace, esc):
+        '''Replacement bytes for replace (b'' if there was no char) followed
+        by \xff esc.'''
+        if self.blank:
+            return replace
+        default = {'desc': 'default', 'html': b''}
+        try:
+            temp = self.escape_sequences.get(esc, default)
+        except KeyError:
+            temp = default
+        action = temp.get(replace)
+        if action:
+            return action.get('html')
+        if temp.get('desc') == 'default':
+            logger.warning("No translation from %s, defaulting to empty space..", esc)
+        return replace + none2empty(temp.get('html'))
+
+    def _replace(self, found):
+        return self.lookup[found.group(1, 2)]
+
+    def sub(self, line, current_grid=b'G2'):
+        '''Replace every escape sequence in line.  Escapes are only converted
+        for grids up to G4.'''
+        if not self.converts(line, current_grid):
+            return line
+        return ESCAPE_PATTERN.sub(self._replace, line)
+
+    def converts(self, line, current_grid=b'G2'):
+        '''False if sub() would return line as it is without looking for
+        escapes.'''
+        if b'\xff' not in line:
+            return False
+        try:
+            if not escapes_in_grid(current_grid):
+                return False
+        except ValueError:
+            # a grid like b'' only ever failed once an escape was found
+            if not ESCAPE_PATTERN.search(line):
+                return False
+            raise
+        return True
+
+
+_ESCAPE_GRIDS = {}
+
+def escapes_in_grid(current_grid):
+    '''True if escapes are converted in current_grid (G1-G4).'''
+    converted = _ESCAPE_GRIDS.get(current_grid)
+    if converted is None:
+        converted = _ESCAPE_GRIDS[current_grid] = int(current_grid[1:]) <= 4
+    return converted
+
+
+ESCAPE_TABLE = EscapeTable(ESCAPE_SEQUENCES)
+BLANK_ESCAPE_TABLE = EscapeTable(ESCAPE_SEQUENCES, blank=True)
+
+
 def process_escapes_in_line(line, current_grid, escape_sequences=None):
-    if not escape_sequences:
-        escape_sequences = ESCAPE_SEQUENCES
-    current_start = 0
-    current_line = b''
-    for afound in find_escape(line, current_grid):
-        logger.debug("line:%s", line)
-        a_current_line , current_start = process_escapes(afound, line,
-                            current_start, current_line,  current_grid ,
-                            escape_sequences=escape_sequences)
-        current_line = current_line + a_current_line
-        logger.debug("after esc :%s", current_line)
-    if current_start > 0:
-        current_line = current_line + line[current_start:]
-        line = current_line
-    return line
+    '''Convert the escape sequences in line.  escape_sequences can be a
+    compiled EscapeTable or an escape sequences dictionary.
+    '''
+    if not escape_sequences or escape_sequences is ESCAPE_SEQUENCES:
+        table = ESCAPE_TABLE
+    elif isinstance(escape_sequences, EscapeTable):
+        table = escape_sequences
+    else:
+        table = EscapeTable(escape_sequences)
+    return table.sub(line, current_grid)
 
 def process_lines(line, current_state, outputf=sys.stdout,
                       locator_table=None,
-                      font_table=None, postfix=None):
+                      font_table=None, postfix=None, dispatch=None):
     '''For every line process it for locator codes,
     Set the current_state to the action's grid,value  unless it is a
     Font locator (T\d+).  We use the grid code of the current locator action
@@ -263,32 +796,58 @@ def process_lines(line, current_state, outputf=sys.stdout,
     action = { 'start': "<h3><em>",'end': "</em></h3>",'grid':"G2",},
     current_state = tuple( action,b'G2')
     There should only be one locator per line at the begining.
+    dispatch is the compiled DispatchTable for the two tables, see
+    compile_tables().
     '''
+    if dispatch is None:
+        dispatch = compile_tables(locator_table, font_table)
+    sink = outputf
+    if not isinstance(sink, OutputSink):
+        sink = OutputSink(outputf)
+    tracer = tracing.get_tracer()
+    profiler = profiling.get_profiler()
+    if profiler is not None:
+        start = profiler.start()
+        size = len(line)
     state_stack= []
     state_stack.append(current_state)
     line_start = 0
     current_grid = current_state[1]
     for found in find_locators(line):
-        logger.debug("Found locator:%s", found.group('locator'))
-
-        action = translate_locator(found.group('locator'), grid=current_grid,
-                                   locator_table=locator_table, font_table=font_table)
+        locator = found.group('locator')
+        action = dispatch[current_grid, locator]
+        if tracer is not None:
+            tracer.locator(locator, action)
         if action:
-            logger.debug("Found Action:%s" , action)
             current_action = current_state[0]
-            line, line_start = process_actions(found, line, line_start, current_action, action, outputf=outputf)
+            if profiler is not None:
+                action_start = profiler.start()
+            line, line_start = process_actions(found, line, line_start, current_action, action, outputf=sink)
+            if profiler is not None:
+                profiler.stop('process_actions', action_start)
             # Not a font locator code:
-            if found.group('locator')[0] != 'T':
+            if locator[0] != 'T':
                 # set the current grid equal to the locator codes grid code.
-                current_grid = action.get('grid')
+                current_grid = action.grid
             current_state = ( action, current_grid )
             state_stack.append(current_state)
     if line:
-        line = process_escapes_in_line(line, current_grid)
-        output_line = line[line_start:]
-        output (output_line, postfix=postfix,outf=outputf)
+        if profiler is not None:
+            escapes_start = profiler.start()
+        # the escapes are converted in the whole line, line_start is where
+        # the last locator ended before they were
+        output_line = sink.escaped(line, line_start, current_grid)
+        if profiler is not None:
+            profiler.stop('process_escapes', escapes_start, len(line), len(output_line))
+        if output_line:
+            if postfix:
+                sink.write(postfix)
     else:
         output_line = None
+    if sink is not outputf:
+        sink.flush()
+    if profiler is not None:
+        profiler.stop('process_lines', start, size, len(output_line or b''))
     return state_stack, output_line
 
 def process_actions(found, line, line_start, current_state, actions, outputf=None):
@@ -302,16 +861,42 @@ def process_actions(found, line, line_start, current_state, actions, outputf=Non
             line_start = None
 
     if line:
+        sink = outputf
+        if not isinstance(sink, OutputSink):
+            sink = OutputSink(outputf)
         pattern_start = found.start()
         pattern_end = found.end()
-        output( line[line_start:pattern_start],outf=outputf)
+        sink.text(line[line_start:pattern_start])
         line_start = pattern_end
-        if current_state and current_state.get('end'):
-            logger.debug("\tcurrent_state.end:%s" , current_state.get('end'))
-            output (current_state.get('end'),outf=outputf)
-        logger.debug("\tlocator:%s action start:%s", locator, actions.get('start'))
-        output ( actions.get('start'),outf=outputf)
-        output (line[line_start:pattern_start],outf=outputf)
+        end = current_state and current_state.get('end')
+        if current_state:
+            # a TokenStream keeps the end even when it writes nothing
+            sink.end(current_state)
+        sink.start(actions)
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.action(locator, end, actions.get('start'))
+        if sink is not outputf:
+            sink.flush()
     return line, line_start
 
 
+def fragment_bytes(action, key):
+    '''The utf-8 start or end html of an action.'''
+    if isinstance(action, CompiledAction):
+        return action.start_bytes if key == 'start' else action.end_bytes
+    return encode_fragment(action.get(key))
+
+
+# Submodules are imported the first time they are used, locator.parser
+# after a plain "import locator" for one, so importing locator stays quick.
+SUBMODULES = ('aio', 'archive', 'batch', 'benchmark', 'congressionalrecordindex',
+              'dailydigest', 'generate', 'pageindex', 'parser', 'profiling', 'rendercache',
+              'renderers', 'server', 'titleindex', 'tokencache', 'tokens', 'tracing',
+              'writer')
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        import importlib
+        return importlib.import_module('locator.' + name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,203 @@
+'''asyncio front end to LocatorParser.parse().
+
+    parser = LocatorParser(inputparser=CongressionalRecordIndexInputParser(year=2014))
+    async for (name, title), output in parser.aparse(reader, executor=pool):
+        ...
+
+LocatorParser.aparse() yields what parse() yields, as an async iterator.
+The input (bytes, a file name, a file or mmap, or anything with an async
+read() such as an asyncio.StreamReader) is read without blocking the
+loop, and the rendering is cut into units of about unit_bytes of input that
+run on executor:
+
+    Daily Digest    render_parallel() chunks, cut at LOCATOR_TABLE codes
+                    (locator.parser.render_unit())
+    CRI             runs of stanzas (congressionalrecordindex.render_stanzas())
+
+At most window units run ahead of the document being yielded, so a slow
+consumer holds the work back rather than piling up output.  Units only
+take and return bytes and tuples, so executor can be a ThreadPoolExecutor
+or a ProcessPoolExecutor shared by many conversions.  A Daily Digest chunk
+that can't be rendered on its own is rendered again from the state the
+chunk before left, so the html is the same as parse() gives.  Output
+parsers are called on the loop's default executor.  daily_digest_pieces()
+gives the html of a Daily Digest a unit at a time instead of as one
+document, to send it on as it is rendered.
+
+The class tables are used, as parse() uses them.
+'''
+import asyncio
+import collections
+import functools
+import inspect
+import io
+import itertools
+import re
+
+from locator import OutputSink, fragment_bytes
+from locator.parser import BELL_Z, PageMarkers, render_unit, _take
+from locator.congressionalrecordindex import (CongressionalRecordIndexInputParser,
+                                              AccessIdIndex, render_stanzas)
+
+# bytes of input rendered per executor call
+UNIT_BYTES = 64 * 1024
+# units running ahead of the document being yielded
+WINDOW = 4
+
+
+def _read_file(name):
+    with open(name, 'rb') as f:
+        return f.read()
+
+
+async def read_input(inputdata):
+    '''The bytes of inputdata, read without blocking the loop.'''
+    if isinstance(inputdata, (bytes, bytearray, memoryview)):
+        return bytes(inputdata)
+    loop = asyncio.get_running_loop()
+    if isinstance(inputdata, str):
+        return await loop.run_in_executor(None, _read_file, inputdata)
+    read = inputdata.read
+    if inspect.iscoroutinefunction(read):
+        data = await read()
+    else:
+        data = await loop.run_in_executor(None, read)
+    if inspect.isawaitable(data):
+        data = await data
+    return bytes(data)
+
+
+async def run_ordered(executor, calls, window=WINDOW):
+    '''Run calls, (function, arg, ...) tuples, on executor with at most
+    window running ahead of the results, and yield the results in order.'''
+    loop = asyncio.get_running_loop()
+    calls = iter(calls)
+    running = collections.deque(loop.run_in_executor(executor, *call)
+                                for call in itertools.islice(calls, window))
+    try:
+        while running:
+            result = await running.popleft()
+            for call in calls:
+                running.append(loop.run_in_executor(executor, *call))
+                break
+            yield result
+    finally:
+        for future in running:
+            future.cancel()
+
+
+async def parse(inputdata, inputparser, outputparser, executor=None,
+                unit_bytes=None, window=None, **kwargs):
+    '''LocatorParser.aparse(), outputparser.parse() of each document.'''
+    loop = asyncio.get_running_loop()
+    if isinstance(inputparser, CongressionalRecordIndexInputParser):
+        documents = stanza_documents
+    else:
+        documents = daily_digest_documents
+    try:
+        data = await read_input(inputdata)
+        async for document in documents(inputparser, data, executor,
+                                        unit_bytes or UNIT_BYTES, window or WINDOW):
+            yield await loop.run_in_executor(
+                None, functools.partial(outputparser.parse, document, **kwargs))
+    finally:
+        close = getattr(outputparser, 'close', None)
+        if close is not None:
+            await loop.run_in_executor(None, close)
+
+
+def _daily_digest_cuts(inputparser, data, unit_bytes):
+    text = re.sub(BELL_Z, b'', data.strip())
+    return text, inputparser.parallel_cuts(text, unit_bytes)
+
+
+async def daily_digest_pieces(inputparser, data, executor, unit_bytes=UNIT_BYTES,
+                              window=WINDOW, postfix=None, binary=False):
+    '''The html of a Daily Digest file as parse() gives it, a piece per unit
+    as each is rendered, as InputParser.iter_html() gives it a piece per
+    line: <html> comes with the first piece, </html> with the last.  The
+    pieces are str, or utf-8 bytes with binary.'''
+    loop = asyncio.get_running_loop()
+    parser_class = type(inputparser)
+    dispatch = inputparser.dispatch_table()
+    text, cuts = await loop.run_in_executor(None, _daily_digest_cuts, inputparser,
+                                            data, unit_bytes)
+    chunks = list(zip(cuts, cuts[1:] + [len(text)]))
+    out = io.BytesIO() if binary else io.StringIO()
+    sink = OutputSink(out)
+    pages = PageMarkers(sink)
+    sink.markup(b"<html>")
+    state = (None, b'G2')
+    # the first chunk from the real state, the rest on their own
+    calls = ((render_unit, parser_class, text[start:end], postfix, None if index else state)
+             for index, (start, end) in enumerate(chunks))
+    index = 0
+    async for result in run_ordered(executor, calls, window):
+        if result is None:
+            # not a chunk on its own, rendered from the state before it
+            start, end = chunks[index]
+            result = await loop.run_in_executor(
+                executor, render_unit, parser_class, text[start:end], postfix, state)
+        elif index and state[0] is not None:
+            # the first line of the chunk closes the previous action
+            sink.markup(fragment_bytes(dispatch[state[0]], 'end'))
+        index += 1
+        html, page_offsets, state = result
+        position = 0
+        for offset, page in page_offsets:
+            sink.markup(html[position:offset])
+            position = offset
+            pages(page)
+        sink.markup(html[position:])
+        yield _take(sink, out)
+    pages.close()
+    sink.markup(b"</html>")
+    yield _take(sink, out)
+
+
+async def daily_digest_documents(inputparser, data, executor, unit_bytes, window,
+                                 postfix=None):
+    '''The html of a Daily Digest file as parse() gives it, rendered a
+    chunk per unit.'''
+    out = io.StringIO()
+    async for piece in daily_digest_pieces(inputparser, data, executor, unit_bytes,
+                                           window, postfix):
+        out.write(piece)
+    yield out
+
+
+def _make_stanzas(inputparser, data):
+    return list(inputparser.make_stanzas(data))
+
+
+def _batches(stanzas, unit_bytes):
+    batch = []
+    size = 0
+    for stanza in stanzas:
+        batch.append(stanza)
+        size += len(stanza)
+        if size >= unit_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+async def stanza_documents(inputparser, data, executor, unit_bytes, window,
+                           postfix=None):
+    '''((name, title line), output) of each CRI stanza as parse() gives
+    them, rendered a run of stanzas per unit.'''
+    loop = asyncio.get_running_loop()
+    stanzas = await loop.run_in_executor(None, _make_stanzas, inputparser, data)
+    inputparser.access_index = AccessIdIndex()
+    # name_stanzas() carries names over from stanza to stanza, it is fed
+    # each rendered stanza just before it is asked for the next name
+    rendered = collections.deque()
+    named = inputparser.name_stanzas(iter(rendered.popleft, None))
+    calls = ((render_stanzas, type(inputparser), inputparser.year, (None, b'G2'), postfix, batch)
+             for batch in _batches(stanzas, unit_bytes))
+    async for results in run_ordered(executor, calls, window):
+        for title, html in results:
+            rendered.append((title, io.StringIO(html)))
+            yield next(named)
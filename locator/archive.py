@@ -0,0 +1,187 @@
+'''Write CRI output into one zip or tar archive instead of a file per stanza.
+
+    outputparser = ArchiveOutputParser('CRI-2014.zip', compresslevel=9)
+    for _ in LocatorParser(inputdata=data, inputparser=cri,
+                           outputparser=outputparser).parse():
+        pass
+
+Each ((name, title line), stream) from LocatorParser.parse() becomes a
+member named name, as MultipleOutputFilesOutputParser would name the file.
+zip members are deflated at compresslevel (0 stores them), tar members are
+stored so they can be read in place.  A name seen twice is added twice and
+the last one wins, as the file would have been overwritten.
+
+Next to the archive an index (the archive name + INDEX_SUFFIX) lists a
+line per member:
+
+    name<TAB>offset<TAB>size<TAB>length<TAB>method
+
+offset is where the member starts in the archive (its local header in a
+zip, its data in a tar), size the bytes stored there, length the bytes
+once uncompressed and method 'stored' or 'deflated'.  read_member() uses it
+to pull one member out with one seek and read, without scanning a tar or
+loading a zip's central directory.
+'''
+import io
+import os
+import struct
+import tarfile
+import time
+import warnings
+import zipfile
+import zlib
+
+INDEX_SUFFIX = '.index'
+ZIP = 'zip'
+TAR = 'tar'
+STORED = 'stored'
+DEFLATED = 'deflated'
+# zip local file header, the name and extra field lengths are the last two
+_ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+def archive_format(filename):
+    '''ZIP or TAR from an archive file name.'''
+    if filename.lower().endswith('.tar'):
+        return TAR
+    return ZIP
+
+
+class ArchiveOutputParser(object):
+    '''Output parser that adds every stanza to one archive, see the module
+    docstring.  close() (which LocatorParser.parse() calls when it is done)
+    finishes the archive and writes the index, an archive is written by
+    one run: to put several inputs in one archive parse them into a
+    LocatorParser as one input, else give each its own
+    ArchiveOutputParser.  parse() after close() raises ValueError.
+    '''
+
+    def __init__(self, archive, format=None, compresslevel=None, prepend=None,
+                 index=True, **kwargs):
+        self.archive = archive
+        self.format = format or archive_format(archive)
+        if self.format not in (ZIP, TAR):
+            raise ValueError("archive format must be %r or %r" % (ZIP, TAR))
+        self.compresslevel = compresslevel
+        self.prepend = prepend or ''
+        self.index = index
+        # (name, offset, size, length, method) of each member added
+        self.members = []
+        self._names = set()
+        self._file = None
+        self._closed = False
+        # every member gets the time the archive was started
+        self._mtime = time.time()
+
+    def _open(self):
+        if self.format == ZIP:
+            if self.compresslevel == 0:
+                self._file = zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_STORED)
+            else:
+                self._file = zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_DEFLATED,
+                                             compresslevel=self.compresslevel)
+        else:
+            self._file = tarfile.open(self.archive, 'w:', format=tarfile.PAX_FORMAT)
+
+    def parse(self, input_tuple, **kwargs):
+        '''Add (name, title line), stream to the archive.'''
+        if self._closed:
+            raise ValueError("%s is finished, LocatorParser.parse() closes its output "
+                             "parser: use an ArchiveOutputParser per run" % self.archive)
+        (name, line), stream = input_tuple
+        member = self.prepend + name.decode('utf-8')
+        data = stream.read()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if self._file is None:
+            self._open()
+        if self.format == ZIP:
+            self._add_zip(member, data)
+        else:
+            self._add_tar(member, data)
+        self._names.add(member)
+        return input_tuple
+
+    def _add_zip(self, member, data):
+        info = zipfile.ZipInfo(member, time.localtime(self._mtime)[:6])
+        info.compress_type = self._file.compression
+        info.external_attr = 0o644 << 16
+        if member in self._names:
+            # a repeated name is expected, the index says which one is live
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                self._file.writestr(info, data)
+        else:
+            self._file.writestr(info, data)
+        method = DEFLATED if info.compress_type == zipfile.ZIP_DEFLATED else STORED
+        self.members.append((member, info.header_offset, info.compress_size,
+                             info.file_size, method))
+
+    def _add_tar(self, member, data):
+        info = tarfile.TarInfo(member)
+        info.size = len(data)
+        info.mtime = self._mtime
+        info.mode = 0o644
+        self._file.addfile(info, io.BytesIO(data))
+        # addfile() moved offset past the data padded to whole blocks
+        blocks = -(-len(data) // tarfile.BLOCKSIZE)
+        self.members.append((member, self._file.offset - blocks * tarfile.BLOCKSIZE,
+                             len(data), len(data), STORED))
+
+    def close(self):
+        '''Finish the archive and write its index.'''
+        if self._closed:
+            return
+        self._closed = True
+        if self._file is None:
+            self._open()
+        archive, self._file = self._file, None
+        archive.close()
+        if self.index:
+            write_index(self.archive + INDEX_SUFFIX, self.members)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_index(filename, members):
+    with open(filename, 'w', encoding='utf-8', newline='\n') as index:
+        for member in members:
+            index.write('%s\t%d\t%d\t%d\t%s\n' % member)
+
+
+def read_index(filename):
+    '''{name: (offset, size, length, method)} from an index, the last of a
+    repeated name.'''
+    members = {}
+    with open(filename, encoding='utf-8', newline='\n') as index:
+        for line in index:
+            name, offset, size, length, method = line.rstrip('\n').split('\t')
+            members[name] = (int(offset), int(size), int(length), method)
+    return members
+
+
+def read_member(archive, name, index=None, format=None):
+    '''The bytes of one member of an archive ArchiveOutputParser wrote.
+    index is read_index() of its index, read from next to the archive if
+    not given, format is taken from the archive name if not given.  Raises
+    KeyError if there is no such member.'''
+    if format is None:
+        format = archive_format(archive)
+    if index is None:
+        index = read_index(archive + INDEX_SUFFIX)
+    offset, size, length, method = index[name]
+    with open(archive, 'rb') as f:
+        f.seek(offset)
+        if format == ZIP:
+            header = _ZIP_LOCAL_HEADER.unpack(f.read(_ZIP_LOCAL_HEADER.size))
+            if header[0] != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile("no zip member at %d" % offset)
+            f.seek(header[-2] + header[-1], os.SEEK_CUR)
+        data = f.read(size)
+    if method == DEFLATED:
+        data = zlib.decompress(data, -zlib.MAX_WBITS)
+    return data
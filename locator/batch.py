@@ -0,0 +1,286 @@
+'''Convert a batch of Daily Digest and Congressional Record Index locator
+files in one run.
+
+    python -m locator.batch -o html/ digests/ 'cri/CRI-*.rec' --jobs 8
+
+Directories are searched for *.rec files and globs are expanded.  Each file
+is converted by DailyDigestInputParser or CongressionalRecordIndexInputParser
+(see document_type()) in a pool of worker processes, so imports and table
+compilation are paid once per worker rather than once per file.  The
+largest files are started first, so a big file doesn't end up running on
+its own at the end.  A line per file reports its size, time and MB/s.
+
+Daily Digest files are written to <output dir>/<name>.htm, the CRI stanzas
+of a file to <output dir>/CRI-<year>-<title>.htm, or with --archive to one
+<output dir>/<name>.zip or .tar and its index.  Inputs that would write the
+same <name> file, found in two directories say, are refused before any file
+is converted.  The stanza names of a CRI file are only known once it is
+converted, so when several CRI files write a file per stanza they are
+listed as unchecked, a stanza of a later file overwrites one of the same
+name.  With --tokens the token stream of each file is kept in a
+locator.tokencache.TokenCache, so after a change to the html of the tables
+the files are only rendered again.
+--format text and --format json write <name>.txt and <name>.json too (see
+locator.renderers), from the same parse of each file.
+'''
+import argparse
+import concurrent.futures
+import fnmatch
+import glob
+import os
+import re
+import sys
+import time
+
+from locator.parser import (LocatorParser, MultipleOutputFilesOutputParser,
+                            render_html, map_input, close_input)
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.archive import ArchiveOutputParser, ZIP, TAR
+from locator.renderers import HTML, TEXT, JSON, FORMATS, fan_out, render_text, render_json
+
+DAILY_DIGEST = 'dd'
+CRI = 'cri'
+INPUT_PARSERS = {
+    DAILY_DIGEST: DailyDigestInputParser,
+    CRI: CongressionalRecordIndexInputParser,
+}
+# bytes read from the start of a file to tell what it is
+SNIFF_SIZE = 4096
+# a CRI file opens with the \x07F format code and its first \x07I01 entry
+CRI_START = re.compile(rb'\s*(\x07F\d+\s*)*\x07I01')
+# cri as a word of a file name, CRI-2014.rec or cri_2014.rec but not
+# transcript.rec
+CRI_NAME = re.compile(r'(?<![a-z])cri(?![a-z])')
+# file name suffix of each output format
+SUFFIXES = {HTML: '.htm', TEXT: '.txt', JSON: '.json'}
+YEAR = re.compile(r'(?<!\d)(1[89]\d\d|2\d\d\d)(?!\d)')
+
+
+def find_inputs(paths, pattern='*.rec'):
+    '''The files named by paths, which can be files, directories (searched
+    for pattern) or globs.  Each file is listed once.'''
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if fnmatch.fnmatch(filename, pattern):
+                        found.append(os.path.join(dirpath, filename))
+        elif os.path.exists(path):
+            found.append(path)
+        else:
+            found.extend(sorted(glob.glob(path)))
+    seen = set()
+    return [f for f in found if not (f in seen or seen.add(f))]
+
+
+def document_type(filename, head=None):
+    '''DAILY_DIGEST or CRI for a locator file, from its name if that says so
+    and otherwise from how the file starts.'''
+    name = os.path.basename(filename).lower()
+    if CRI_NAME.search(name):
+        return CRI
+    if 'digest' in name:
+        return DAILY_DIGEST
+    if head is None:
+        with open(filename, 'rb') as inputfile:
+            head = inputfile.read(SNIFF_SIZE)
+    if b'DIGEST' not in head and CRI_START.match(head):
+        return CRI
+    return DAILY_DIGEST
+
+
+def year_of(filename):
+    '''The year in a file name, for CRI output names, or None.'''
+    years = YEAR.findall(os.path.basename(filename))
+    if years:
+        return int(years[-1])
+    return None
+
+
+def schedule(filenames):
+    '''filenames largest first.'''
+    return sorted(filenames, key=os.path.getsize, reverse=True)
+
+
+def convert_file(filename, output_dir, doc_type=None, year=None, cache=None,
+                 archive=None, tokens=None, formats=(HTML,)):
+    '''Convert one file, returns (document type, number of documents
+    written).  cache is a RenderCache directory for CRI stanzas, archive
+    'zip' or 'tar' to put the stanzas of a CRI file in one archive, tokens
+    a TokenCache directory to render the file from, formats the outputs to
+    write (see locator.renderers.FORMATS).'''
+    # anything but html alone is rendered from tokens
+    tokenized = bool(tokens) or tuple(formats) != (HTML,)
+    if doc_type is None:
+        doc_type = document_type(filename)
+    if doc_type == CRI:
+        year = year or year_of(filename)
+        if not year:
+            raise ValueError("no year in the file name of a CRI file, use --year")
+        inputparser = CongressionalRecordIndexInputParser(year=year, cache=cache,
+                                                          token_cache=tokens)
+        if archive:
+            stem = os.path.splitext(os.path.basename(filename))[0]
+            outputparser = ArchiveOutputParser(
+                os.path.join(output_dir, '%s.%s' % (stem, archive)), format=archive)
+        else:
+            outputparser = MultipleOutputFilesOutputParser(basedir=output_dir, threaded=True)
+        if tokenized:
+            outputparser = fan_out(formats, inputparser.dispatch_table(), outputparser)
+        parser = LocatorParser(inputparser=inputparser, outputparser=outputparser)
+        return doc_type, sum(1 for _ in parser.parse_file(filename, tokens=tokenized))
+    stem = os.path.join(output_dir, os.path.splitext(os.path.basename(filename))[0])
+    inputparser = INPUT_PARSERS[doc_type]()
+    if tokenized:
+        with open(filename, 'rb') as inputfile:
+            mapped = map_input(inputfile)
+            try:
+                stream = inputparser.tokenize(mapped, cache=tokens)
+            finally:
+                close_input(mapped)
+        for name in formats:
+            if name == HTML:
+                with open(stem + SUFFIXES[name], 'wb') as out:
+                    render_html(stream, out)
+            else:
+                with open(stem + SUFFIXES[name], 'w', encoding='utf-8') as out:
+                    if name == TEXT:
+                        render_text(stream, out)
+                    else:
+                        render_json(stream, inputparser.dispatch_table(), outputfile=out)
+        return doc_type, 1
+    inputparser.parse_file(filename, outputfile=stem + '.htm', use_mmap=True)
+    return doc_type, 1
+
+
+def _convert_job(job):
+    '''convert_file() in a worker: (filename, type, documents, size,
+    seconds, error).'''
+    filename, output_dir, doc_type, year, cache, archive, tokens, formats = job
+    size = os.path.getsize(filename)
+    start = time.perf_counter()
+    try:
+        doc_type, documents = convert_file(filename, output_dir, doc_type,
+                                           year, cache, archive, tokens, formats)
+        error = None
+    except Exception as e:
+        documents = 0
+        error = '%s: %s' % (type(e).__name__, e)
+    return filename, doc_type, documents, size, time.perf_counter() - start, error
+
+
+def check_outputs(filenames, doc_type=None, archive=None):
+    '''Raise ValueError if two of filenames would be written to the same
+    <output dir>/<name> file, as a Daily Digest or a CRI archive.  Returns
+    the CRI files that could not be checked: those written a file per
+    stanza, when there is more than one of them.'''
+    outputs = {}
+    stanzas = []
+    for filename in filenames:
+        if (doc_type or document_type(filename)) == CRI and not archive:
+            stanzas.append(filename)
+            continue
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        outputs.setdefault(stem, []).append(filename)
+    duplicates = [names for names in outputs.values() if len(names) > 1]
+    if duplicates:
+        raise ValueError("files with the same output name: %s" % '; '.join(
+            ', '.join(names) for names in duplicates))
+    return stanzas if len(stanzas) > 1 else []
+
+
+def positive_int(value):
+    '''argparse type of --jobs.'''
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1: %s" % value)
+    return number
+
+
+def convert_files(filenames, output_dir, jobs=None, doc_type=None, year=None,
+                  cache=None, archive=None, tokens=None, formats=(HTML,)):
+    '''Convert filenames largest first on jobs worker processes (one per
+    cpu if None), yield a _convert_job() result as each file finishes.
+    Raises ValueError before converting anything if jobs is less than 1 or
+    two files would have the same output, see check_outputs().'''
+    if jobs is not None and jobs < 1:
+        raise ValueError("jobs must be at least 1: %r" % jobs)
+    check_outputs(filenames, doc_type, archive)
+    os.makedirs(output_dir, exist_ok=True)
+    work = [(filename, output_dir, doc_type, year, cache, archive, tokens, formats)
+            for filename in schedule(filenames)]
+    if jobs == 1:
+        for job in work:
+            yield _convert_job(job)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        # workers take jobs in the order they were submitted
+        for future in concurrent.futures.as_completed(
+                [pool.submit(_convert_job, job) for job in work]):
+            yield future.result()
+
+
+def report(result, outf=sys.stdout):
+    filename, doc_type, documents, size, seconds, error = result
+    if error:
+        outf.write('FAILED %s %s\n' % (filename, error))
+        return
+    megabytes = size / 1e6
+    outf.write('%9.2f MB %8.2f s %8.2f MB/s %3s %6d %s\n' % (
+        megabytes, seconds, megabytes / seconds if seconds else 0.0,
+        doc_type, documents, filename))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert Daily Digest and CRI locator files to html.')
+    parser.add_argument('inputs', nargs='+',
+                        help='locator files, directories or globs')
+    parser.add_argument('-o', '--output-dir', default='.')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=os.cpu_count(),
+                        help='worker processes (default: one per cpu)')
+    parser.add_argument('--type', choices=sorted(INPUT_PARSERS),
+                        help='document type of every input, guessed per file by default')
+    parser.add_argument('--year', type=int,
+                        help='CRI year, taken from each file name by default')
+    parser.add_argument('--cache',
+                        help='directory of rendered CRI stanzas kept between runs')
+    parser.add_argument('--archive', choices=(ZIP, TAR),
+                        help='write the stanzas of a CRI file to <output dir>/<name>.zip or .tar')
+    parser.add_argument('--tokens', metavar='DIR',
+                        help='directory of token streams kept between runs, to only render again')
+    parser.add_argument('--format', action='append', choices=FORMATS, dest='formats',
+                        help='output format, can be given more than once (default: html)')
+    parser.add_argument('--pattern', default='*.rec',
+                        help='files to convert in directories (default: *.rec)')
+    args = parser.parse_args(argv)
+
+    filenames = find_inputs(args.inputs, args.pattern)
+    try:
+        unchecked = check_outputs(filenames, args.type, args.archive)
+    except ValueError as e:
+        parser.error(str(e))
+    if unchecked:
+        sys.stderr.write('not checked for stanzas of the same name, the last file '
+                         'converted wins: %s\n' % ', '.join(unchecked))
+    failed = 0
+    total_size = 0
+    start = time.perf_counter()
+    for result in convert_files(filenames, args.output_dir, args.jobs,
+                                args.type, args.year, args.cache,
+                                args.archive, args.tokens, args.formats or (HTML,)):
+        report(result)
+        failed += bool(result[5])
+        total_size += result[3]
+    seconds = time.perf_counter() - start
+    sys.stdout.write('%d files, %.2f MB in %.2f s, %.2f MB/s, %d failed\n' % (
+        len(filenames), total_size / 1e6, seconds,
+        total_size / 1e6 / seconds if seconds else 0.0, failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
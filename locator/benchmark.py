@@ -0,0 +1,230 @@
+'''Throughput benchmarks for the parse stages, on generated input.
+
+    python -m locator.benchmark --size 4 -o results.json
+    python -m locator.benchmark --size 4 -o new.json --baseline results.json
+
+Each benchmark runs one stage over a Daily Digest or CRI file made by
+locator.generate (size MB, a fixed seed) and reports MB/s of input and
+lines/s, the best of --repeat runs.  The results, with the Python version
+and the machine, are written as JSON.  With --baseline each benchmark is
+compared to the same one in an earlier results file, and the exit status is
+1 if any got more than --tolerance slower.
+
+    makelines           InputParser.makelines() over the Daily Digest
+    clean_line          clean_line() of each bell line
+    process_lines       process_lines() of each line made by makelines()
+    process_escapes     process_escapes_in_line() of each line
+    process_title       process_title() of every CRI title, memo cleared
+    parse_dd            LocatorParser.parse() of the Daily Digest
+    parse_cri           LocatorParser.parse() of the CRI, stanzas in memory
+'''
+import argparse
+import io
+import json
+import platform
+import re
+import sys
+import time
+
+from locator import process_lines, process_escapes_in_line
+from locator.generate import MB, daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import (CongressionalRecordIndexInputParser,
+                                              access_id)
+from locator.parser import LocatorParser, OutputParser, clean_line
+
+RESULTS_FORMAT = 1
+DEFAULT_SIZE = 2.0
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.1
+YEAR = 2014
+
+
+class Inputs(object):
+    '''The generated files and the pieces the stage benchmarks start from,
+    made once before anything is timed.'''
+
+    def __init__(self, size=DEFAULT_SIZE, seed=0):
+        self.size = size
+        self.seed = seed
+        self.dd = daily_digest(int(size * MB), seed)
+        self.cri = congressional_record_index(int(size * MB), seed)
+        parser = DailyDigestInputParser()
+        self.bell_lines = [piece for piece in re.split(b'(?=\x07)', self.dd) if piece]
+        self.lines = [line for page, match, line in parser.makelines(self.dd)]
+        index = CongressionalRecordIndexInputParser(year=YEAR).access_ids(self.cri)
+        self.titles = [line for stanzas in index.stanzas.values()
+                       for number, line in stanzas]
+
+
+def bench_makelines(inputs):
+    parser = DailyDigestInputParser()
+    lines = sum(1 for _ in parser.makelines(inputs.dd))
+    return len(inputs.dd), lines
+
+
+def bench_clean_line(inputs):
+    for line in inputs.bell_lines:
+        clean_line(line)
+    return len(inputs.dd), len(inputs.bell_lines)
+
+
+def bench_process_lines(inputs):
+    dispatch = DailyDigestInputParser.dispatch_table()
+    out = io.StringIO()
+    state = (None, b'G2')
+    for line in inputs.lines:
+        states, _ = process_lines(line, state, outputf=out, dispatch=dispatch)
+        state = states[-1]
+    return len(inputs.dd), len(inputs.lines)
+
+
+def bench_process_escapes(inputs):
+    for line in inputs.lines:
+        process_escapes_in_line(line, b'G2')
+    return len(inputs.dd), len(inputs.lines)
+
+
+def bench_process_title(inputs):
+    access_id.cache_clear()
+    for title in inputs.titles:
+        CongressionalRecordIndexInputParser.process_title(YEAR, title)
+    return sum(len(title) for title in inputs.titles), len(inputs.titles)
+
+
+def bench_parse_dd(inputs):
+    parser = LocatorParser(inputdata=io.BytesIO(inputs.dd),
+                           inputparser=DailyDigestInputParser(),
+                           outputparser=OutputParser())
+    for output in parser.parse():
+        output.read()
+    return len(inputs.dd), len(inputs.lines)
+
+
+def bench_parse_cri(inputs):
+    parser = LocatorParser(inputdata=inputs.cri,
+                           inputparser=CongressionalRecordIndexInputParser(year=YEAR),
+                           outputparser=OutputParser())
+    stanzas = 0
+    for title, output in parser.parse():
+        output.read()
+        stanzas += 1
+    return len(inputs.cri), stanzas
+
+
+BENCHMARKS = [
+    ('makelines', bench_makelines),
+    ('clean_line', bench_clean_line),
+    ('process_lines', bench_process_lines),
+    ('process_escapes', bench_process_escapes),
+    ('process_title', bench_process_title),
+    ('parse_dd', bench_parse_dd),
+    ('parse_cri', bench_parse_cri),
+]
+
+
+def run_benchmark(function, inputs, repeat=DEFAULT_REPEAT):
+    '''Time function(inputs), the best of repeat runs.'''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size, lines = function(inputs)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return {
+        'seconds': best,
+        'bytes': size,
+        'lines': lines,
+        'mb_per_s': size / MB / best if best else 0.0,
+        'lines_per_s': lines / best if best else 0.0,
+    }
+
+
+def run_benchmarks(size=DEFAULT_SIZE, repeat=DEFAULT_REPEAT, seed=0, names=None):
+    '''Results of the benchmarks named (all of them by default), as the
+    dictionary written to the results file.'''
+    inputs = Inputs(size, seed)
+    results = {}
+    for name, function in BENCHMARKS:
+        if names and name not in names:
+            continue
+        results[name] = run_benchmark(function, inputs, repeat)
+    return {
+        'format': RESULTS_FORMAT,
+        'size_mb': size,
+        'seed': seed,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''[(name, baseline MB/s, MB/s, ratio, regressed)] for the benchmarks in
+    both, a benchmark regressed if it is more than tolerance slower.'''
+    rows = []
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not old['mb_per_s']:
+            continue
+        ratio = result['mb_per_s'] / old['mb_per_s']
+        rows.append((name, old['mb_per_s'], result['mb_per_s'], ratio,
+                     ratio < 1.0 - tolerance))
+    return rows
+
+
+def report(results, outf=sys.stdout):
+    outf.write('%-16s %10s %12s %14s\n' % ('benchmark', 'seconds', 'MB/s', 'lines/s'))
+    for name, result in results['results'].items():
+        outf.write('%-16s %10.4f %12.2f %14.0f\n' % (
+            name, result['seconds'], result['mb_per_s'], result['lines_per_s']))
+
+
+def report_comparison(rows, outf=sys.stdout):
+    outf.write('%-16s %12s %12s %8s\n' % ('benchmark', 'base MB/s', 'MB/s', 'change'))
+    for name, old, new, ratio, regressed in rows:
+        outf.write('%-16s %12.2f %12.2f %+7.1f%%%s\n' % (
+            name, old, new, (ratio - 1.0) * 100, '  SLOWER' if regressed else ''))
+
+
+def main(argv=None, outf=None):
+    if outf is None:
+        outf = sys.stdout
+    parser = argparse.ArgumentParser(description='Benchmark the locator parse stages.')
+    parser.add_argument('--size', type=float, default=DEFAULT_SIZE,
+                        help='MB of each generated input (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='runs of each benchmark, the best counts (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='comma separated benchmarks to run')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='slowdown allowed against the baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else None
+    results = run_benchmarks(args.size, args.repeat, args.seed, names)
+    report(results, outf)
+    if args.output:
+        with open(args.output, 'w') as outf:
+            json.dump(results, outf, indent=2, sort_keys=True)
+            outf.write('\n')
+    if args.baseline:
+        with open(args.baseline) as inf:
+            baseline = json.load(inf)
+        rows = compare(results, baseline, args.tolerance)
+        outf.write('\n')
+        report_comparison(rows, outf)
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
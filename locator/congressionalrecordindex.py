@@ -1,13 +1,36 @@
 import io
-import copy
-import hashlib
+import mmap
+import collections
+import functools
+import sys
 import re
-from locator.parser import (InputParser, output, clean_line, translate_chars, MAPPING)
+from locator.parser import (InputParser, output, clean_line, MAPPING,
+                            ordered_map)
 from locator import ESCAPE_SEQUENCES as input_ESCAPE_SEQUENCES
 from locator import grouper, remove_chars, REMOVE_CHARS, process_escapes_in_line, process_lines, find_locators
+from locator import EscapeTable, BLANK_ESCAPE_TABLE, OutputSink
+from locator import tracing
+from locator import profiling
+from locator.tokens import TokenStream
 import logging
 logger = logging.getLogger(__name__)
 
+# \x07I01 sections sent to a worker at a time by parse_io_parallel()
+STANZA_BATCH = 64
+
+# The access_id() passes, compiled once.  The MAPPING translation, with
+# \xff09 and &ndash as hyphens, runs key by key as translate_chars() did.
+TITLE_MAPPING = dict(MAPPING)
+TITLE_MAPPING[b'\xff09'] = b'-'
+TITLE_MAPPING[b'&ndash'] = b'-'
+TITLE_TRANSLATIONS = [(re.compile(k), v) for k, v in TITLE_MAPPING.items()]
+TITLE_PUNCTUATION = re.compile(b'[^0-9a-zA-Z\-\s]+')
+TITLE_TRAILING_SPACE = re.compile(b'\s+$')
+TITLE_SPACES = re.compile(b'[\s]+')
+TITLE_HYPHENS = re.compile(b'\-+')
+# titles access_id() remembers
+TITLE_CACHE_SIZE = 64 * 1024
+
 
 class CongressionalRecordIndexInputParser(InputParser):
 
@@ -76,14 +99,43 @@ class CongressionalRecordIndexInputParser(InputParser):
     }
     ESCAPE_SEQUENCES = input_ESCAPE_SEQUENCES
     # FOR CRI output filenames we don't process escape sequences, we blank them out
+    TITLE_ESCAPES = BLANK_ESCAPE_TABLE
     def __init__(self,**kwargs ):
         self.year = kwargs.get('year')
+        # worker processes for parse_io(), see parse_io_parallel()
+        self.processes = kwargs.get('processes')
+        # a RenderCache (or its directory) of rendered stanzas, see
+        # render_sections()
+        cache = kwargs.get('cache')
+        if isinstance(cache, str):
+            from locator.rendercache import RenderCache
+            cache = RenderCache(cache)
+        self.cache = cache
+        # a TokenCache (or its directory) of token streams, see tokenize()
+        token_cache = kwargs.get('token_cache')
+        if isinstance(token_cache, str):
+            from locator.tokencache import TokenCache
+            token_cache = TokenCache(token_cache)
+        self.token_cache = token_cache
         super( CongressionalRecordIndexInputParser, self)
 
 
     def parse(self, inputdata, **kwargs):
-        '''input is a bytes io object '''
-        bytes_input = io.BytesIO(inputdata)
+        '''input is a bytes io object, an open file or an mmap'''
+        if isinstance(inputdata, mmap.mmap) or hasattr(inputdata, 'read'):
+            bytes_input = inputdata
+        else:
+            bytes_input = io.BytesIO(inputdata)
+        if kwargs.get('tokens'):
+            # ((name, title line), TokenSlice) of each stanza, for
+            # HtmlOutputParser or another renderer
+            stream = self.tokenize(bytes_input)
+            self.access_index = AccessIdIndex()
+            for parsed_stanza in self.name_stanzas(
+                    (title, stream.slice(start, stop))
+                    for title, start, stop in stream.documents()):
+                yield parsed_stanza
+            return
         for parsed_stanza in self.parse_io(
                 inputfile=bytes_input,
                 current_state=(
@@ -91,7 +143,9 @@ class CongressionalRecordIndexInputParser(InputParser):
                     b'G2'),
                 locator_table=CongressionalRecordIndexInputParser.LOCATOR_TABLE,
                 font_table=CongressionalRecordIndexInputParser.FONT_TABLE,
-                postfix=None, year=self.year):
+                postfix=None, year=self.year,
+                processes=kwargs.get('processes'),
+                cache=kwargs.get('cache')):
 
             yield parsed_stanza
 
@@ -115,69 +169,389 @@ class CongressionalRecordIndexInputParser(InputParser):
             outputfile=None,
             locator_table=None,
             font_table=None,
-            postfix=None, year=None):
+            postfix=None, year=None, processes=None, cache=None):
         ''' output by default is a StringIO object, you will probably want to
         output = parse_io(...)
         output.seek(0)
         to rewind to the begining.  Alternatively you can pass in a file handle.
+
+        With processes (or the parser's processes) the stanzas are rendered
+        in that many worker processes, and with a cache (or the parser's
+        cache) unchanged stanzas come from the cache, see render_sections().
         '''
 
         if self.year and not year:
             year = self.year
-        orig_current_state = current_state
-        outputs = {}
-        inputdata = inputfile.read()
+        if processes is None:
+            processes = self.processes
+        if cache is None:
+            cache = self.cache
+        # the names given so far, see access_ids()
+        self.access_index = AccessIdIndex()
+        if isinstance(inputfile, mmap.mmap):
+            # make_stanzas() reads the mapped file in place
+            inputdata = inputfile
+        else:
+            inputdata = inputfile.read()
+        if cache is not None or (processes and processes > 1):
+            rendered = self.render_sections(
+                inputdata, current_state, locator_table, font_table, postfix,
+                year, processes, cache)
+        else:
+            dispatch = self.dispatch_table(locator_table, font_table)
+            rendered = (
+                self.render_stanza(stanza, current_state, locator_table,
+                                   font_table, postfix, year, dispatch)
+                for stanza in self.make_stanzas(inputdata))
+        for parsed_stanza in self.name_stanzas(rendered):
+            yield parsed_stanza
+
+    def name_stanzas(self, rendered):
+        '''((name, title line), output) for each (title, output) of rendered,
+        a stanza without a title gets the name of the one before it.  The
+        names go in self.access_index.'''
         name = ""
-        for stanza in self.make_stanzas(inputdata):
-            logger.debug("CRI stanza:%s", stanza)
-            out = io.StringIO()
-            # For every sub document in the dat file reset the state to the
-            # start
-            current_state = orig_current_state
-            current_state_stack = []
-            cnt = 0
-            for page, page_match, line in self.makelines(stanza, output=out):
-                ret_current_state_stack, output_line = process_lines(
-                    line,
-                    current_state,
-                    outputf=out,
-                    locator_table=locator_table,
-                    font_table=font_table,
-                    postfix=postfix)
-                current_state = ret_current_state_stack[-1]
-                logger.debug("Current state:%s", current_state)
-                logger.debug("Previous state :%s", ret_current_state_stack[0])
-                logger.debug("[%d] line:[%s] states[%s]", cnt, line, ret_current_state_stack)
-                current_state_stack.append( ( ret_current_state_stack, line))
-                cnt=cnt+1
-
-            # check all non first items in stack if they exist and have a bellcode
-            for state, line  in current_state_stack :
-                # first item in every state is the previous state, so skip it
-                if state[1]:
-                    for action, grid in state[1:]:
-                        if action and action.get('bellcode') == b'I01':
-                            name ,cleaned_line= self.process_stanza_title(line,year)
-                            line_name = cleaned_line
-
-            if current_state[0] and current_state[0].get('end'):
-                logger.debug(
-                    "\tcurrent_state.end:%s",
-                    current_state[0].get('end'))
-                output(current_state[0].get('end'), outf=out)
-            # rewind to the begining now that we are finshed with output.
-            out.seek(0)
+        line_name = None
+        for title, out in rendered:
+            if title:
+                name, line_name = title
             # if there is no name then we don't bother with the section
-            if name:
-                outputs[name] = out
+            if name and self.access_index.add(name, line_name) and \
+                    len(self.access_index.stanzas[name]) == 2:
+                logger.warning("%s names more than one stanza, the last one is kept",
+                               name.decode('utf-8', 'replace'))
 
             yield ((name, line_name) , out )
 
+    def tokenize(self, inputfile, current_state=(None, b'G2'), locator_table=None,
+                 font_table=None, postfix=None, year=None, cache=None):
+        '''The stanzas of parse_io() as one locator.tokens.TokenStream, each
+        ended by a STANZA token with its title.  With a cache (or the
+        parser's token_cache) the stream of an input seen before comes from
+        the cache.'''
+        locator_table = locator_table or self.LOCATOR_TABLE
+        font_table = font_table or self.FONT_TABLE
+        year = year or self.year
+        if cache is None:
+            cache = self.token_cache
+        elif isinstance(cache, str):
+            from locator.tokencache import TokenCache
+            cache = TokenCache(cache)
+        if isinstance(inputfile, mmap.mmap):
+            inputdata = inputfile
+        else:
+            inputdata = inputfile.read()
+        dispatch = self.dispatch_table(locator_table, font_table)
+        if cache is not None:
+            key = cache.key(self.token_version(current_state, locator_table, font_table,
+                                               postfix, year), inputdata)
+            stream = cache.get(key, dispatch)
+            if stream is not None:
+                return stream
+        stream = TokenStream()
+        for stanza in self.make_stanzas(inputdata):
+            stream.stanza(self.emit_stanza(stanza, current_state, stream, locator_table,
+                                           font_table, postfix, year, dispatch))
+        if cache is not None:
+            cache.put(key, stream, dispatch)
+        return stream
+
+    def token_version(self, current_state, locator_table, font_table, postfix,
+                      year=None):
+        '''The tokenizer version tokenize() keys cached streams with.'''
+        from locator.tokencache import tokenizer_version, without_html
+        return tokenizer_version(type(self).__name__, without_html(locator_table),
+                                 without_html(font_table), self.ESCAPE_SEQUENCES,
+                                 self.TITLE_ESCAPES, self.NORMALIZER, year, postfix,
+                                 current_state)
+
+    def render_stanza(self, stanza, current_state, locator_table, font_table,
+                      postfix, year, dispatch=None):
+        '''Convert one stanza, every stanza starts from current_state.
+        Returns ((name, title line), output) if the stanza has an I01 title,
+        else (None, output).  output is a rewound StringIO.'''
+        out = io.StringIO()
+        sink = OutputSink(out)
+        title = self.emit_stanza(stanza, current_state, sink, locator_table,
+                                 font_table, postfix, year, dispatch)
+        sink.flush()
+        # rewind to the begining now that we are finshed with output.
+        out.seek(0)
+        return title, out
+
+    def emit_stanza(self, stanza, current_state, sink, locator_table, font_table,
+                    postfix, year, dispatch=None):
+        '''render_stanza() into sink, an OutputSink or a TokenStream, and
+        return the title.'''
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.stanza(stanza)
+        if dispatch is None:
+            dispatch = self.dispatch_table(locator_table, font_table)
+        current_state_stack = []
+        cnt = 0
+        for page, page_match, line in self.makelines(stanza):
+            ret_current_state_stack, output_line = process_lines(
+                line,
+                current_state,
+                outputf=sink,
+                locator_table=locator_table,
+                font_table=font_table,
+                postfix=postfix,
+                dispatch=dispatch)
+            current_state = ret_current_state_stack[-1]
+            if tracer is not None:
+                tracer.stanza_line(cnt, line, ret_current_state_stack)
+            current_state_stack.append( ( ret_current_state_stack, line))
+            cnt=cnt+1
+
+        title = None
+        profiler = profiling.get_profiler()
+        # check all non first items in stack if they exist and have a bellcode
+        for state, line  in current_state_stack :
+            # first item in every state is the previous state, so skip it
+            if state[1]:
+                for action, grid in state[1:]:
+                    if action and action.get('bellcode') == b'I01':
+                        if profiler is not None:
+                            start = profiler.start()
+                        title = self.process_stanza_title(line,year)
+                        if profiler is not None:
+                            profiler.stop('title', start, len(line), len(title[0]))
+
+        if current_state[0]:
+            if tracer is not None and current_state[0].get('end'):
+                tracer.stanza_end(current_state[0].get('end'))
+            sink.end(current_state[0])
+        return title
+
+    def parse_io_parallel(self, inputdata, current_state, locator_table,
+                          font_table, postfix, year, processes,
+                          sections_per_task=None):
+        '''render_sections() in a pool of processes, without a cache.'''
+        return self.render_sections(inputdata, current_state, locator_table,
+                                    font_table, postfix, year, processes,
+                                    sections_per_task=sections_per_task)
+
+    def cache_version(self, current_state, locator_table, font_table,
+                      postfix, year):
+        '''The table version render_sections() keys cached stanzas with.'''
+        from locator.rendercache import table_version
+        return table_version(type(self).__name__, locator_table, font_table,
+                             self.ESCAPE_SEQUENCES, self.TITLE_ESCAPES,
+                             self.NORMALIZER, year, postfix, current_state)
+
+    def render_sections(self, inputdata, current_state, locator_table,
+                        font_table, postfix, year, processes=None, cache=None,
+                        sections_per_task=None):
+        '''Yield render_stanza() results for inputdata, in order, rendered
+        in a pool of processes and/or looked up in a RenderCache.
+
+        inputdata is split into \x07I01 sections.  A section that is exactly
+        one stanza is looked up in cache, by its bytes and cache_version(),
+        and rendered (by a worker with processes) and stored if it isn't
+        there.  Anything else (text before the first \x07I01, a section whose
+        pieces don't pair up on their own, a stanza that failed) is redone
+        here the way make_stanzas() would, so the output and any error are
+        the same as parse_io() without processes or a cache.
+
+        For the pool inputdata is copied once into shared memory and the
+        workers are sent (start, end) offsets of sections, so only the
+        rendered html is pickled.  The workers use the class tables (which
+        can't always be pickled), other tables are rendered here.
+        '''
+        dispatch = self.dispatch_table(locator_table, font_table)
+        if dispatch is not self.dispatch_table():
+            processes = None
+        sections = list(stanza_sections(inputdata))
+        keys = {}
+        cached = {}
+        if cache is not None:
+            version = self.cache_version(current_state, locator_table,
+                                         font_table, postfix, year)
+            for start, end in sections:
+                if inputdata[start:start + 4] != b'\x07I01':
+                    # the text before the first stanza
+                    continue
+                key = cache.key(version, inputdata[start:end])
+                hit = cache.get(key)
+                if hit is None:
+                    keys[start, end] = key
+                else:
+                    cached[start, end] = hit
+        shared = None
+        pool = None
+        try:
+            if processes and processes > 1:
+                todo = [section for section in sections if section not in cached]
+                if todo:
+                    if not sections_per_task:
+                        sections_per_task = STANZA_BATCH
+                    batches = [todo[i:i + sections_per_task]
+                               for i in range(0, len(todo), sections_per_task)]
+                    import concurrent.futures
+                    from multiprocessing import shared_memory
+                    shared = shared_memory.SharedMemory(create=True, size=max(len(inputdata), 1))
+                    shared.buf[:len(inputdata)] = inputdata
+                    pool = concurrent.futures.ProcessPoolExecutor(
+                        processes, initializer=_init_stanza_worker,
+                        initargs=(type(self), year, shared.name, current_state,
+                                  postfix))
+                    rendered = (result for results in ordered_map(
+                        pool, _render_sections, batches, processes * 2)
+                                for result in results)
+            pending = None
+            for section in sections:
+                if section in cached:
+                    result = cached[section]
+                elif pool is not None:
+                    result = next(rendered)
+                elif pending is None:
+                    result = self.render_section(
+                        inputdata, section[0], section[1], current_state,
+                        locator_table, font_table, postfix, year, dispatch)
+                else:
+                    result = None
+                if pending is None and result is not None:
+                    title, html = result
+                    if section in keys:
+                        cache.put(keys[section], title, html)
+                    yield title, io.StringIO(html)
+                    continue
+                for piece in self.section_pieces(inputdata, *section):
+                    if pending is None:
+                        pending = piece
+                    else:
+                        yield self.render_stanza(pending + piece, current_state, locator_table,
+                                                 font_table, postfix, year, dispatch)
+                        pending = None
+            if pending is not None:
+                yield self.render_stanza(pending, current_state, locator_table,
+                                         font_table, postfix, year, dispatch)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if shared is not None:
+                shared.close()
+                shared.unlink()
+
+    def render_section(self, input, start, end, current_state, locator_table,
+                       font_table, postfix, year, dispatch=None):
+        '''(title, html) of the input[start:end] section if it is one whole
+        stanza that renders, else None.'''
+        try:
+            pieces = self.section_pieces(input, start, end)
+            if len(pieces) != 2:
+                return None
+            title, out = self.render_stanza(
+                pieces[0] + pieces[1], current_state, locator_table,
+                font_table, postfix, year, dispatch)
+        except Exception:
+            # redone by render_sections(), which raises it in order
+            return None
+        return title, out.getvalue()
+
+    def access_ids(self, inputdata, year=None):
+        '''An AccessIdIndex of the names parse_io() would give the stanzas
+        of inputdata (bytes, an mmap or a file), in one pass over the title
+        lines without rendering the stanzas.'''
+        if not year:
+            year = self.year
+        if hasattr(inputdata, 'read'):
+            inputdata = inputdata.read()
+        index = AccessIdIndex()
+        name = ""
+        for stanza in self.make_stanzas(inputdata):
+            title = None
+            for page, page_match, line in self.makelines(stanza):
+                for locator in find_locators(line):
+                    if locator.group('locator') == b'I01':
+                        title = self.process_stanza_title(line, year)
+            if title:
+                name, line_name = title
+            if name:
+                index.add(name, line_name)
+        return index
+
+    def stanza_ranges(self, input):
+        '''(start, end, piece, stanza) of each make_stanzas() stanza of
+        input (bytes, an mmap or a memoryview): the stanza is the pieces
+        piece and piece + 1 of the section_pieces() of the sections in
+        input[start:end], see locator.titleindex.'''
+        pending = None
+        for start, end in stanza_sections(input):
+            for number, piece in enumerate(self.section_pieces(input, start, end)):
+                if pending is None:
+                    pending = (start, end, number, piece)
+                else:
+                    yield pending[0], end, pending[2], pending[3] + piece
+                    pending = None
+        if pending is not None:
+            yield pending
+
+    def title_index(self, inputdata, year=None):
+        '''The locator.titleindex.TitleIndex of inputdata (bytes, an mmap or
+        a file) for extract(), named as access_ids() names the stanzas.  A
+        stanza before any title has no name in parse() and is left out.'''
+        from locator.titleindex import TitleIndex
+        if not year:
+            year = self.year
+        if hasattr(inputdata, 'read'):
+            inputdata = inputdata.read()
+        index = TitleIndex(size=len(inputdata), year=year)
+        name = b''
+        for start, end, piece, stanza in self.stanza_ranges(inputdata):
+            title = None
+            for page, page_match, line in self.makelines(stanza):
+                for locator in find_locators(line):
+                    if locator.group('locator') == b'I01':
+                        title = self.process_stanza_title(line, year)
+            if title:
+                name, line_name = title
+            if name:
+                index.stanzas.append((name, line_name, start, end, piece))
+        return index
+
+    def extract(self, inputfile, index, names=None, prefix=None, pattern=None,
+                current_state=(None, b'G2'), locator_table=None, font_table=None,
+                postfix=None):
+        '''Yield ((name, title line), output) of the stanzas of inputfile (a
+        seekable file, an mmap or bytes) that index.select(names, prefix,
+        pattern) picks from its title_index(), as parse() yields them.  Only
+        those stanzas are read and rendered.'''
+        if not locator_table:
+            locator_table = self.LOCATOR_TABLE
+        if not font_table:
+            font_table = self.FONT_TABLE
+        dispatch = self.dispatch_table(locator_table, font_table)
+        for name, line, start, end, piece in index.select(names, prefix, pattern):
+            if hasattr(inputfile, 'read') and not isinstance(inputfile, mmap.mmap):
+                inputfile.seek(start)
+                section = inputfile.read(end - start)
+            else:
+                section = inputfile[start:end]
+            pieces = []
+            for section_start, section_end in stanza_sections(section):
+                pieces.extend(self.section_pieces(section, section_start, section_end))
+            _, out = self.render_stanza(b''.join(pieces[piece:piece + 2]), current_state,
+                                        locator_table, font_table, postfix, index.year,
+                                        dispatch)
+            yield (name, line), out
+
+    def extract_file(self, filename, names=None, prefix=None, pattern=None):
+        '''extract() from a file, with its title index kept next to it (see
+        locator.titleindex.file_title_index()).'''
+        from locator.titleindex import file_title_index
+        index = file_title_index(self, filename)
+        with open(filename, 'rb') as inputfile:
+            for parsed_stanza in self.extract(inputfile, index, names, prefix, pattern):
+                yield parsed_stanza
+
     def process_stanza_title(self, line, year):
         """given a line with I01 get the name for the output file"""
         # new stanza title, should only be one per stanza remove
         # bellcode.
-        cleaned_line =  clean_line (re.sub( b'\x07I01',b'', line))
+        cleaned_line =  clean_line (line.replace(b'\x07I01', b''))
         cleaned_line = cleaned_line.strip()
         # remove fonts "T"
         output_cleaned_line = b""
@@ -192,12 +566,11 @@ class CongressionalRecordIndexInputParser(InputParser):
             cleaned_line = output_cleaned_line
 
         '''For names (i.e output filenames we don't process accents
-        so we pass in the FakeEscapeSequences() class  that always
+        so we pass in the blank escape table (TITLE_ESCAPES) that always
         returns b'' for any matching escape sequnces
         '''
-        fs = FakeEscapeSequences()
         cleaned_line =  process_escapes_in_line(cleaned_line, 'G2',
-                            escape_sequences=fs)
+                            escape_sequences=self.TITLE_ESCAPES)
         name = CongressionalRecordIndexInputParser.process_title(year, cleaned_line)
         return name, cleaned_line
 
@@ -245,52 +618,7 @@ class CongressionalRecordIndexInputParser(InputParser):
         Unfortunately it doesn't really work as they aren't using the exact same
         source title from the locator code that we generate.
         '''
-        mymap = copy.deepcopy(MAPPING)
-        mymap[b'\xff09'] = b'-'
-        mymap[b'&ndash'] = b'-'
-        title = title.upper()
-
-        title = translate_chars(title, mymap)   # tab to space
-        title_prefix = title[:40]
-        title_suffix = None
-        if len(title) > 40:
-            title_suffix = title[40:]
-
-        paren = title_prefix.find(b"(")
-        if paren and paren >= 0:
-            title_prefix = title_prefix[0:paren]
-            title_suffix = title[paren:]
-
-        #convert prefix to uppercase
-        title_prefix = title_prefix.decode('utf-8').upper()
-        title_prefix = title_prefix.encode('utf-8')
-        # convert period to hypen
-        title_prefix = re.sub(b'[\.]', b'-', title_prefix )
-        #remove all punctuation
-        title_prefix = re.sub(b'[^0-9a-zA-Z\-\s]+', b'', title_prefix )
-        # remove trailing spaces:
-        title_prefix = re.sub(b'\s+$', b'', title_prefix)
-        #convert space to hyphen
-        title_prefix = re.sub(b'[\s]+', b'-', title_prefix )
-        md5_title_suffix = None
-        if title_suffix:
-            md5 = hashlib.md5()
-            if isinstance(title_suffix, bytes):
-                md5.update(title_suffix)
-            else:
-                md5.update(title_suffix.encode('utf-8'))
-
-            # get the first 6 of the lowercase hex representation as bytes
-            md5_title_suffix = md5.hexdigest()[:6].upper()
-            md5_title_suffix = md5_title_suffix.encode('utf-8')
-            output = b"CRI-%d-%b-%b.htm" % (year,  title_prefix, md5_title_suffix)
-        else:
-            output = b"CRI-%d-%b.htm" % (year,  title_prefix)
-
-        # remove duplicate hyphens with one hypen
-        output = re.sub(b'\-+', b'-', output )
-
-        return output
+        return access_id(year, title)
 
     def article_name(self, name):
         '''clean up article title into a common name output,
@@ -316,20 +644,26 @@ class CongressionalRecordIndexInputParser(InputParser):
         '''
 
         input = input.strip()  # remove leading spaces
-        logger.debug("Input:%s", input)
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.input(input)
         all_text = re.split(b'(\x07I|\x07F\d+)', input)
         for bell, line in grouper(all_text, 2, fillvalue=b''):
             # '\x007GKTPol1foo' -> '\x007GKTPol1', 'foo'
             # 1) The set of bell+ characters defined by c_current_keep_set
             #    signifies sequences which must remain on a given line.
 
-            logger.debug("bell :[%s]", bell)
-            logger.debug("line :[%s]", line)
             full_line = bell + line
-            full_line = remove_chars(full_line, REMOVE_CHARS)
+            profiler = profiling.get_profiler()
+            if profiler is not None:
+                start = profiler.start()
+                size = len(full_line)
+            full_line = self.NORMALIZER.remove(full_line)
+            if profiler is not None:
+                profiler.stop('clean_line', start, size, len(full_line))
             page, m = self.find_page(full_line)
-            logger.debug("\tFull_line:%s", full_line)
-            logger.debug("\tyield:%s %s %s", page, m, full_line)
+            if tracer is not None:
+                tracer.line(page, m, full_line)
             yield (page, m, full_line)
 
     def make_stanzas(self, input):
@@ -348,10 +682,22 @@ class CongressionalRecordIndexInputParser(InputParser):
         would yield these 2 elements of stanzas = [
         '\x07I01Title\n\x07I02 foo\n\x07I03bar',
         '\x07I01Second title\n\x07I02 foo\n\x07I03bar' ]
+        input can also be an mmap or memoryview, which is split at each
+        \x07I01 in place and only a stanza at a time is copied.
         '''
+        if not isinstance(input, bytes):
+            for stanza in self._make_buffer_stanzas(input):
+                yield stanza
+            return
         # remove starting \x07F\d+
         input = re.sub(b'\x07F\d+', b'', input)
-        full_line = remove_chars(input.strip(), REMOVE_CHARS)
+        profiler = profiling.get_profiler()
+        if profiler is not None:
+            start = profiler.start()
+            size = len(input)
+        full_line = self.NORMALIZER.remove(input.strip())
+        if profiler is not None:
+            profiler.stop('clean_line', start, size, len(full_line))
         # split into stanzas and remove empty lines
         stanzas = [
             x.strip()
@@ -361,68 +707,163 @@ class CongressionalRecordIndexInputParser(InputParser):
         for bell, line in grouper(stanzas, 2, fillvalue=b''):
             yield bell + line
 
-import collections
-
-
-class FakeEscapeSequences(collections.MutableMapping):
-    """Change the normal escape sequences for accents to always
-    return an empty action for titles to not process accented chars.
-    """
+    def _make_buffer_stanzas(self, input):
+        '''make_stanzas() for a buffer, one \x07I01 section at a time.  The
+        \x07F and REMOVE_CHARS removals never reach into a \x07I01 so each
+        section can be cleaned on its own.'''
+        pending = None
+        for start, end in stanza_sections(input):
+            for x in self.section_pieces(input, start, end):
+                if pending is None:
+                    pending = x
+                else:
+                    yield pending + x
+                    pending = None
+        if pending is not None:
+            yield pending
+
+    def section_pieces(self, input, start, end):
+        '''The cleaned, non empty pieces of re.split(b'(\x07I01)', ...) for
+        the input[start:end] section, make_stanzas() pairs them up.'''
+        section = re.sub(b'\x07F\d+', b'', bytes(input[start:end]))
+        section = self.NORMALIZER.remove(section)
+        return [x for x in (x.strip() for x in re.split(b'(\x07I01)', section)) if x != b'']
+
+def stanza_sections(input):
+    '''(start, end) offsets of the \x07I01 sections of input, the text
+    before the first \x07I01 included.  make_stanzas() cleans and splits each
+    section on its own.'''
+    starts = [m.start() for m in re.finditer(b'\x07I01', input)]
+    for start, end in zip([0] + starts, starts + [len(input)]):
+        if end > start:
+            yield start, end
+
+
+# set in each worker process by _init_stanza_worker()
+_stanza_worker = None
+
+def _init_stanza_worker(parser_class, year, shared_name, current_state, postfix):
+    global _stanza_worker
+    from multiprocessing import shared_memory
+    shared = shared_memory.SharedMemory(name=shared_name)
+    _stanza_worker = (parser_class(year=year), shared, current_state, postfix)
+
+
+def _render_sections(sections):
+    '''render_section() for each (start, end) section.'''
+    parser, shared, current_state, postfix = _stanza_worker
+    return [parser.render_section(shared.buf, start, end, current_state,
+                                  parser.LOCATOR_TABLE, parser.FONT_TABLE,
+                                  postfix, parser.year)
+            for start, end in sections]
+
+
+def render_stanzas(parser_class, year, current_state, postfix, stanzas):
+    '''(title, html) of each make_stanzas() stanza, with the class tables.
+    For locator.aio, which runs it in an executor.'''
+    parser = parser_class(year=year)
+    dispatch = parser.dispatch_table()
+    rendered = []
+    for stanza in stanzas:
+        title, out = parser.render_stanza(stanza, current_state, parser.LOCATOR_TABLE,
+                                          parser.FONT_TABLE, postfix, year, dispatch)
+        rendered.append((title, out.getvalue()))
+    return rendered
+
+
+@functools.lru_cache(maxsize=TITLE_CACHE_SIZE)
+def access_id(year, title):
+    '''The accessId file name of a title, see
+    CongressionalRecordIndexInputParser.process_title().  Titles are
+    remembered, a cumulative index names the same entries year after year.'''
+    title = title.upper()
+    for pattern, replacement in TITLE_TRANSLATIONS:   # tab to space
+        title = pattern.sub(replacement, title)
+    title_prefix = title[:40]
+    title_suffix = None
+    if len(title) > 40:
+        title_suffix = title[40:]
+
+    paren = title_prefix.find(b"(")
+    if paren and paren >= 0:
+        title_prefix = title_prefix[0:paren]
+        title_suffix = title[paren:]
+
+    #convert prefix to uppercase
+    title_prefix = title_prefix.decode('utf-8').upper()
+    title_prefix = title_prefix.encode('utf-8')
+    # convert period to hypen
+    title_prefix = title_prefix.replace(b'.', b'-')
+    #remove all punctuation
+    title_prefix = TITLE_PUNCTUATION.sub(b'', title_prefix)
+    # remove trailing spaces:
+    title_prefix = TITLE_TRAILING_SPACE.sub(b'', title_prefix)
+    #convert space to hyphen
+    title_prefix = TITLE_SPACES.sub(b'-', title_prefix)
+    if title_suffix:
+        # get the first 6 of the lowercase hex representation as bytes
+        import hashlib
+        md5_title_suffix = hashlib.md5(title_suffix).hexdigest()[:6].upper()
+        md5_title_suffix = md5_title_suffix.encode('utf-8')
+        output = b"CRI-%d-%b-%b.htm" % (year,  title_prefix, md5_title_suffix)
+    else:
+        output = b"CRI-%d-%b.htm" % (year,  title_prefix)
+
+    # remove duplicate hyphens with one hypen
+    return TITLE_HYPHENS.sub(b'-', output)
+
+
+class AccessIdIndex(object):
+    '''The stanzas given each accessId, in the order they were added.
+
+    Stanzas that get the same name are written to the same file and the
+    last one wins, collisions() lists them.
+    '''
 
-    def __init__(self, *args, **kwargs):
-        self.store = {}
-        empty_action =    { 'desc':'no accented chars allowed in titles', 'html':b'' }
-        for k, action in CongressionalRecordIndexInputParser.ESCAPE_SEQUENCES.items():
-            self.store[k] = empty_action
-            #if action.get('desc'):
-            #    self.store[k] = empty_action
-            #else:
-            #    new_dict = {}
-            #    for k1, v1 in action.items():
-            #        new_dict[k1] = empty_action
-            #    self.store[k] = new_dict
-        import pprint
-        pp = pprint.PrettyPrinter(indent=4)
-        logger.debug("fake:%s", pp.pformat(self.store))
-
-        self.update(dict(*args, **kwargs))  # use the free update to set keys
-
-    def __getitem__(self, key):
-        action = self.store[key]
-        return action
-        #return self.store[self.__keytransform__(key)]
-
-    def __setitem__(self, key, value):
-        self.store[key] = value
-
-    def __delitem__(self, key):
-        del self.store[key]
+    def __init__(self):
+        # name -> [(stanza number, title line), ...]
+        self.stanzas = collections.OrderedDict()
+        self.count = 0
+
+    def add(self, name, line):
+        '''Record the next stanza, True if name was already taken.'''
+        stanzas = self.stanzas.setdefault(name, [])
+        stanzas.append((self.count, line))
+        self.count += 1
+        return len(stanzas) > 1
+
+    def collisions(self):
+        '''{name: [(stanza number, title line), ...]} of the names given to
+        more than one stanza.'''
+        return collections.OrderedDict(
+            (name, stanzas) for name, stanzas in self.stanzas.items() if len(stanzas) > 1)
+
+    def report(self, outf=sys.stdout):
+        for name, stanzas in self.collisions().items():
+            outf.write('%s\n' % name.decode('utf-8', 'replace'))
+            for number, line in stanzas:
+                outf.write('\t%d\t%s\n' % (number, line.decode('utf-8', 'replace')))
 
     def __iter__(self):
-        return iter(self.store)
+        return iter(self.stanzas)
 
     def __len__(self):
-        return len(self.store)
+        return len(self.stanzas)
 
-    def __repr__(self):
-        dictrepr = dict.__repr__(self.store)
-        return '%s(%s)' % (type(self).__name__, dictrepr)
+    def __contains__(self, name):
+        return name in self.stanzas
 
 
-class FakeEscapeSequencesxxx(dict):
+class FakeEscapeSequences(EscapeTable):
+    """Change the normal escape sequences for accents to always
+    return an empty action for titles to not process accented chars.
+    This is just the ESCAPE_SEQUENCES table compiled blank: every escape is
+    dropped and the char before it kept.
+    """
+
     def __init__(self, *args, **kwargs):
-        self.update(*args, **kwargs)
+        super(FakeEscapeSequences, self).__init__(
+            CongressionalRecordIndexInputParser.ESCAPE_SEQUENCES, blank=True)
 
     def __repr__(self):
-        dictrepr = dict.__repr__(self)
-        return '%s(%s)' % (type(self).__name__, dictrepr)
-
-    def __getitem__(self, key):
-        ''' If name is in ESCAPE_SEQUENCE  return empty action
-        '''
-        action = CongressionalRecordIndexInputParser.ESCAPE_SEQUENCES.get(key)
-        if action:
-            logger.debug("Searching for %s", key)
-            return { 'desc':'no accented chars allowed in titles', 'html':b'' }
-        return action
-
+        return '%s()' % type(self).__name__
@@ -0,0 +1,207 @@
+'''Synthetic locator files for benchmarks and tests.
+
+    python -m locator.generate dd 10 >digest.rec          # about 10 MB
+    python -m locator.generate cri 50 --seed 2 >CRI-2014.rec
+
+daily_digest() and congressional_record_index() build input shaped like the
+GPO files: the \x07Z job header, \x07I32/\x07I33 dates, \x07I90 page markers,
+the bell codes of the parser's LOCATOR_TABLE and FONT_TABLE, accent and
+other \xff escapes, page references and, for the index, \x07I01 stanzas.
+The same seed and size always give the same bytes, and the output parses
+without the errors the real parsers raise on malformed input.
+'''
+import argparse
+import random
+import sys
+
+from locator import ESCAPE_SEQUENCES
+from locator.dailydigest import DailyDigestInputParser
+
+MB = 1000 * 1000
+
+WORDS = [
+    b'Senate', b'House', b'committee', b'agreed', b'to', b'the', b'of', b'and',
+    b'amendment', b'bill', b'consideration', b'resolution', b'Act', b'for',
+    b'provide', b'development', b'water', b'resources', b'authorize', b'vote',
+    b'passed', b'continued', b'nomination', b'hearing', b'Secretary', b'Defense',
+    b'appropriations', b'fiscal', b'year', b'2016', b'S.', b'H.R.', b'No.',
+    b'conference', b'report', b'Chamber', b'Action', b'Routine', b'Proceedings',
+]
+NAMES = [
+    b'ADAMS', b'BAKER', b'CARDENAS', b'DAVIS', b'ESHOO', b'FLORES', b'GARCIA',
+    b'HASTINGS', b'INHOFE', b'JOHNSON', b'KING', b'LUJAN', b'MCCONNELL',
+    b'NUNEZ', b'OLSON', b'PEREZ', b'QUIGLEY', b'REED', b'SMITH', b'TORRES',
+]
+FIRST_NAMES = [b'ALEXA', b'BEN RAY', b'CHARLES', b'DIANE', b'EDWARD', b'JAMES',
+               b'MARIA', b'PAUL A.', b'RUBEN', b'SUSAN']
+STATES = [b'New York', b'Puerto Rico', b'California', b'Texas', b'Ohio', b'Guam']
+SUBJECTS = [b'ACT', b'AUTHORITY', b'FOUNDATION', b'COMMISSION', b'PROGRAM',
+            b'RESEARCH', b'DEVELOPMENT', b'DEPARTMENT OF DEFENSE', b'AIRPORT']
+# accented names, % a vowel
+ACCENTED = [b'Luj%s\xffAE1n', b'Jos%s\xffAE1', b'Ca%s\xffAE1rdenas']
+# the page reference of a Daily Digest paragraph, \x19 is a space and
+# \xff09 an ndash
+PAGES = b'\x07LPages\x19S%d\xff09S%d'
+DD_HEADER = (b'\x07Z! EXT .000 ...DIGEST PERSONAL COMPUTER\\J\\059060-A14SE9-000'
+             b'-*****-*****-Payroll No.: 16926 -Name: mc -Folios: 1-4 '
+             b'-Date: 09/14/16 -Subformat:  \x07F0627 \x07I32September 14, 2016'
+             b'\x07I33September 14, 2016\x07I01Wednesday, September 14, 2016'
+             b'\xa8D%d\xad\x07I02Daily Digest\x07T1 ')
+
+
+def _escape_pieces():
+    '''Text with each escape in ESCAPE_SEQUENCES, a char followed by
+    \xff<esc>.'''
+    pieces = []
+    for esc, action in sorted(ESCAPE_SEQUENCES.items()):
+        chars = [c for c in action if c not in ('desc', 'html')]
+        if chars:
+            for char in sorted(chars):
+                if isinstance(char, str):
+                    char = char.encode('latin1')
+                pieces.append(char + b'\xff' + esc)
+        else:
+            pieces.append(b'x\xff' + esc)
+    return pieces
+
+
+ESCAPES = _escape_pieces()
+
+
+class _Writer(object):
+    '''Random text for the generators.'''
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def words(self, low, high, escapes=True):
+        r = self.random
+        words = []
+        for _ in range(r.randint(low, high)):
+            k = r.random()
+            if escapes and k < 0.02:
+                words.append(r.choice(ESCAPES))
+            elif escapes and k < 0.03:
+                words.append(r.choice(ACCENTED) % r.choice([b'a', b'e', b'o']))
+            else:
+                words.append(r.choice(WORDS))
+        return b' '.join(words)
+
+    def code(self, code, low, high, escapes=True):
+        '''A bell code and its text, which can't start with a digit or it
+        would be read as part of the code.'''
+        text = self.words(low, high, escapes)
+        if text[:1].isdigit():
+            text = b' ' + text
+        return b'\x07' + code + text
+
+    def pages(self, page):
+        start = self.random.randint(page, page + 40)
+        return PAGES % (start, start + self.random.randint(1, 30))
+
+
+def daily_digest(size=MB, seed=0, parser_class=DailyDigestInputParser):
+    '''About size bytes of Daily Digest.  Headings, paragraphs and page
+    references use the codes of parser_class's LOCATOR_TABLE and
+    FONT_TABLE.'''
+    w = _Writer(seed)
+    r = w.random
+    table = parser_class.LOCATOR_TABLE
+    fonts = sorted(set(code for grid in parser_class.FONT_TABLE.values() for code in grid))
+    codes = sorted(code for code, action in table.items()
+                   if code != b'I01' and not code.startswith(b'G'))
+    grids = sorted(code for code in table if code.startswith(b'G'))
+    digest_page = 920
+    page = 5000
+    marker = 0
+    out = [DD_HEADER % digest_page]
+    length = len(out[0])
+    while length < size:
+        k = r.random()
+        if k < 0.08:
+            marker += 1
+            if r.random() < 0.2:
+                digest_page += 1
+            piece = b'\x07I90[D14SE6-%d]{D%d}%s' % (marker, digest_page, w.words(1, 3, False))
+        elif k < 0.1:
+            # the \x07Z deletion takes the code after it too
+            piece = b'\x07Z! EXT .000 ' + w.words(1, 6, False) + b'\x07F0627 '
+        elif k < 0.12:
+            piece = b'\x07S0627' + w.code(r.choice(grids), 1, 5)
+        else:
+            code = r.choice(codes)
+            # text in a grid b'' code can't have escapes, see
+            # process_escapes()
+            escapes = bool(table[code].get('grid'))
+            piece = w.code(code, 2, 30, escapes)
+            if r.random() < 0.3:
+                piece += w.code(r.choice(fonts), 1, 8, escapes)
+            if r.random() < 0.25:
+                page += r.randint(0, 5)
+                piece += w.pages(page)
+        out.append(piece)
+        length += len(piece)
+    out.append(b'\n')
+    return b''.join(out)
+
+
+def _title(w):
+    r = w.random
+    k = r.random()
+    if k < 0.6:
+        name = r.choice(NAMES)
+        if r.random() < 0.1:
+            name = b'ACEVEDO-VILA\xffAE1'
+        title = b'%s, %s' % (name, r.choice(FIRST_NAMES))
+        if r.random() < 0.4:
+            title += (b' \x07g009\x07T1(a Representative from %s)' % r.choice(STATES))
+    else:
+        title = b' '.join(r.choice(WORDS).upper() for _ in range(r.randint(1, 5)))
+        title += b' ' + r.choice(SUBJECTS)
+    # a serial number keeps most names distinct, as in a real index
+    return title + b' %d' % r.randint(0, 10 ** 6)
+
+
+def congressional_record_index(size=MB, seed=0):
+    '''About size bytes of Congressional Record Index: \x07I01 title
+    stanzas of \x07I02, \x07I03 and \x07I05 entries.'''
+    w = _Writer(seed)
+    r = w.random
+    out = [b'\x07F89378\n\n']
+    length = len(out[0])
+    while length < size:
+        lines = [b'\x07I01' + _title(w) + b'\n']
+        for _ in range(r.randint(1, 8)):
+            code = r.choice([b'I02', b'I03', b'I05', b'I05', b'I05'])
+            line = w.code(code, 2, 14)
+            if code == b'I05':
+                line += b', %s%d [%02dSE]' % (r.choice([b'H', b'S', b'E']),
+                                             r.randint(1, 9999), r.randint(1, 30))
+            if r.random() < 0.1:
+                line += b' ' + w.code(b'T1', 1, 3)
+            lines.append(line + b'\n')
+        lines.append(b'\n')
+        stanza = b''.join(lines)
+        out.append(stanza)
+        length += len(stanza)
+    return b''.join(out)
+
+
+GENERATORS = {
+    'dd': daily_digest,
+    'cri': congressional_record_index,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic locator file to stdout.')
+    parser.add_argument('type', choices=sorted(GENERATORS))
+    parser.add_argument('megabytes', type=float, nargs='?', default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    data = GENERATORS[args.type](int(args.megabytes * MB), args.seed)
+    sys.stdout.buffer.write(data)
+
+
+if __name__ == '__main__':
+    main()
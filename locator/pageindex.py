@@ -0,0 +1,215 @@
+'''Page index of a Daily Digest, to render a page without the whole issue.
+
+parse_io() only finds the \x07I90...{D382} page lines on its way through
+a file.  A PageIndex lists where in the file each page starts and the
+parser state there, so InputParser.render_pages() can seek to a page and
+render just that page and the ones it is asked for after it:
+
+    parser = DailyDigestInputParser()
+    html = parser.render_file_pages('DD-2016-09-14.rec', b'D382')
+
+render_file_pages() keeps the index next to the file (the file name +
+PAGE_INDEX_SUFFIX) and makes it the first time, or again when the file is
+newer.  A page runs from its page line to the next page line, as the
+<center>[Page:D382] </center> marker parse_io() writes at the end of it
+says, the first page also gets what comes before its page line.  The html
+of pages first to last is that stretch of parse_io()'s html, in
+<html>..</html>, so rendering every page gives what parse_io() does.
+
+The index file is a header line and a tab separated line per page:
+
+    locator-page-index<TAB>1<TAB>size of the file
+    page<TAB>offset<TAB>grid<TAB>code<TAB>state grid
+
+offset is where the page's line starts in the file, (grid, code) the
+DispatchTable key of the action open there and state grid the grid of the
+state, - for None.
+'''
+import os
+
+from locator.parser import BELL_Z_RE, BELL_RE
+
+PAGE_INDEX_SUFFIX = '.pages'
+_MAGIC = 'locator-page-index'
+PAGE_INDEX_VERSION = 1
+
+
+def bell_line_offsets(buf):
+    '''(offset in buf, bell line) of each line makelines() makes from
+    buf.strip(), before the lines are cleaned.  buf is bytes, a memoryview
+    or an mmap.'''
+    start = 0
+    end = len(buf)
+    while start < end and buf[start:start + 1].isspace():
+        start += 1
+    while end > start and buf[end - 1:end].isspace():
+        end -= 1
+    pending = None
+    for piece in _bell_pieces(buf, start, end):
+        # paired up the way grouper() pairs them
+        if pending is None:
+            pending = piece
+        else:
+            yield pending[0], pending[1] + piece[1]
+            pending = None
+    if pending is not None:
+        yield pending
+
+
+def _bell_pieces(buf, start, end):
+    '''(offset, piece) of the non empty items of re.split(b'(\x07)') of
+    buf[start:end] after the bell+Z deletion, as buffer_bell_pieces() gives
+    them.  A piece joined up across a deletion starts where its first part
+    does.'''
+    # (offset, bytes) parts of the piece still open
+    text = []
+    last = start
+    for found in BELL_Z_RE.finditer(buf, start, end):
+        for piece in _split_bells(buf, last, found.start(), text):
+            yield piece
+        last = found.end()
+    for piece in _split_bells(buf, last, end, text):
+        yield piece
+    if text:
+        yield _joined(text)
+
+
+def _split_bells(buf, start, end, text):
+    position = start
+    for bell in BELL_RE.finditer(buf, start, end):
+        if bell.start() > position:
+            text.append((position, bytes(buf[position:bell.start()])))
+        if text:
+            yield _joined(text)
+            del text[:]
+        yield bell.start(), b'\x07'
+        position = bell.end()
+    if end > position:
+        text.append((position, bytes(buf[position:end])))
+
+
+def _joined(text):
+    return text[0][0], b''.join(part for _, part in text)
+
+
+# None in the index, codes and grids are never -
+_NONE = '-'
+
+
+def _field(value):
+    return _NONE if value is None else value.decode('latin1')
+
+
+def _value(field):
+    return None if field == _NONE else field.encode('latin1')
+
+
+class PageIndex(object):
+    '''The pages of one input: (page, offset, state) of each, in the
+    order they come.  state is ((grid, code) or None, grid), as
+    render_unit() takes it.  size is the size of the input.'''
+
+    def __init__(self, pages=None, size=None):
+        self.pages = pages or []
+        self.size = size
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def names(self):
+        return [page for page, _, _ in self.pages]
+
+    def find(self, first, last=None):
+        '''The positions in pages of first and last (first if None), pages
+        as bytes or str.  Raises KeyError for a page not in the index or a
+        last before first.'''
+        names = self.names()
+        first = _page(first)
+        last = first if last is None else _page(last)
+        try:
+            start = names.index(first)
+            stop = names.index(last, start)
+        except ValueError:
+            raise KeyError((first, last))
+        return start, stop
+
+    def write(self, filename):
+        with open(filename, 'w', encoding='utf-8', newline='\n') as index:
+            index.write('%s\t%d\t%d\n' % (_MAGIC, PAGE_INDEX_VERSION, self.size))
+            for page, offset, (key, grid) in self.pages:
+                key_grid, code = key or (None, None)
+                index.write('%s\t%d\t%s\t%s\t%s\n' % (
+                    _field(page), offset, _field(key_grid), _field(code), _field(grid)))
+
+    @classmethod
+    def read(cls, filename):
+        '''The PageIndex write() wrote, ValueError if filename is not one.'''
+        with open(filename, encoding='utf-8', newline='\n') as index:
+            header = index.readline().rstrip('\n').split('\t')
+            if len(header) != 3 or header[0] != _MAGIC or header[1] != str(PAGE_INDEX_VERSION):
+                raise ValueError("not a page index: %s" % filename)
+            pages = []
+            for line in index:
+                page, offset, key_grid, code, grid = line.rstrip('\n').split('\t')
+                key = None
+                if code != _NONE:
+                    key = (_value(key_grid), _value(code))
+                pages.append((_value(page), int(offset), (key, _value(grid))))
+        return cls(pages, int(header[2]))
+
+
+def _page(page):
+    if isinstance(page, str):
+        return page.encode('latin1')
+    return page
+
+
+def index_path(filename):
+    '''Where render_file_pages() keeps the index of filename.'''
+    return filename + PAGE_INDEX_SUFFIX
+
+
+def file_page_index(inputparser, filename):
+    '''The PageIndex of filename, read from next to it if it is there and
+    up to date, made and written there if not.'''
+    path = index_path(filename)
+    stat = os.stat(filename)
+    try:
+        if os.path.getmtime(path) >= stat.st_mtime:
+            index = PageIndex.read(path)
+            if index.size == stat.st_size:
+                return index
+    except (OSError, ValueError):
+        pass
+    with open(filename, 'rb') as inputfile:
+        index = inputparser.page_index(inputfile)
+    index.write(path)
+    return index
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(
+        description='Index the pages of a Daily Digest, or render some of them.')
+    parser.add_argument('input')
+    parser.add_argument('first', nargs='?', help='first page to render, e.g. D382')
+    parser.add_argument('last', nargs='?', help='last page to render (default: first)')
+    args = parser.parse_args(argv)
+    from locator.dailydigest import DailyDigestInputParser
+    inputparser = DailyDigestInputParser()
+    if args.first is None:
+        for page, offset, _ in file_page_index(inputparser, args.input):
+            sys.stdout.write('%s\t%d\n' % (page.decode('latin1'), offset))
+        return 0
+    sys.stdout.flush()
+    inputparser.render_file_pages(args.input, args.first, args.last,
+                                  outputfile=sys.stdout.buffer)
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,60 @@
 import re, os, sys
 import io
-import argparse
+import mmap
+import bisect
+import collections
+import itertools
 from locator import (
     grouper,
     process_lines,
+    compile_tables,
     output,
+    OutputSink,
+    fragment_bytes,
+    LOCATOR_PATTERN,
     remove_chars,
     REMOVE_CHARS,
-    translate_chars, MAPPING)
+    translate_chars, MAPPING,
+    NORMALIZER,
+    ESCAPE_TABLE)
+from locator import tracing
+from locator import profiling
+from locator.tokens import TokenStream, TokenRenderer, PageTokens
+from locator.writer import FileWriter
 import logging
 
 logger = logging.getLogger(__name__)
 
+# .2. bell+Z processing, see InputParser.makelines()
+BELL_Z = b'\x07Z.+?(\x07([a-zA-Z]\d+\s*)|$)'
+BELL_Z_RE = re.compile(BELL_Z)
+BELL_RE = re.compile(b'\x07')
+# the same for a partly read input: \Z so a trailing newline is not the end
+BELL_Z_STREAM = re.compile(b'\x07Z.+?(\x07([a-zA-Z]\d+\s*)|\Z)')
+# bytes read at a time by parse_io(chunk_size=...) style streaming
+CHUNK_SIZE = 1024 * 1024
+# bytes of input per worker task in InputParser.render_parallel()
+PARALLEL_CHUNK = 256 * 1024
+# bytes read at a time by InputParser.render_pages()
+PAGE_CHUNK = 64 * 1024
+
 
 def main():
+    # imported here, not at the top, to keep importing locator quick
+    import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("input")
     parser.add_argument("output", nargs='?')
+    parser.add_argument("--debug", action="store_true",
+                        help="log every line and locator code to stderr")
                        # type=argparse.FileType('w'))
     args = parser.parse_args()
+    if args.debug:
+        tracing.debug_logging()
     #print (args.input)
     logger.debug("Parsing with args :%s", args)
-    parser = LocatorParser()
+    from locator.dailydigest import DailyDigestInputParser
+    parser = DailyDigestInputParser()
     parser.parse_file(args.input, outputfile=args.output)
 
 
@@ -32,6 +65,20 @@ class InputParser(object):
     '''
     LOCATOR_TABLE = {}
     FONT_TABLE = {}
+    # compiled clean_line() used on every line by makelines()
+    NORMALIZER = NORMALIZER
+    # worker processes for parse_io(), see render_parallel()
+    processes = None
+    # a locator.tokencache.TokenCache tokenize() keeps its streams in
+    token_cache = None
+
+    @classmethod
+    def dispatch_table(cls, locator_table=None, font_table=None):
+        '''The DispatchTable process_lines() uses, LOCATOR_TABLE and
+        FONT_TABLE unless other tables are given.  Compiled once per class.
+        '''
+        return compile_tables(locator_table or cls.LOCATOR_TABLE,
+                              font_table or cls.FONT_TABLE)
 
     def parse(self, inputdata, **kwargs):
         '''Input parser's .parse() returns a list , but for the default case
@@ -41,23 +88,52 @@ class InputParser(object):
             do stuff (x)
         '''
         logger.debug("Entering InputParser.parse(%s", inputdata)
+        if kwargs.get('tokens'):
+            # the TokenStream, for HtmlOutputParser or another renderer
+            yield self.tokenize(inputdata, chunk_size=kwargs.get('chunk_size'))
+            return
         #outputStream = io.BytesIO()
         outputStream = io.StringIO()
-        io_output = self.parse_io(inputfile=inputdata, outputfile=outputStream)
+        io_output = self.parse_io(inputfile=inputdata, outputfile=outputStream,
+                                  chunk_size=kwargs.get('chunk_size'),
+                                  processes=kwargs.get('processes'))
         logger.debug("Leaving InputParser.parse(%s)->(%s)", inputdata, outputStream)
         for x in [ io_output ]:
             yield x
 
-    def parse_file(self, infile, outputfile=None):
+    def parse_file(self, infile, outputfile=None, chunk_size=None, use_mmap=False,
+                   processes=None):
         '''given a daily digest locator file and
         an optional outputfilename convert the locator codes
         to a simple html format outputing to out or stdout
+        chunk_size reads the file that many bytes at a time (see parse_io),
+        use_mmap parses the memory mapped file instead of reading it.
+        processes renders in that many worker processes.
+        outputfile can be a filename, or an open file handle.
         '''
+        opened = None
         if outputfile is None:
-            outputfile = os.dup(sys.stdout.fileno())
+            sys.stdout.flush()
+            outputfile = opened = os.dup(sys.stdout.fileno())
+        elif isinstance(outputfile, str):
+            outputfile = opened = open(outputfile, "wb")
         logger.debug("Outputfile:%s", outputfile)
-        with open(infile, "rb") as inputfile:
-            self.parse_io(inputfile, outputfile)
+        try:
+            with open(infile, "rb") as inputfile:
+                if use_mmap:
+                    mapped = map_input(inputfile)
+                    try:
+                        self.parse_io(mapped, outputfile=outputfile, processes=processes)
+                    finally:
+                        close_input(mapped)
+                else:
+                    self.parse_io(inputfile, outputfile=outputfile, chunk_size=chunk_size,
+                                  processes=processes)
+        finally:
+            if isinstance(opened, int):
+                os.close(opened)
+            elif opened is not None:
+                opened.close()
 
     def parse_io(
             self,
@@ -68,52 +144,377 @@ class InputParser(object):
         outputfile=None,
         locator_table=None,
         font_table=None,
-        postfix=None):
+        postfix=None,
+        chunk_size=None,
+        processes=None):
         ''' output by default is a StringIO object, you will probably want to
         output = parse_io(...)
         output.seek(0)
         to rewind to the begining.  Alternatively you can pass in a file handle.
+
+        With chunk_size the input is read chunk_size bytes at a time
+        (makelines_stream()) and each line is written out as soon as it is
+        converted, so with a file handle as output memory use stays flat no
+        matter how big the input file is.
+
+        inputfile can also be an mmap (see map_input()), lines are then
+        made straight from the mapped file without reading it in first.
+
+        With processes (or the parser's processes) the lines are rendered in
+        that many worker processes, see render_parallel().
+
+        The html goes out through an OutputSink, so outputfile can also be a
+        binary file or a file descriptor.
         '''
         if not locator_table:
             locator_table = self.LOCATOR_TABLE
         if not font_table :
             font_table = self.FONT_TABLE
+        if processes is None:
+            processes = self.processes
         out = outputfile
         if outputfile is None:
             out = io.StringIO()
+        sink = OutputSink(out)
+
+        input = None
+        if chunk_size:
+            lines = self.makelines_stream(inputfile, chunk_size, output=out)
+        elif isinstance(inputfile, mmap.mmap):
+            input = strip_buffer(inputfile)
+        else:
+            input = inputfile.read()
+            input = input.strip()
+        dispatch = self.dispatch_table(locator_table, font_table)
+        pages = PageMarkers(sink)
+        sink.markup(b"<html>")
+        try:
+            if input is not None and processes and processes > 1:
+                self.render_parallel(input, current_state, sink, pages,
+                                     locator_table, font_table, postfix,
+                                     processes)
+            else:
+                if input is not None:
+                    lines = self.makelines(input, output=out)
+                self.render_lines(lines, current_state, sink, pages,
+                                  locator_table, font_table, postfix, dispatch)
+            pages.close()
+            sink.markup(b"</html>")
+        finally:
+            sink.flush()
+        return out
+
+    def iter_html(self, inputfile, current_state=(None, b'G2'), locator_table=None,
+                  font_table=None, postfix=None, chunk_size=CHUNK_SIZE, min_bytes=0,
+                  binary=False, close_state=True):
+        '''Yield the html parse_io() writes a piece at a time, to send it
+        on as it is made: <html> straight away, then the html of each line
+        once process_lines() has converted it (held back until there are
+        min_bytes of it), and the last page marker and </html> at the end.
+
+        inputfile is read chunk_size bytes at a time (or used in place if
+        it is an mmap), so memory stays flat whatever the size of the input.
+        The pieces are str, or utf-8 bytes with binary.  With close_state
+        the end html of the action still open after the last line is
+        written before the page marker, parse_io() leaves it out.
+        '''
+        if not locator_table:
+            locator_table = self.LOCATOR_TABLE
+        if not font_table:
+            font_table = self.FONT_TABLE
+        dispatch = self.dispatch_table(locator_table, font_table)
+        if isinstance(inputfile, mmap.mmap):
+            lines = self.makelines(strip_buffer(inputfile))
+        else:
+            lines = self.makelines_stream(inputfile, chunk_size)
+        out = io.BytesIO() if binary else io.StringIO()
+        sink = OutputSink(out)
+        pages = PageMarkers(sink)
+        sink.markup(b"<html>")
+        yield _take(sink, out)
+        for line in lines:
+            current_state = self.render_lines((line,), current_state, sink, pages,
+                                              locator_table, font_table, postfix, dispatch)
+            sink.flush()
+            if out.tell() > min_bytes:
+                yield _take(sink, out)
+        if close_state and current_state[0]:
+            sink.end(current_state[0])
+        pages.close()
+        sink.markup(b"</html>")
+        yield _take(sink, out)
 
-        input = inputfile.read()
-        input = input.strip()
+    def page_index(self, inputfile, current_state=(None, b'G2'), locator_table=None,
+                   font_table=None, postfix=None):
+        '''The locator.pageindex.PageIndex of inputfile (an open file or an
+        mmap) for render_pages(): where each page starts and the state
+        there, found by rendering the file once.'''
+        from locator.pageindex import PageIndex, bell_line_offsets
+        if not locator_table:
+            locator_table = self.LOCATOR_TABLE
+        if not font_table:
+            font_table = self.FONT_TABLE
+        dispatch = self.dispatch_table(locator_table, font_table)
+        if isinstance(inputfile, mmap.mmap):
+            data = inputfile
+        else:
+            data = inputfile.read()
+        index = PageIndex(size=len(data))
         current_page = None
-        output("<html>", outf=out)
-        for page, page_match, line in self.makelines(input, output=out):
+        # the first page has what comes before it too
+        first_state = current_state
+        with open(os.devnull, 'wb') as devnull:
+            sink = OutputSink(devnull)
+            pages = PageMarkers(sink)
+            for offset, full_line in bell_line_offsets(data):
+                line = self.makeline(full_line)
+                page = line[0]
+                if page and page != current_page:
+                    action, grid = current_state
+                    if current_page is None:
+                        offset = 0
+                        action, grid = first_state
+                    key = None if action is None else dispatch.key_of(action)
+                    index.pages.append((page, offset, (key, grid)))
+                    current_page = page
+                current_state = self.render_lines((line,), current_state, sink, pages,
+                                                  locator_table, font_table, postfix,
+                                                  dispatch)
+        return index
+
+    def render_pages(self, inputfile, index, first, last=None, outputfile=None,
+                     locator_table=None, font_table=None, postfix=None,
+                     chunk_size=PAGE_CHUNK):
+        '''Render pages first to last (first alone by default) of
+        inputfile, a seekable file, from its page_index().  Only the lines
+        of those pages are read, chunk_size bytes at a time, from where the
+        index says first starts.  outputfile is as for parse_io(), the html
+        is that of the pages in parse_io()'s html, in <html>..</html>.
+        Raises KeyError for a page not in the index.'''
+        if not locator_table:
+            locator_table = self.LOCATOR_TABLE
+        if not font_table:
+            font_table = self.FONT_TABLE
+        dispatch = self.dispatch_table(locator_table, font_table)
+        start, stop = index.find(first, last)
+        _, offset, (key, grid) = index.pages[start]
+        current_state = (None if key is None else dispatch[key], grid)
+        out = outputfile
+        if outputfile is None:
+            out = io.StringIO()
+        sink = OutputSink(out)
+        pages = PageMarkers(sink)
+        sink.markup(b"<html>")
+        inputfile.seek(offset)
+        # page changes until the marker of the last page is written
+        changes = stop - start + 1
+        for line in self.makelines_stream(inputfile, chunk_size):
+            page = line[0]
+            if page and pages.current_page and page != pages.current_page:
+                changes -= 1
+            current_state = self.render_lines((line,), current_state, sink, pages,
+                                              locator_table, font_table, postfix,
+                                              dispatch)
+            if not changes:
+                break
+        else:
+            pages.close()
+        sink.markup(b"</html>")
+        sink.flush()
+        return out
+
+    def render_file_pages(self, filename, first, last=None, outputfile=None):
+        '''render_pages() of a file, with its page index kept next to it
+        (see locator.pageindex.file_page_index()).'''
+        from locator.pageindex import file_page_index
+        index = file_page_index(self, filename)
+        with open(filename, 'rb') as inputfile:
+            return self.render_pages(inputfile, index, first, last, outputfile)
+
+    def tokenize(self, inputfile, current_state=(None, b'G2'), locator_table=None,
+                 font_table=None, postfix=None, chunk_size=None, cache=None):
+        '''parse_io() into a locator.tokens.TokenStream rather than html,
+        render_html() of the stream writes what parse_io() would have.
+        inputfile is read as parse_io() reads it.
+
+        With a cache (a TokenCache or its directory, or the parser's
+        token_cache) an input tokenized before comes from the cache, read
+        in whole whatever chunk_size is.'''
+        if not locator_table:
+            locator_table = self.LOCATOR_TABLE
+        if not font_table:
+            font_table = self.FONT_TABLE
+        if cache is None:
+            cache = self.token_cache
+        elif isinstance(cache, str):
+            from locator.tokencache import TokenCache
+            cache = TokenCache(cache)
+        dispatch = self.dispatch_table(locator_table, font_table)
+        if cache is None and chunk_size:
+            lines = self.makelines_stream(inputfile, chunk_size)
+        else:
+            if isinstance(inputfile, mmap.mmap):
+                inputdata = strip_buffer(inputfile)
+            else:
+                inputdata = inputfile.read().strip()
+            if cache is not None:
+                key = cache.key(self.token_version(current_state, locator_table,
+                                                   font_table, postfix), inputdata)
+                stream = cache.get(key, dispatch)
+                if stream is not None:
+                    return stream
+            lines = self.makelines(inputdata)
+        stream = self.tokenize_lines(lines, current_state, locator_table, font_table,
+                                     postfix, dispatch)
+        if cache is not None:
+            cache.put(key, stream, dispatch)
+        return stream
+
+    def token_version(self, current_state, locator_table, font_table, postfix):
+        '''The tokenizer version tokenize() keys cached streams with, the
+        html of the tables left out.'''
+        from locator.tokencache import tokenizer_version, without_html
+        return tokenizer_version(type(self).__name__, without_html(locator_table),
+                                 without_html(font_table), self.NORMALIZER,
+                                 ESCAPE_TABLE, postfix, current_state)
+
+    def tokenize_lines(self, lines, current_state, locator_table, font_table,
+                       postfix, dispatch):
+        stream = TokenStream()
+        pages = PageTokens(stream)
+        stream.markup(b"<html>")
+        self.render_lines(lines, current_state, stream, pages, locator_table,
+                          font_table, postfix, dispatch)
+        pages.close()
+        stream.markup(b"</html>")
+        return stream
+
+    def render_lines(self, lines, current_state, sink, pages, locator_table,
+                     font_table, postfix, dispatch):
+        '''process_lines() each (page, match, line) of lines into sink,
+        starting from current_state, and pass each page found to pages.
+        Returns the state after the last line.'''
+        tracer = tracing.get_tracer()
+        for page, page_match, line in lines:
             current_state_stack , output_line = process_lines(
                 line,
                 current_state,
-                outputf=out,
+                outputf=sink,
                 locator_table=locator_table,
                 font_table=font_table,
-                postfix=postfix)
-            logger.debug("Current_state:%s", current_state)
-            logger.debug("Page:%s Current_page:%s", page, current_page)
+                postfix=postfix,
+                dispatch=dispatch)
             current_state = current_state_stack[-1]
+            if tracer is not None:
+                tracer.state(current_state, page, pages.current_page)
 
             if page:
-                #output = re.sub(b'\x07',b'[BELL-]', line)
-                if not current_page:
-                    current_page = page
-                if page != current_page:
-                    # changed Page!
-                    output(
-                        b"<center>[Page:" +
-                        current_page +
-                        b"] </center>",
-                        outf=out)
-                    current_page = page
-        if current_page:
-            output(b"<center>[Page:" + current_page + b"] </center>", outf=out)
-        output("</html>", outf=out)
-        return out
+                pages(page)
+        return current_state
+
+    def render_parallel(self, input, current_state, sink, pages, locator_table,
+                        font_table, postfix, processes, chunk_bytes=None):
+        '''render_lines() for the lines of input, in a pool of processes.
+
+        The bell+Z deletion is done here, then the text is cut into chunks of
+        about chunk_bytes, each starting at a line with a LOCATOR_TABLE code.
+        Those codes don't depend on the grid and set a state of their own, so
+        all a chunk needs from the one before is the end of its last action,
+        which is written here when the chunks are joined back up.  Page
+        markers are worked out here too, from the pages each chunk found.
+
+        The text is copied once into shared memory and workers are sent
+        (start, end) offsets.  The first chunk, and any chunk a worker could
+        not do on its own (it didn't start with such a code after cleaning,
+        or it raised), are rendered here in order from the real state, so the
+        output (and any error) is byte for byte the same as render_lines().
+        Only the class tables are used in workers, other tables are rendered
+        here.
+        '''
+        dispatch = self.dispatch_table(locator_table, font_table)
+        profiler = profiling.get_profiler()
+        if profiler is not None:
+            start = profiler.start()
+        text = re.sub(BELL_Z, b'', input)
+        if profiler is not None:
+            profiler.stop('bell_z', start, len(input), len(text))
+        if not isinstance(text, bytes):
+            text = bytes(text)
+        cuts = self.parallel_cuts(text, chunk_bytes or PARALLEL_CHUNK, locator_table)
+        chunks = list(zip(cuts, cuts[1:] + [len(text)]))
+        if len(chunks) < 2 or dispatch is not self.dispatch_table():
+            lines = (self.makeline(full_line) for full_line in self.text_lines(text))
+            return self.render_lines(lines, current_state, sink, pages,
+                                     locator_table, font_table, postfix, dispatch)
+        import concurrent.futures
+        from multiprocessing import shared_memory
+        shared = shared_memory.SharedMemory(create=True, size=len(text))
+        try:
+            shared.buf[:len(text)] = text
+            with concurrent.futures.ProcessPoolExecutor(
+                    processes, initializer=_init_chunk_worker,
+                    initargs=(type(self), shared.name, postfix)) as pool:
+                results = ordered_map(pool, _render_chunk, chunks[1:], processes * 2)
+                for (start, end), result in zip(chunks, itertools.chain([None], results)):
+                    if result is None:
+                        lines = (self.makeline(full_line)
+                                 for full_line in self.text_lines(text, start, end))
+                        current_state = self.render_lines(
+                            lines, current_state, sink, pages, locator_table,
+                            font_table, postfix, dispatch)
+                        continue
+                    html, page_offsets, last = result
+                    # the first line of the chunk closes the previous action
+                    if current_state[0] and current_state[0].get('end'):
+                        sink.markup(fragment_bytes(current_state[0], 'end'))
+                    position = 0
+                    for offset, page in page_offsets:
+                        sink.markup(html[position:offset])
+                        position = offset
+                        pages(page)
+                    sink.markup(html[position:])
+                    action = dispatch[last]
+                    current_state = (action, action.grid)
+        finally:
+            shared.close()
+            shared.unlink()
+        return current_state
+
+    def parallel_cuts(self, text, chunk_bytes, locator_table=None):
+        '''Offsets that cut text into chunks of about chunk_bytes, each at a
+        bell starting a line (as makelines() pairs bells and text) with a
+        locator_table code that has no start-preprocess.'''
+        if locator_table is None:
+            locator_table = self.LOCATOR_TABLE
+        codes = set(code for code, action in locator_table.items()
+                    if not action.get('start-preprocess'))
+        # makelines() pairs the pieces of re.split(b'(\x07)') after dropping
+        # empty ones, text before the first bell and each bell right after
+        # another shift the pairs by one.
+        shifted = text[:1] != b'\x07'
+        double_bells = [m.start() for m in re.finditer(b'\x07(?=\x07)', text)]
+        cuts = [0]
+        position = chunk_bytes
+        while position < len(text):
+            for found in LOCATOR_PATTERN.finditer(text, position):
+                start = found.start()
+                if (found.group('locator') in codes
+                        and (shifted + bisect.bisect_left(double_bells, start)) % 2 == 0):
+                    cuts.append(start)
+                    break
+            else:
+                break
+            position = cuts[-1] + chunk_bytes
+        return cuts
+
+    def text_lines(self, text, start=0, end=None):
+        '''The bell lines of text[start:end] after the bell+Z deletion, as
+        makelines() pairs them up, not yet cleaned.'''
+        if end is None:
+            end = len(text)
+        all_text = re.split(b'(\x07)', text[start:end])
+        for bell, line in grouper(all_text, 2, fillvalue=b''):
+            yield bell + line
 
 
     def find_page(self, data):
@@ -124,7 +525,9 @@ class InputParser(object):
         m = re.match(b'\x07I90.+?\{(D\d+)\}', data)
         if m:
             page = m.group(1)
-        logger.debug("find_page->(%s)", page)
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.page(page)
         return page, m
 
     def makelines(self, input, output=None):
@@ -134,9 +537,13 @@ class InputParser(object):
 
         Documentation ripped from gpoline.icn.
 
+        input is bytes, or a memoryview or mmap which is read in place one
+        line at a time instead of being copied.
         '''
 
-        logger.debug("makelines input:%s", input)
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.input(input)
         BELL = '\x007'
         SHIFTOUT = '\x00E'
 
@@ -149,7 +556,25 @@ class InputParser(object):
         # Since at this point we are at EOF, we will exit the
         # enclosing while s_line ||:= loop, and write the remaining
         # s_line to output, as part of normal termination.
-        input = re.sub(b'\x07Z.+?(\x07([a-zA-Z]\d+\s*)|$)', b'', input)
+        if not isinstance(input, bytes):
+            pending = None
+            for piece in buffer_bell_pieces(input):
+                # pair pieces up the way grouper() does
+                if pending is None:
+                    pending = piece
+                else:
+                    yield self.makeline(pending + piece)
+                    pending = None
+            if pending is not None:
+                yield self.makeline(pending)
+            return
+        profiler = profiling.get_profiler()
+        if profiler is not None:
+            start = profiler.start()
+            size = len(input)
+        input = re.sub(BELL_Z, b'', input)
+        if profiler is not None:
+            profiler.stop('bell_z', start, size, len(input))
         #logger.debug("After BellZ:%s", input)
 
         #all = re.split(b'(\x07)', input)
@@ -173,40 +598,330 @@ class InputParser(object):
 
             full_line = bell + line
             #logger.debug("\tFull_line:%s", full_line)
+            yield self.makeline(full_line)
 
-            page, m = self.find_page(full_line)
-            # remove garbage? page indicators:now that we have the page
-            #full_line = re.sub(b'\x07I90.+?\{(D\d+)\}.+?(\x07|$)',  b'', full_line)
-            #logger.debug("\tAfter Removing Page stuff:%s", full_line)
-            if page:
-                full_line = b''
-            full_line = clean_line(full_line)
-            logger.debug("\tyield:%s %s %s", page, m, full_line)
-            yield (page, m, full_line)
+    def makeline(self, full_line):
+        '''Find the page of one bell line and clean it,
+        returns (page, page match, cleaned line).
+        '''
+        page, m = self.find_page(full_line)
+        # remove garbage? page indicators:now that we have the page
+        #full_line = re.sub(b'\x07I90.+?\{(D\d+)\}.+?(\x07|$)',  b'', full_line)
+        #logger.debug("\tAfter Removing Page stuff:%s", full_line)
+        if page:
+            full_line = b''
+        profiler = profiling.get_profiler()
+        if profiler is not None:
+            start = profiler.start()
+            size = len(full_line)
+        full_line = self.NORMALIZER(full_line)
+        if profiler is not None:
+            profiler.stop('clean_line', start, size, len(full_line))
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.line(page, m, full_line)
+        return (page, m, full_line)
 
-def clean_line(full_line):
-    ''' clean and translate a line'''
-    full_line = re.sub(
-                b'\x07I3[23].+?(?=(\x07I3[23]|$))',
-                b'',
-                full_line)
-    #logger.debug("\tAfter    Bell-I33/I32:%s", full_line)
+    def makelines_stream(self, inputfile, chunk_size=CHUNK_SIZE, output=None):
+        '''Yield the same lines as makelines(inputfile.read().strip()) while
+        only reading chunk_size bytes of inputfile at a time.
+
+        A bell line is only yielded once the bell starting the next one has
+        been read, so SO/SI spans and anything else inside a line are never
+        cut.  A \x07Z deletion that runs past the end of what has been read so
+        far (or a bell or bell+Z right at the end) is carried over into the
+        next chunk before it is applied.
+        '''
+        pending = None
+        for piece in self._bell_pieces(inputfile, chunk_size):
+            # pair pieces up the way grouper() does
+            if pending is None:
+                pending = piece
+            else:
+                yield self.makeline(pending + piece)
+                pending = None
+        if pending is not None:
+            yield self.makeline(pending)
+
+    def _bell_pieces(self, inputfile, chunk_size):
+        '''The non empty items of re.split(b'(\x07)', input) after the bell+Z
+        deletion, read a chunk at a time.'''
+        buf = b''
+        text = b''
+        started = False
+        eof = False
+        while not eof:
+            chunk = inputfile.read(chunk_size)
+            if not chunk:
+                eof = True
+            elif not started:
+                # input.strip() at the front
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                started = True
+            buf = buf + chunk
+            # and at the end, trailing whitespace waits for the next chunk
+            limit = len(buf.rstrip())
+            deleted, cut = _delete_bell_z(buf, limit, eof)
+            buf = buf[cut:]
+            text = text + deleted
+            if eof:
+                tail = b''
+            else:
+                # the text after the last bell can still grow
+                last_bell = text.rfind(b'\x07') + 1
+                text, tail = text[:last_bell], text[last_bell:]
+            for piece in re.split(b'(\x07)', text):
+                if piece != b'':
+                    yield piece
+            text = tail
+
+def _take(sink, out):
+    '''Flush sink and empty out, a StringIO or BytesIO, returning what it
+    held.'''
+    sink.flush()
+    data = out.getvalue()
+    out.seek(0)
+    out.truncate()
+    return data
+
+
+class PageMarkers(object):
+    '''Writes a <center>[Page:...] </center> marker to sink each time the
+    page changes, and one for the last page at close().'''
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.current_page = None
+
+    def __call__(self, page):
+        if not self.current_page:
+            self.current_page = page
+        if page != self.current_page:
+            # changed Page!
+            self.sink.text(b"<center>[Page:" + self.current_page + b"] </center>")
+            self.current_page = page
+
+    def close(self):
+        if self.current_page:
+            self.sink.text(b"<center>[Page:" + self.current_page + b"] </center>")
+
+
+class _PageOffsets(object):
+    '''PageMarkers for a worker: notes where in the output each page was
+    found.'''
+    current_page = None
+
+    def __init__(self, sink, out):
+        self.sink = sink
+        self.out = out
+        self.pages = []
+
+    def __call__(self, page):
+        self.sink.flush()
+        self.pages.append((self.out.tell(), page))
 
-    # remove SO->SI 14-15
-    full_line = re.sub(b'\x0E.+?[\x0F|$]', b'', full_line)
-    #logger.debug("\tAfter    SO/I:%s", full_line)
 
-    full_line = remove_chars(
-                full_line,
-                REMOVE_CHARS)  # remove bad chars
+def ordered_map(pool, fn, items, window):
+    '''pool.map() that keeps at most window tasks running ahead of the
+    results being read.  The first window is submitted straight away.'''
+    items = iter(items)
+    running = collections.deque(pool.submit(fn, item)
+                                for item in itertools.islice(items, window))
+    return _ordered_results(pool, fn, items, running)
 
-    #logger.debug("\tAfter  Remove:%s", full_line)
-    full_line = translate_chars(full_line, MAPPING)   # tab to space
-    #logger.debug("\tAfter   Trans:%s", full_line)
-    # remove stuff between \xa8 and \xad e.g.g: b'\xa8D382\xad'
-    full_line = re.sub(b'\xa8.+?[\xad|$]', b'', full_line)
-    #logger.debug("\tAfter xa8 nad xad:%s", full_line)
-    return full_line
+
+def _ordered_results(pool, fn, items, running):
+    while running:
+        result = running.popleft().result()
+        for item in items:
+            running.append(pool.submit(fn, item))
+            break
+        yield result
+
+
+# set in each worker process by _init_chunk_worker()
+_chunk_worker = None
+
+def _init_chunk_worker(parser_class, shared_name, postfix):
+    global _chunk_worker
+    from multiprocessing import shared_memory
+    shared = shared_memory.SharedMemory(name=shared_name)
+    _chunk_worker = (parser_class(), shared, postfix)
+
+
+def _render_chunk(chunk):
+    '''Render a render_parallel() chunk from a blank state.  Returns the
+    utf-8 html, the (html offset, page) of each page found and the dispatch
+    key of the last action, or None if the parent has to do the chunk.'''
+    parser, shared, postfix = _chunk_worker
+    start, end = chunk
+    try:
+        dispatch = parser.dispatch_table()
+        text = bytes(shared.buf[start:end])
+        lines = (parser.makeline(full_line) for full_line in parser.text_lines(text))
+        first = next(lines, None)
+        if first is None or not _starts_chunk(parser, first[2]):
+            return None
+        out = io.BytesIO()
+        sink = OutputSink(out)
+        pages = _PageOffsets(sink, out)
+        state = parser.render_lines(
+            itertools.chain([first], lines), (None, b'G2'), sink, pages,
+            parser.LOCATOR_TABLE, parser.FONT_TABLE, postfix, dispatch)
+        sink.flush()
+        last = dispatch.key_of(state[0])
+        if last is None:
+            return None
+        return out.getvalue(), pages.pages, last
+    except Exception:
+        # redone by the parent, which raises it in order
+        return None
+
+
+def _starts_chunk(parser, line):
+    '''True if a chunk starting with line can be rendered from a blank
+    state: line starts with a LOCATOR_TABLE code without start-preprocess.'''
+    found = next(LOCATOR_PATTERN.finditer(line), None)
+    return not (found is None or found.start() != 0
+                or found.group('locator') not in parser.LOCATOR_TABLE
+                or parser.LOCATOR_TABLE[found.group('locator')].get('start-preprocess'))
+
+
+def render_unit(parser_class, text, postfix=None, state=None):
+    '''Render the bell lines of text, a render_parallel() chunk after the
+    bell+Z deletion, with the class tables.  For locator.aio, which runs it
+    in an executor, so it takes and returns only what pickles.
+
+    state is (dispatch key of the action, grid) to start from, key None
+    for no action.  Without a state the chunk is rendered from a blank state
+    as render_parallel() workers do, and None returned if it can't be.
+    Returns the utf-8 html, the (html offset, page) of each page found and
+    the state after the last line.
+    '''
+    parser = parser_class()
+    dispatch = parser.dispatch_table()
+    lines = (parser.makeline(full_line) for full_line in parser.text_lines(text))
+    if state is None:
+        try:
+            first = next(lines, None)
+            if first is None or not _starts_chunk(parser, first[2]):
+                return None
+        except Exception:
+            # redone from the real state, which raises it in order
+            return None
+        lines = itertools.chain([first], lines)
+        current_state = (None, b'G2')
+    else:
+        key, grid = state
+        current_state = (None if key is None else dispatch[key], grid)
+    out = io.BytesIO()
+    sink = OutputSink(out)
+    pages = _PageOffsets(sink, out)
+    try:
+        current_state = parser.render_lines(
+            lines, current_state, sink, pages, parser.LOCATOR_TABLE,
+            parser.FONT_TABLE, postfix, dispatch)
+    except Exception:
+        if state is None:
+            return None
+        raise
+    sink.flush()
+    action, grid = current_state
+    key = None
+    if action is not None:
+        key = dispatch.key_of(action)
+        if key is None and state is None:
+            return None
+    return out.getvalue(), pages.pages, (key, grid)
+
+
+def map_input(inputfile):
+    '''Memory map an open file read only.  An empty file can not be mapped,
+    the file itself is returned for it instead.'''
+    try:
+        return mmap.mmap(inputfile.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return inputfile
+
+
+def close_input(mapped):
+    '''Unmap what map_input() returned.'''
+    if isinstance(mapped, mmap.mmap):
+        try:
+            mapped.close()
+        except BufferError:
+            # still referenced (e.g. from a traceback), unmapped once freed
+            pass
+
+
+def strip_buffer(buf):
+    '''buf.strip() as a memoryview into buf rather than a copy.'''
+    start = re.match(rb'\s*', buf).end()
+    end = len(buf)
+    while end > start and buf[end - 1:end].isspace():
+        end = end - 1
+    return memoryview(buf)[start:end]
+
+
+def buffer_bell_pieces(buf):
+    '''The non empty items of re.split(b'(\x07)', re.sub(BELL_Z, b'', buf))
+    for a memoryview or mmap, taken from buf one at a time.'''
+    text = []
+    last = 0
+    for found in BELL_Z_RE.finditer(buf):
+        for piece in _split_bells(buf, last, found.start(), text):
+            yield piece
+        last = found.end()
+    for piece in _split_bells(buf, last, len(buf), text):
+        yield piece
+    if text:
+        yield b''.join(text)
+
+
+def _split_bells(buf, start, end, text):
+    '''Split buf[start:end] on bells.  text collects the piece still open at
+    the end, it carries on past a bell+Z deletion.'''
+    position = start
+    for bell in BELL_RE.finditer(buf, start, end):
+        if bell.start() > position:
+            text.append(bytes(buf[position:bell.start()]))
+        if text:
+            yield b''.join(text)
+            del text[:]
+        yield b'\x07'
+        position = bell.end()
+    if end > position:
+        text.append(bytes(buf[position:end]))
+
+
+def _delete_bell_z(buf, limit, eof):
+    '''Apply the bell+Z deletion to buf[:limit].  Returns the text up to the
+    first deletion that more input could still change, and where that is.
+    '''
+    pieces = []
+    last = 0
+    for found in BELL_Z_STREAM.finditer(buf, 0, limit):
+        if found.end() == limit and not eof:
+            # ran into the end of what has been read so far
+            limit = found.start()
+            break
+        pieces.append(buf[last:found.start()])
+        last = found.end()
+    if not eof:
+        # a bell or bell+Z at the very end may start a deletion
+        if buf.endswith(b'\x07', 0, limit):
+            limit = limit - 1
+        elif buf.endswith(b'\x07Z', 0, limit):
+            limit = limit - 2
+    pieces.append(buf[last:limit])
+    return b''.join(pieces), limit
+
+
+def clean_line(full_line):
+    ''' clean and translate a line'''
+    return NORMALIZER(full_line)
 
 
 
@@ -222,17 +937,93 @@ class OutputParser(object):
         #logger.debug("Output parser returning :name= %s data=%s" ,  input[0], input[1])
         return input
 
+class HtmlRenderer(TokenRenderer):
+    '''Renders tokens to an OutputSink, the html parse_io() writes.'''
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.pages = PageMarkers(sink)
+        # straight to the sink, there is nothing to add
+        self.text = sink.text
+        self.markup = sink.markup
+        self.start = sink.start
+        self.end = sink.end
+
+    def escape(self, replace, esc, replacement):
+        self.sink.text(replacement)
+
+    def page(self, page):
+        self.pages(page)
+
+    def pages_end(self):
+        self.pages.close()
+
+
+def render_html(tokens, outputfile=None):
+    '''Write the html of a TokenStream or TokenSlice to outputfile (a
+    StringIO by default, or anything an OutputSink takes) and return it.'''
+    out = outputfile
+    if out is None:
+        out = io.StringIO()
+    sink = OutputSink(out)
+    try:
+        tokens.render(HtmlRenderer(sink))
+    finally:
+        sink.flush()
+    return out
+
+
+class HtmlOutputParser(object):
+    '''Output parser for parse(tokens=True).  Renders each TokenStream (or
+    (title, TokenSlice) of a CRI stanza) to the html parse() would have
+    yielded and passes that on to outputparser, so
+
+        LocatorParser(inputdata=data, inputparser=cri,
+                      outputparser=HtmlOutputParser(MultipleOutputFilesOutputParser(...))
+                      ).parse(tokens=True)
+
+    writes the same files as parse() with the MultipleOutputFilesOutputParser.
+    '''
+
+    def __init__(self, outputparser=None, **kwargs):
+        self.outputparser = outputparser or OutputParser()
+
+    def parse(self, input, **kwargs):
+        if isinstance(input, tuple):
+            title, tokens = input
+            out = render_html(tokens)
+            out.seek(0)
+            rendered = (title, out)
+        else:
+            rendered = render_html(input)
+        return self.outputparser.parse(rendered, **kwargs)
+
+    def close(self):
+        close = getattr(self.outputparser, 'close', None)
+        if close is not None:
+            close()
+
+
 class MultipleOutputFilesOutputParser(object):
     '''parse the intermediate represenation of a locator file into some
     final output. This implemenation accepts a dictionary of
     input = { 'name': stream }
     it then will Write each stream into a file named  'name'
     CongressionalRecordIndexInputParser outputs in this manner.
+
+    The files are written as utf-8 by a FileWriter, each one before parse()
+    returns.  With threaded=True they are written on a background thread
+    instead, and only close() (which LocatorParser.parse() calls when it is
+    done) waits for them.  durable=True fsyncs them in batches.
     '''
 
-    def __init__(self, basedir=None, prepend=None, **kwargs):
+    def __init__(self, basedir=None, prepend=None, threaded=False, durable=False, **kwargs):
         self.basedir = basedir
         self.prepend = prepend
+        self.threaded = threaded
+        self.durable = durable
+        # made by the first parse(), closed by close()
+        self.writer = None
 
     def parse(self, input_tuple, **kwargs):
         '''process a tuple (filename, stream)
@@ -258,12 +1049,21 @@ class MultipleOutputFilesOutputParser(object):
         logger.debug("prepend:%s", filename_prepend)
         logger.debug("name   :%s", name)
         fullfilename = basedir +  filename_prepend + name.decode('utf-8')
-        # create any intermediate directories that are missing
-        os.makedirs ( os.path.dirname(fullfilename), exist_ok=True)
-        with open (fullfilename, "w") as output:
-            output.write(stream.read())
+        data = stream.read()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if self.writer is None:
+            self.writer = FileWriter(threaded=self.threaded, durable=self.durable)
+        # the writer creates any intermediate directories that are missing
+        self.writer.write(fullfilename, data)
         return input_tuple
 
+    def close(self):
+        '''Wait for every file parse() was given to be written.'''
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.close()
+
 
 class LocatorParser(object):
 
@@ -297,8 +1097,22 @@ class LocatorParser(object):
         self.input = inputdata
         self.inputparser = inputparser
         self.outputparser = outputparser
+        # reports of the last parse(profile=...)
+        self.profiles = []
 
-    def parse(self, inputdata=None, inputparser=None, outputparser=None, **kwargs):
+    def parse(self, inputdata=None, inputparser=None, outputparser=None,
+              profile=None, **kwargs):
+        '''Yield the output parser's output for each document the input
+        parser makes.
+
+        With profile (True, or a locator.profiling.Profiler to sample or
+        to collect several runs) each document is profiled and its report
+        added to self.profiles, see locator.profiling.
+
+        The output parser is closed (if it has a close()) once the
+        documents are done, so one that finishes a file then, such as an
+        ArchiveOutputParser, takes one parse().
+        '''
         if inputdata:
             self.input = inputdata
         if inputparser:
@@ -309,9 +1123,60 @@ class LocatorParser(object):
             self.outputparser = OutputParser()
         if not self.inputparser:
             raise Exception("Must set inputparser!")
-        for inputs_output in self.inputparser.parse(self.input, **kwargs):
-            outputs_output =  self.outputparser.parse(inputs_output, **kwargs)
-            yield outputs_output
+        if profile is True:
+            profile = profiling.Profiler()
+        try:
+            if profile:
+                self.profiles = profile.reports
+                for outputs_output in profile.run(
+                        self.inputparser.parse(self.input, **kwargs),
+                        lambda inputs_output: self.outputparser.parse(inputs_output, **kwargs)):
+                    yield outputs_output
+                return
+            for inputs_output in self.inputparser.parse(self.input, **kwargs):
+                outputs_output =  self.outputparser.parse(inputs_output, **kwargs)
+                yield outputs_output
+        finally:
+            # output parsers that write in the background finish here
+            close = getattr(self.outputparser, 'close', None)
+            if close is not None:
+                close()
+
+    def aparse(self, inputdata=None, inputparser=None, outputparser=None,
+               executor=None, **kwargs):
+        '''parse() as an async iterator: the input is read and the output
+        parser called without blocking the event loop, and the lines or
+        stanzas are rendered on executor (the loop's default executor if
+        None), see locator.aio.'''
+        # imported here, locator.aio imports this module
+        from locator import aio
+        if inputdata is not None:
+            self.input = inputdata
+        if inputparser:
+            self.inputparser = inputparser
+        if outputparser:
+            self.outputparser = outputparser
+        if not self.outputparser:
+            self.outputparser = OutputParser()
+        if not self.inputparser:
+            raise Exception("Must set inputparser!")
+        return aio.parse(self.input, self.inputparser, self.outputparser, executor,
+                         **kwargs)
+
+    def parse_file(self, filename, inputparser=None, outputparser=None, **kwargs):
+        '''parse() a locator file memory mapped rather than read in, so
+        several processes converting the same file share the page cache.
+        '''
+        with open(filename, "rb") as inputfile:
+            mapped = map_input(inputfile)
+            try:
+                self.input = mapped
+                for outputs_output in self.parse(inputparser=inputparser,
+                                                 outputparser=outputparser,
+                                                 **kwargs):
+                    yield outputs_output
+            finally:
+                close_input(mapped)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,202 @@
+'''Per stage profiling of the conversion pipeline.
+
+    parser = LocatorParser(inputdata=data, inputparser=cri, outputparser=out)
+    for output in parser.parse(profile=True):
+        ...
+    for report in parser.profiles:
+        print(report['name'], report['seconds'], report['stages']['process_lines'])
+
+With profile (True or a Profiler) LocatorParser.parse() installs the
+profiler while each document, the Daily Digest file or a CRI stanza, is
+made and handed to the output parser, and adds a report per document to
+parser.profiles:
+
+    {'document': 3, 'name': 'CRI-2014-SMITH-JOHN', 'seconds': 0.0012,
+     'stages': {'process_lines': {'seconds': 0.0004, 'calls': 6,
+                                  'bytes_in': 310, 'bytes_out': 242}, ...}}
+
+document counts from 0, name is the CRI name (None for the Daily Digest).
+Stage times are exclusive, the time in process_escapes_in_line() counts
+for process_escapes and not for the process_lines() that called it, so the
+stages add up to seconds:
+
+    bell_z            the \x07Z deletion of bytes input
+    clean_line        the LineNormalizer of each line (of a CRI file too)
+    process_lines     process_lines() less the stages it calls
+    process_actions   process_actions()
+    process_escapes   process_escapes_in_line()
+    title             process_stanza_title() of a CRI stanza
+    write             OutputSink converting and writing its buffer
+    output            the output parser's parse() less write
+    other             the rest: splitting the input, generators, ...
+
+bytes_in and bytes_out are counted where a stage turns bytes into bytes,
+write counts what it was given and what it wrote (chars to a text stream).
+Work done in worker processes (parse_io(processes=...)) is not seen.
+
+Like tracing the hooks cost a check for None when no profiler is installed.
+A profiled document pays a couple of perf_counter() calls per stage call,
+Profiler(sample=0.05) profiles a random 5% of the documents to keep that
+down in production runs.
+
+The profiler is kept in a context variable, like the tracer, so profiling
+one ConversionServer request does not time the others running alongside.
+'''
+import contextvars
+from contextlib import contextmanager
+from time import perf_counter
+
+# The installed profiler, None when profiling is off.  Hot code get()s this
+# once per call and skips the hooks when it is None.
+_profiler = contextvars.ContextVar('locator_profiler', default=None)
+
+STAGES = ['bell_z', 'clean_line', 'process_lines', 'process_actions',
+          'process_escapes', 'title', 'write', 'output', 'other']
+
+
+class Profiler(object):
+    '''Collects stage times and byte counts, see the module docstring.
+
+    Hooks call start() before a stage and stop(stage, start, bytes_in,
+    bytes_out) after it.  run() profiles a stream of documents and keeps a
+    report of each in reports.
+    '''
+
+    def __init__(self, sample=1.0, seed=None):
+        self.sample = sample
+        self.reports = []
+        import random
+        self._random = random.Random(seed)
+        # stage: [seconds, calls, bytes in, bytes out]
+        self._stages = {}
+        # time spent in the stages called by each open stage
+        self._children = []
+
+    def start(self):
+        self._children.append(0.0)
+        return perf_counter()
+
+    def stop(self, stage, start, bytes_in=0, bytes_out=0):
+        elapsed = perf_counter() - start
+        children = self._children
+        own = elapsed - children.pop()
+        if children:
+            children[-1] += elapsed
+        counts = self._stages.get(stage)
+        if counts is None:
+            counts = self._stages[stage] = [0.0, 0, 0, 0]
+        counts[0] += own
+        counts[1] += 1
+        counts[2] += bytes_in
+        counts[3] += bytes_out
+
+    def reset(self):
+        self._stages = {}
+        self._children = []
+
+    def stages(self, seconds=None):
+        '''{stage: {'seconds', 'calls', 'bytes_in', 'bytes_out'}} of what
+        was collected since the last reset(), with 'other' the rest of
+        seconds if given.'''
+        stages = {}
+        total = 0.0
+        for stage, (own, calls, bytes_in, bytes_out) in self._stages.items():
+            stages[stage] = {'seconds': own, 'calls': calls,
+                             'bytes_in': bytes_in, 'bytes_out': bytes_out}
+            total += own
+        if seconds is not None:
+            stages['other'] = {'seconds': max(seconds - total, 0.0), 'calls': 0,
+                               'bytes_in': 0, 'bytes_out': 0}
+        return stages
+
+    def run(self, documents, output):
+        '''Yield output(document) for each of documents, profiling the
+        sampled ones: the time to get the document from the iterable and
+        to output() it.'''
+        documents = iter(documents)
+        number = 0
+        while True:
+            sampled = self.sample >= 1 or self._random.random() < self.sample
+            self.reset()
+            token = _profiler.set(self if sampled else None)
+            try:
+                start = perf_counter()
+                try:
+                    document = next(documents)
+                except StopIteration:
+                    return
+                if sampled:
+                    begin = self.start()
+                    result = output(document)
+                    self.stop('output', begin)
+                else:
+                    result = output(document)
+                seconds = perf_counter() - start
+            finally:
+                _profiler.reset(token)
+            if sampled:
+                self.reports.append({
+                    'document': number,
+                    'name': document_name(document),
+                    'seconds': seconds,
+                    'stages': self.stages(seconds),
+                })
+            number += 1
+            yield result
+
+    def total(self):
+        '''The reports added up, as a report of all the documents.'''
+        stages = {}
+        seconds = 0.0
+        for report in self.reports:
+            seconds += report['seconds']
+            for stage, counts in report['stages'].items():
+                total = stages.setdefault(stage, dict.fromkeys(counts, 0))
+                for key, value in counts.items():
+                    total[key] += value
+        return {'documents': len(self.reports), 'seconds': seconds, 'stages': stages}
+
+
+def document_name(document):
+    '''The CRI name of a ((name, title line), output) document, else None.'''
+    if isinstance(document, tuple) and document and isinstance(document[0], tuple):
+        name = document[0][0]
+        if isinstance(name, bytes):
+            return name.decode('utf-8', 'replace')
+        return name or None
+    return None
+
+
+def report(profile, outf):
+    '''Write a stage table of a report (or Profiler.total()) to outf.'''
+    outf.write('%-16s %10s %6s %10s %12s %12s\n' % (
+        'stage', 'seconds', '%', 'calls', 'bytes in', 'bytes out'))
+    seconds = profile['seconds'] or 1.0
+    stages = profile['stages']
+    for stage in STAGES + sorted(set(stages) - set(STAGES)):
+        if stage in stages:
+            counts = stages[stage]
+            outf.write('%-16s %10.4f %6.1f %10d %12d %12d\n' % (
+                stage, counts['seconds'], counts['seconds'] * 100 / seconds,
+                counts['calls'], counts['bytes_in'], counts['bytes_out']))
+
+
+def set_profiler(new_profiler):
+    '''Install new_profiler (None turns profiling off), returns the
+    previous profiler.'''
+    previous = _profiler.get()
+    _profiler.set(new_profiler)
+    return previous
+
+
+get_profiler = _profiler.get
+
+
+@contextmanager
+def use_profiler(new_profiler):
+    '''Install new_profiler for the duration of a with block.'''
+    token = _profiler.set(new_profiler)
+    try:
+        yield new_profiler
+    finally:
+        _profiler.reset(token)
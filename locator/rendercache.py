@@ -0,0 +1,216 @@
+'''On-disk cache of rendered CRI stanzas.
+
+Between two runs of the cumulative Congressional Record Index almost every
+\x07I01 stanza is unchanged.  A RenderCache keeps the html and the title
+(the process_title() name and the title line) of each stanza it has seen,
+under a hash of the stanza's bytes and the parser's table version, so a
+rebuild only renders the stanzas that changed:
+
+    cache = RenderCache('/var/cache/locator/cri', max_bytes=512 * 1024 * 1024)
+    parser = CongressionalRecordIndexInputParser(year=2014, cache=cache)
+
+The table version (see table_version()) covers the locator, font and escape
+tables, the normalizer, the year, the postfix and the starting state, and
+the source of the RENDER_MODULES (see code_version()), so a change to any
+of them, a locator upgrade included, misses instead of returning stale
+html.  Bump CACHE_VERSION when the entry format changes.
+
+Entries are files named by their key, written to a temporary file and
+renamed so a reader never sees half an entry.  A hit touches the entry, and
+when a put() takes the entries over max_bytes the least recently used are
+removed until they are under EVICT_TO of it.
+'''
+import functools
+import hashlib
+import importlib
+import os
+import struct
+import threading
+
+from locator import EscapeTable, LineNormalizer
+
+# bump to drop every cached entry after a change to the entry format
+CACHE_VERSION = 1
+# the modules whose code the rendered html and titles come from
+RENDER_MODULES = ('locator', 'locator.parser', 'locator.congressionalrecordindex',
+                  'locator.rendercache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# eviction brings the cache down to this fraction of max_bytes
+EVICT_TO = 0.8
+# entry header: has title, name length, title line length
+_HEADER = struct.Struct('<BII')
+_SUFFIX = '.stanza'
+
+
+def _fingerprint(value, md5):
+    '''Feed a stable description of value to md5.  Functions are described
+    by their code, not their address, so the same tables give the same
+    version in every process.'''
+    if isinstance(value, dict):
+        md5.update(b'{')
+        for key in sorted(value, key=repr):
+            _fingerprint(key, md5)
+            _fingerprint(value[key], md5)
+        md5.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        md5.update(b'[')
+        for item in value:
+            _fingerprint(item, md5)
+        md5.update(b']')
+    elif isinstance(value, EscapeTable):
+        _fingerprint((value.escape_sequences, value.blank), md5)
+    elif isinstance(value, LineNormalizer):
+        _fingerprint((value.remove_chars, value.mapping), md5)
+    elif hasattr(value, '__code__'):
+        code = value.__code__
+        md5.update(code.co_code)
+        _fingerprint(code.co_consts, md5)
+    elif hasattr(value, 'co_code'):
+        md5.update(value.co_code)
+        _fingerprint(value.co_consts, md5)
+    else:
+        md5.update(repr(value).encode('utf-8'))
+    md5.update(b',')
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(modules):
+    '''Hex digest of the source files of modules, a tuple of module names,
+    worked out once per process.'''
+    md5 = hashlib.md5()
+    for name in modules:
+        with open(importlib.import_module(name).__file__, 'rb') as source:
+            md5.update(source.read())
+    return md5.hexdigest()
+
+
+def table_version(*parts):
+    '''Hex digest of everything besides the stanza that the rendered html
+    depends on.'''
+    md5 = hashlib.md5()
+    _fingerprint((CACHE_VERSION, code_version(RENDER_MODULES)) + parts, md5)
+    return md5.hexdigest()
+
+
+class RenderCache(object):
+    '''A directory of rendered stanzas, at most about max_bytes big.
+
+    get(key) returns (title, html) or None, put(key, title, html) stores
+    one, key(version, stanza) makes the key of a stanza.
+    '''
+    # entries are <key[2:]><suffix> files in <key[:2]> directories
+    suffix = _SUFFIX
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        # worked out on the first put(), kept up to date after that
+        self._size = None
+
+    @staticmethod
+    def key(version, stanza):
+        sha = hashlib.sha256(version.encode('ascii'))
+        sha.update(stanza)
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + self.suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            has_title, name_length, line_length = _HEADER.unpack_from(data)
+            start = _HEADER.size
+            title = None
+            if has_title:
+                name = data[start:start + name_length]
+                line = data[start + name_length:start + name_length + line_length]
+                title = (name, line)
+            html = data[start + name_length + line_length:].decode('utf-8')
+        except (struct.error, UnicodeDecodeError):
+            # a damaged entry is a miss, the put() that follows replaces it
+            self.misses += 1
+            return None
+        self.hits += 1
+        return title, html
+
+    def put(self, key, title, html):
+        if title is None:
+            header = _HEADER.pack(0, 0, 0)
+            name = line = b''
+        else:
+            name, line = title
+            header = _HEADER.pack(1, len(name), len(line))
+        self._store(key, (header, name, line, html.encode('utf-8')))
+
+    def _store(self, key, pieces):
+        '''Write an entry, the bytes-like pieces one after the other, and
+        evict if the cache is over max_bytes.'''
+        path = self._path(key)
+        # unique to this process and thread, so parallel runs sharing the
+        # directory never write the same temporary file
+        temp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        try:
+            f = open(temp, 'wb')
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(temp, 'wb')
+        try:
+            with f:
+                size = 0
+                for piece in pieces:
+                    f.write(piece)
+                    size += memoryview(piece).nbytes
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        '''(path, size, last used) of every entry.'''
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(self.suffix):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def evict(self, target=None):
+        '''Remove the least recently used entries until the cache is under
+        target bytes, EVICT_TO of max_bytes by default.'''
+        if target is None:
+            target = int(self.max_bytes * EVICT_TO)
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._size = size
+
+    def size(self):
+        '''Bytes of entries in the cache.'''
+        return sum(size for _, size, _ in self._entries())
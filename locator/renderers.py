@@ -0,0 +1,251 @@
+'''Text and JSON renderers, and output parsers that share one parse.
+
+parse(tokens=True) tokenizes each Daily Digest file or CRI stanza once,
+FanOutOutputParser hands the tokens to several output parsers, so html,
+plain text and JSON come out of one pass over the input:
+
+    dispatch = CongressionalRecordIndexInputParser.dispatch_table()
+    fan_out = FanOutOutputParser({
+        'html': HtmlOutputParser(MultipleOutputFilesOutputParser(basedir='html')),
+        'text': TextOutputParser(MultipleOutputFilesOutputParser(basedir='text')),
+        'json': JsonOutputParser(dispatch, MultipleOutputFilesOutputParser(basedir='json')),
+    })
+    parser = LocatorParser(inputdata=data, inputparser=cri, outputparser=fan_out)
+    for outputs in parser.parse(tokens=True):
+        ...     # {'html': ..., 'text': ..., 'json': ...}
+
+The text is the text of the html without its tags, escapes as the
+characters they stand for and a line break at block level html (<p>,
+<h2>, <br>, ...).  The JSON of a document is
+
+    {"name": "CRI-2014-SMITH-JOHN.htm", "title": "SMITH, JOHN",
+     "pages": ["D382"], "sections": [{"code": "I03", "text": "..."}, ...]}
+
+with a section for each LOCATOR_TABLE code with block level html, and
+name and title null for the Daily Digest.
+'''
+import html
+import io
+import json
+import re
+
+from locator import fragment_bytes
+from locator.parser import OutputParser, HtmlOutputParser
+from locator.tokens import TokenRenderer
+
+HTML = 'html'
+TEXT = 'text'
+JSON = 'json'
+FORMATS = (HTML, TEXT, JSON)
+# html that starts a new line of text
+BLOCK_HTML = re.compile(rb'<(?:p|h\d|br|center|ul|ol|li|pre|div|table|tr)\b', re.I)
+# a tag in the text, LineNormalizer puts <br /> for some control chars
+TEXT_TAG = re.compile(r'<(/?)(\w+)[^<>]*>')
+
+
+def is_block(action):
+    '''True if the start or end html of an action is block level.'''
+    return bool(BLOCK_HTML.search(fragment_bytes(action, 'start')) or
+                BLOCK_HTML.search(fragment_bytes(action, 'end')))
+
+
+def _untag(found):
+    '''A line break for a block level tag, nothing for the rest.'''
+    return '\n' if BLOCK_HTML.match(('<' + found.group(2)).encode('latin1')) else ''
+
+
+def _lines(parts):
+    '''The text of parts, a line per block without the blank ones.'''
+    lines = (line.strip() for line in ''.join(parts).split('\n'))
+    return [line for line in lines if line]
+
+
+class TextRenderer(TokenRenderer):
+    '''Collects the text of the tokens, lines() returns it.'''
+
+    def __init__(self):
+        self.parts = []
+        # is_block() of each action seen, by id
+        self._blocks = {}
+
+    def text(self, data):
+        text = bytes(data).decode('latin1')
+        if '<' in text:
+            text = TEXT_TAG.sub(_untag, text)
+        if '&' in text:
+            # the entities LineNormalizer puts in, &ndash; for \xff09 say
+            text = html.unescape(text)
+        self.parts.append(text)
+
+    def escape(self, replace, esc, replacement):
+        self.parts.append(html.unescape(replacement.decode('latin1')))
+
+    def _block(self, action):
+        block = self._blocks.get(id(action))
+        if block is None:
+            block = self._blocks[id(action)] = is_block(action)
+        return block
+
+    def start(self, action):
+        if self._block(action):
+            self.parts.append('\n')
+
+    end = start
+
+    def lines(self):
+        return _lines(self.parts)
+
+
+class JsonRenderer(TextRenderer):
+    '''Splits the text in sections, see the module docstring.  dispatch is
+    the DispatchTable the tokens' actions come from.'''
+
+    def __init__(self, dispatch):
+        TextRenderer.__init__(self)
+        self.codes = dict((id(action), code.decode('latin1'))
+                          for (grid, code), action in dispatch.items()
+                          if code in dispatch.locator_table)
+        self.pages = []
+        # (code, parts) of each section, text before the first has no code
+        self.sections = [(None, self.parts)]
+
+    def start(self, action):
+        code = self.codes.get(id(action))
+        if code is not None and self._block(action):
+            self.parts = []
+            self.sections.append((code, self.parts))
+        else:
+            TextRenderer.start(self, action)
+
+    def page(self, page):
+        page = page.decode('latin1')
+        if not self.pages or self.pages[-1] != page:
+            self.pages.append(page)
+
+    def document(self, title=None):
+        '''The JSON object of a document, title as parse() gives it.'''
+        sections = []
+        for code, parts in self.sections:
+            text = '\n'.join(_lines(parts))
+            if text:
+                sections.append({'code': code, 'text': text})
+        name = line = None
+        if title is not None:
+            name = title[0].decode('utf-8')
+            line = title[1].decode('latin1')
+        return {'name': name, 'title': line, 'pages': self.pages, 'sections': sections}
+
+
+def render_text(tokens, outputfile=None):
+    '''Write the text of a TokenStream or TokenSlice to outputfile (a
+    StringIO by default, or a text stream) and return it.'''
+    out = outputfile
+    if out is None:
+        out = io.StringIO()
+    renderer = TextRenderer()
+    tokens.render(renderer)
+    for line in renderer.lines():
+        out.write(line)
+        out.write('\n')
+    return out
+
+
+def render_json(tokens, dispatch, title=None, outputfile=None):
+    '''Write the JSON of a TokenStream or TokenSlice to outputfile (a
+    StringIO by default, or a text stream) and return it.'''
+    out = outputfile
+    if out is None:
+        out = io.StringIO()
+    renderer = JsonRenderer(dispatch)
+    tokens.render(renderer)
+    json.dump(renderer.document(title), out, ensure_ascii=False)
+    return out
+
+
+def _renamed(title, suffix):
+    '''title with the .htm of its name replaced by suffix.'''
+    name, line = title
+    if suffix is not None:
+        if name.endswith(b'.htm'):
+            name = name[:-4]
+        name += suffix.encode('utf-8')
+    return name, line
+
+
+class TextOutputParser(object):
+    '''Output parser for parse(tokens=True) writing text, as
+    HtmlOutputParser writes html.  suffix replaces the .htm of CRI file
+    names.'''
+    suffix = '.txt'
+
+    def __init__(self, outputparser=None, suffix=None, **kwargs):
+        self.outputparser = outputparser or OutputParser()
+        if suffix is not None:
+            self.suffix = suffix
+
+    def render(self, tokens, title=None):
+        return render_text(tokens)
+
+    def parse(self, input, **kwargs):
+        if isinstance(input, tuple):
+            title, tokens = input
+            out = self.render(tokens, title)
+            if title is not None:
+                title = _renamed(title, self.suffix)
+            rendered = (title, out)
+        else:
+            out = rendered = self.render(input)
+        out.seek(0)
+        return self.outputparser.parse(rendered, **kwargs)
+
+    def close(self):
+        close = getattr(self.outputparser, 'close', None)
+        if close is not None:
+            close()
+
+
+class JsonOutputParser(TextOutputParser):
+    '''Output parser for parse(tokens=True) writing JSON.  dispatch is the
+    input parser's dispatch_table().'''
+    suffix = '.json'
+
+    def __init__(self, dispatch, outputparser=None, suffix=None, **kwargs):
+        TextOutputParser.__init__(self, outputparser, suffix)
+        self.dispatch = dispatch
+
+    def render(self, tokens, title=None):
+        return render_json(tokens, self.dispatch, title)
+
+
+class FanOutOutputParser(object):
+    '''Passes each document of parse(tokens=True) to several output parsers,
+    {format: output parser}, and returns {format: output}.'''
+
+    def __init__(self, outputparsers, **kwargs):
+        self.outputparsers = outputparsers
+
+    def parse(self, input, **kwargs):
+        return dict((name, outputparser.parse(input, **kwargs))
+                    for name, outputparser in self.outputparsers.items())
+
+    def close(self):
+        for outputparser in self.outputparsers.values():
+            close = getattr(outputparser, 'close', None)
+            if close is not None:
+                close()
+
+
+def fan_out(formats, dispatch, outputparser=None):
+    '''A FanOutOutputParser for formats ('html', 'text' and/or 'json'),
+    each passing its output on to outputparser.'''
+    outputparsers = {}
+    for name in formats:
+        if name == HTML:
+            outputparsers[name] = HtmlOutputParser(outputparser)
+        elif name == TEXT:
+            outputparsers[name] = TextOutputParser(outputparser)
+        elif name == JSON:
+            outputparsers[name] = JsonOutputParser(dispatch, outputparser)
+        else:
+            raise ValueError("unknown format %r" % (name,))
+    return FanOutOutputParser(outputparsers)
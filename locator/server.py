@@ -0,0 +1,582 @@
+'''A conversion server: locator files sent over HTTP, on a TCP port or a
+local Unix socket, are converted by a pool of warm worker processes.
+
+    python -m locator.server --socket /run/locator.sock --workers 4
+    curl --unix-socket /run/locator.sock --data-binary @digest.rec \\
+        'http://localhost/convert?type=dd'
+
+The workers import the parsers and compile their tables once, when they
+start, so a conversion pays for neither.  Each conversion runs through
+LocatorParser.aparse() (see locator.aio) with the pool as its executor.
+
+POST /convert takes the locator file as the request body, or with
+path=NAME the file NAME under --input-root.  The query string also takes
+
+    type    dd or cri, guessed from the name or the start of the file
+            (locator.batch.document_type()) by default
+    year    year of a CRI file, from the file name by default
+    name    file name of a Daily Digest's html, <path stem>.htm or
+            digest.htm by default
+    sink    where the documents go:
+                html  in the response, a multipart/mixed part per CRI
+                      stanza (the default)
+                tar   in the response, a tar member per document
+                dir   written to files under --output-root, in the
+                      directory dir=NAME, the response lists them a line
+                      per file
+
+Documents are sent back as they are rendered, with chunked transfer
+encoding, the html of a Daily Digest a unit at a time.  At most --jobs
+conversions run at once, --queue more wait for their turn and any after
+that get 503.  A conversion gets --timeout seconds, reading the request
+body and waiting included: a body that doesn't arrive in time gets 408,
+a conversion that runs out before anything is sent 504, and one that has
+started sending is cut off.  The socket of a connection times out after
+--timeout seconds too.  GET /status returns the counts as JSON.
+'''
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import http.client
+import http.server
+import io
+import json
+import os
+import socket
+import socketserver
+import tarfile
+import threading
+import time
+import urllib.parse
+
+from locator import aio
+from locator.parser import LocatorParser
+from locator.batch import INPUT_PARSERS, CRI, SNIFF_SIZE, document_type, year_of
+from locator.archive import TAR
+import logging
+
+logger = logging.getLogger(__name__)
+
+HTML = 'html'
+DIRECTORY = 'dir'
+# conversions waiting for a free job, on top of the ones running
+QUEUE = 16
+# seconds a conversion can take, waiting included
+TIMEOUT = 300.0
+# largest request body taken
+MAX_BYTES = 1024 * 1024 * 1024
+# bytes read from the socket at a time
+READ_SIZE = 1024 * 1024
+
+
+class RequestError(Exception):
+    '''A request that can't be converted, status is the HTTP status.'''
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def warm_worker():
+    '''Worker process initializer: compile what the first conversion would
+    otherwise compile.'''
+    for parser_class in INPUT_PARSERS.values():
+        parser_class.dispatch_table()
+        parser_class.NORMALIZER.compile()
+
+
+def _started():
+    return os.getpid()
+
+
+def inside(root, name):
+    '''root/name, or RequestError if that is outside root.'''
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    if path != root and not path.startswith(root + os.sep):
+        raise RequestError(403, 'outside the server root: %s' % name)
+    return path
+
+
+class Response(object):
+    '''The body of a 200 response, chunked.  The status and headers go out
+    with the first write(), so a conversion that fails before it has
+    anything to send still gets an error status.'''
+
+    def __init__(self, handler, content_type):
+        self.handler = handler
+        self.content_type = content_type
+        self.started = False
+
+    def _start(self):
+        handler = self.handler
+        handler.send_response(200)
+        handler.send_header('Content-Type', self.content_type)
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        self.started = True
+
+    def write(self, data):
+        if not self.started:
+            self._start()
+        if data:
+            self.handler.wfile.write(b'%x\r\n%b\r\n' % (len(data), data))
+        return len(data)
+
+    def close(self):
+        if not self.started:
+            self._start()
+        self.handler.wfile.write(b'0\r\n\r\n')
+        self.handler.wfile.flush()
+
+
+class Sink(object):
+    '''Where the documents of a conversion go: start(name), write(html)
+    as many times as it comes and end() for each document, close() when
+    they are all written.  Made with the handler and Job of a request, it
+    answers the request in self.response.'''
+
+    @property
+    def started(self):
+        '''True once the response is under way.'''
+        return self.response.started
+
+    def document(self, name, html):
+        '''A whole document at once.'''
+        self.start(name)
+        self.write(html)
+        self.end()
+
+    def abort(self):
+        '''The conversion failed, drop any document not ended.'''
+
+    def close(self):
+        self.response.close()
+
+
+class HtmlSink(Sink):
+    '''The html in the response, a multipart/mixed part per document when
+    there can be more than one.'''
+
+    def __init__(self, handler, job):
+        self.multipart = job.doc_type == CRI
+        content_type = 'text/html; charset=utf-8'
+        if self.multipart:
+            self.boundary = 'locator-' + os.urandom(8).hex()
+            content_type = 'multipart/mixed; boundary=%s' % self.boundary
+        self.response = Response(handler, content_type)
+
+    def start(self, name):
+        if self.multipart:
+            self.response.write(b''.join([
+                b'--%s\r\n' % self.boundary.encode('ascii'),
+                b'Content-Type: text/html; charset=utf-8\r\n',
+                b'Content-Disposition: attachment; filename="%s"\r\n\r\n' % name]))
+
+    def write(self, html):
+        self.response.write(html)
+
+    def end(self):
+        if self.multipart:
+            self.response.write(b'\r\n')
+
+    def close(self):
+        if self.multipart:
+            self.response.write(b'--%s--\r\n' % self.boundary.encode('ascii'))
+        self.response.close()
+
+
+class TarSink(Sink):
+    '''A tar of the documents in the response.  A member's size goes
+    before it, so each document is held until end().'''
+
+    def __init__(self, handler, job):
+        self.response = Response(handler, 'application/x-tar')
+        self.tar = tarfile.open(fileobj=self.response, mode='w|')
+        self.mtime = time.time()
+
+    def start(self, name):
+        self.name = name
+        self.html = io.BytesIO()
+
+    def write(self, html):
+        self.html.write(html)
+
+    def end(self):
+        member = tarfile.TarInfo(self.name.decode('utf-8'))
+        member.size = self.html.tell()
+        member.mtime = self.mtime
+        self.html.seek(0)
+        self.tar.addfile(member, self.html)
+        self.html = None
+
+    def close(self):
+        self.tar.close()
+        self.response.close()
+
+
+class DirectorySink(Sink):
+    '''Writes the documents to files under the server's output root, the
+    response lists them.'''
+
+    def __init__(self, handler, job):
+        if job.output_root is None:
+            raise RequestError(400, 'the server has no output root')
+        self.root = os.path.realpath(job.output_root)
+        self.directory = inside(self.root, job.params.get('dir', ''))
+        self.response = Response(handler, 'text/plain; charset=utf-8')
+        # the file of the document being written
+        self.file = None
+
+    def start(self, name):
+        self.path = inside(self.directory, name.decode('utf-8'))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'wb')
+
+    def write(self, html):
+        self.file.write(html)
+
+    def end(self):
+        self.file.close()
+        self.file = None
+        self.response.write(os.path.relpath(self.path, self.root).encode('utf-8') + b'\n')
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+SINKS = {HTML: HtmlSink, TAR: TarSink, DIRECTORY: DirectorySink}
+
+
+class Job(object):
+    '''What a /convert request asks for, see the module docstring.'''
+
+    def __init__(self, params, data, filename=None, output_root=None):
+        self.params = params
+        self.data = data
+        self.output_root = output_root
+        doc_type = params.get('type')
+        if doc_type is None:
+            doc_type = document_type(filename or '', head=data[:SNIFF_SIZE])
+        if doc_type not in INPUT_PARSERS:
+            raise RequestError(400, 'unknown type: %s' % doc_type)
+        self.doc_type = doc_type
+        year = params.get('year')
+        if year is None and filename:
+            year = year_of(filename)
+        if doc_type == CRI:
+            try:
+                year = int(year)
+            except (TypeError, ValueError):
+                raise RequestError(400, 'a CRI file needs a year')
+        self.year = year
+        name = params.get('name')
+        if name is None:
+            stem = 'digest'
+            if filename:
+                stem = os.path.splitext(os.path.basename(filename))[0]
+            name = stem + '.htm'
+        self.name = name.encode('utf-8')
+        sink = params.get('sink', HTML)
+        if sink not in SINKS:
+            raise RequestError(400, 'unknown sink: %s' % sink)
+        self.sink = SINKS[sink]
+
+    def inputparser(self):
+        if self.doc_type == CRI:
+            return INPUT_PARSERS[CRI](year=self.year)
+        return INPUT_PARSERS[self.doc_type]()
+
+
+class ConversionServer(object):
+    '''The worker pool and limits behind the HTTP servers serve_tcp() and
+    serve_unix() make.  workers is the number of worker processes (one per
+    cpu by default), jobs the conversions run at once (workers by default).
+    '''
+
+    def __init__(self, workers=None, jobs=None, queue=QUEUE, timeout=TIMEOUT,
+                 input_root=None, output_root=None, max_bytes=MAX_BYTES,
+                 unit_bytes=None):
+        self.workers = workers or os.cpu_count()
+        self.jobs = jobs or self.workers
+        self.queue = queue
+        self.timeout = timeout
+        self.input_root = input_root
+        self.output_root = output_root
+        self.max_bytes = max_bytes
+        self.unit_bytes = unit_bytes
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers,
+                                                           initializer=warm_worker)
+        # a slot per conversion taken, running or waiting
+        self._admitted = threading.Semaphore(self.jobs + self.queue)
+        self._running = threading.Semaphore(self.jobs)
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+
+    def warm(self):
+        '''Start the worker processes now rather than for the first
+        conversion, returns their pids.'''
+        futures = [self.pool.submit(_started) for _ in range(self.workers)]
+        return set(future.result() for future in futures)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def status(self):
+        with self._lock:
+            status = dict(self.counts)
+        status.update(workers=self.workers, jobs=self.jobs, queue=self.queue)
+        for name in ('running', 'waiting', 'done', 'failed', 'rejected', 'timeouts'):
+            status.setdefault(name, 0)
+        return status
+
+    def read_job(self, handler, params, deadline=None):
+        '''The Job of a /convert request, its input read by deadline (a
+        time.monotonic() time).'''
+        path = params.get('path')
+        if path is not None:
+            if self.input_root is None:
+                raise RequestError(403, 'the server has no input root')
+            filename = inside(self.input_root, path)
+            try:
+                with open(filename, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size > self.max_bytes:
+                        raise RequestError(413, 'more than %d bytes' % self.max_bytes)
+                    data = f.read()
+            except OSError as e:
+                raise RequestError(404, '%s: %s' % (path, e.strerror))
+            return Job(params, data, filename, self.output_root)
+        length = handler.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, 'send the file as the body or give a path')
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(400, 'bad Content-Length: %s' % handler.headers['Content-Length'])
+        if length > self.max_bytes:
+            raise RequestError(413, 'more than %d bytes' % self.max_bytes)
+        pieces = []
+        try:
+            while length:
+                if deadline is not None:
+                    handler.connection.settimeout(max(deadline - time.monotonic(), 0.001))
+                piece = handler.rfile.read(min(length, READ_SIZE))
+                if not piece:
+                    raise RequestError(400, 'the body ended early')
+                pieces.append(piece)
+                length -= len(piece)
+        except socket.timeout:
+            handler.close_connection = True
+            raise RequestError(408, 'the body took more than %s s' % self.timeout)
+        finally:
+            handler.connection.settimeout(handler.timeout)
+        return Job(params, b''.join(pieces), params.get('name'), self.output_root)
+
+    def convert(self, handler, params):
+        '''Answer a /convert request.'''
+        if not self._admitted.acquire(blocking=False):
+            self._count('rejected')
+            handler.send_error(503, 'queue full')
+            return
+        sink = None
+        deadline = time.monotonic() + self.timeout
+        try:
+            job = self.read_job(handler, params, deadline)
+            sink = job.sink(handler, job)
+            self._count('waiting')
+            try:
+                running = self._running.acquire(timeout=max(deadline - time.monotonic(), 0))
+            finally:
+                self._count('waiting', -1)
+            if not running:
+                raise asyncio.TimeoutError()
+            self._count('running')
+            try:
+                asyncio.run(self._convert(job, sink, deadline))
+            finally:
+                self._count('running', -1)
+                self._running.release()
+            sink.close()
+            self._count('done')
+        except RequestError as e:
+            self._count('failed')
+            self._fail(handler, sink, e.status, str(e))
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            self._fail(handler, sink, 504, 'timed out after %s s' % self.timeout)
+        except Exception as e:
+            logger.exception('conversion failed')
+            self._count('failed')
+            self._fail(handler, sink, 500, '%s: %s' % (type(e).__name__, e))
+        finally:
+            self._admitted.release()
+
+    def _fail(self, handler, sink, status, message):
+        if sink is not None:
+            sink.abort()
+        if sink is not None and sink.started:
+            # too late for a status, the client sees the body cut off
+            handler.close_connection = True
+        else:
+            handler.send_error(status, message)
+
+    async def _convert(self, job, sink, deadline):
+        loop = asyncio.get_running_loop()
+        if job.doc_type == CRI:
+            documents = LocatorParser(inputparser=job.inputparser()).aparse(
+                job.data, executor=self.pool, unit_bytes=self.unit_bytes)
+        else:
+            # the html of a Daily Digest goes out a unit at a time
+            documents = aio.daily_digest_pieces(
+                job.inputparser(), job.data, self.pool, self.unit_bytes or aio.UNIT_BYTES,
+                binary=True)
+            await loop.run_in_executor(None, sink.start, job.name)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    document = await asyncio.wait_for(documents.__anext__(),
+                                                      max(remaining, 0))
+                except StopAsyncIteration:
+                    break
+                if job.doc_type == CRI:
+                    (name, line), out = document
+                    await loop.run_in_executor(None, sink.document, name,
+                                               out.read().encode('utf-8'))
+                else:
+                    await loop.run_in_executor(None, sink.write, document)
+        finally:
+            await documents.aclose()
+        if job.doc_type != CRI:
+            await loop.run_in_executor(None, sink.end)
+
+    def serve_tcp(self, host='127.0.0.1', port=0):
+        '''An HTTP server for this server on host:port, serve_forever() it.'''
+        httpd = ThreadingHTTPServer((host, port), ConversionHandler)
+        httpd.conversion = self
+        return httpd
+
+    def serve_unix(self, path):
+        '''An HTTP server for this server on the Unix socket path.'''
+        if os.path.exists(path):
+            os.unlink(path)
+        httpd = ThreadingUnixHTTPServer(path, ConversionHandler)
+        httpd.conversion = self
+        return httpd
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConversionHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # a client that stops sending or reading doesn't hold a thread
+        self.timeout = self.server.conversion.timeout or None
+        http.server.BaseHTTPRequestHandler.setup(self)
+
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, format, *args):
+        logger.info('%s %s', self.address_string(), format % args)
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != '/status':
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.conversion.status()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/convert':
+            self.send_error(404)
+            return
+        self.server.conversion.convert(self, dict(urllib.parse.parse_qsl(url.query)))
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    '''http.client connection to a server on a Unix socket.'''
+
+    def __init__(self, socket_path, timeout=None):
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve locator file conversions over HTTP.')
+    parser.add_argument('--socket', help='listen on this Unix socket')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='TCP port, when there is no --socket (default: 8080)')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='worker processes (default: one per cpu)')
+    parser.add_argument('--jobs', type=int,
+                        help='conversions run at once (default: --workers)')
+    parser.add_argument('--queue', type=int, default=QUEUE,
+                        help='conversions waiting on top of those (default: %d)' % QUEUE)
+    parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                        help='seconds a conversion can take (default: %d)' % TIMEOUT)
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES,
+                        help='largest request body taken')
+    parser.add_argument('--input-root', help='directory path=NAME files are read from')
+    parser.add_argument('--output-root', help='directory sink=dir files are written to')
+    args = parser.parse_args(argv)
+
+    with ConversionServer(args.workers, args.jobs, args.queue, args.timeout,
+                          args.input_root, args.output_root, args.max_bytes) as server:
+        server.warm()
+        if args.socket:
+            httpd = server.serve_unix(args.socket)
+        else:
+            httpd = server.serve_tcp(args.host, args.port)
+        logger.info('serving on %s', httpd.server_address)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import sys
 from locator.parser import LocatorParser,OutputParser
 from locator.dailydigest import DailyDigestInputParser
+from locator import tracing
 import logging
 def main():
 
@@ -8,6 +9,7 @@ def main():
                         format='%(asctime)s %(name)-12s %(levelname)-8s {%(pathname)s:%(lineno)d} %(message)s',
                                             datefmt='%m-%d %H:%M',
                                             )
+    tracing.set_tracer(tracing.LoggingTracer())
 
     logger = logging.getLogger(__name__)
     logger.debug("foo")
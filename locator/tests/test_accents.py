@@ -42,3 +42,18 @@ class AccentsTest(unittest.TestCase):
         '''Test to convert accents'''
         final = self._load_and_convert('accents.rec')
         self.assertEqual(final,  '''<html><h3><em>Thursday, September 15, 2016 </em></h3><p>Luj&#225;n, Ben<br />\n</html>''')
+
+    def test_escape_table(self):
+        ''' compiled tables can be swapped per call '''
+        from locator import EscapeTable, BLANK_ESCAPE_TABLE
+        line = b'Re\xffAE1sume\xffAE1 \xff1A S\xffAE0'
+        self.assertEqual(b'R&#233;sum&#233; &#160; S',
+                         process_escapes_in_line(line, b'G2', escape_sequences=EscapeTable()))
+        self.assertEqual(b'Resume  S', process_escapes_in_line(line, b'G2', escape_sequences=BLANK_ESCAPE_TABLE))
+        table = EscapeTable({b'AE1': {b'e': {'desc': 'acute', 'html': b'e'}}})
+        self.assertEqual(b'Resume  S', process_escapes_in_line(line, b'G2', escape_sequences=table))
+
+    def test_escape_grid(self):
+        ''' escapes are left alone past grid G4 '''
+        line = b'Luja\xffAE1n, Ben'
+        self.assertEqual(line, process_escapes_in_line(line, b'G5'))
@@ -0,0 +1,89 @@
+import asyncio
+import concurrent.futures
+import io
+import os
+import unittest
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.parser import LocatorParser
+from locator import aio
+
+DATA_DIR = os.path.dirname(__file__)
+
+
+async def aparse(inputdata, inputparser, **kwargs):
+    return [output async for output in LocatorParser(inputparser=inputparser).aparse(
+        inputdata, **kwargs)]
+
+
+class AsyncParseTest(unittest.TestCase):
+
+    def test_daily_digest(self):
+        '''the html parse() gives, whatever the units'''
+        with open(os.path.join(DATA_DIR, 'tdailydigestchar27.rec'), 'rb') as f:
+            char27 = f.read()
+        for data in (daily_digest(100000, 1), char27):
+            [expected] = LocatorParser(inputdata=io.BytesIO(data),
+                                       inputparser=DailyDigestInputParser()).parse()
+            for unit_bytes in (None, 100, 5000):
+                [output] = asyncio.run(aparse(data, DailyDigestInputParser(),
+                                              unit_bytes=unit_bytes, window=2))
+                self.assertEqual(output.getvalue(), expected.getvalue())
+        with concurrent.futures.ProcessPoolExecutor(2) as pool:
+            [output] = asyncio.run(aparse(os.path.join(DATA_DIR, 'tdailydigestchar27.rec'),
+                                          DailyDigestInputParser(), executor=pool,
+                                          unit_bytes=500))
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
+    def test_daily_digest_pieces(self):
+        '''a piece per unit, together the html parse() gives'''
+        data = daily_digest(50000, 2)
+        [expected] = LocatorParser(inputdata=io.BytesIO(data),
+                                   inputparser=DailyDigestInputParser()).parse()
+
+        async def pieces():
+            return [piece async for piece in aio.daily_digest_pieces(
+                DailyDigestInputParser(), data, None, 5000, binary=True)]
+        pieces = asyncio.run(pieces())
+        self.assertGreater(len(pieces), 5)
+        self.assertTrue(pieces[0].startswith(b'<html>'))
+        self.assertEqual(b''.join(pieces), expected.getvalue().encode('utf-8'))
+
+    def test_cri_stream_reader(self):
+        data = congressional_record_index(50000, 1)
+        expected = [(title, out.read()) for title, out in
+                    LocatorParser(inputdata=data,
+                                  inputparser=CongressionalRecordIndexInputParser(year=2014)).parse()]
+
+        async def from_reader():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            inputparser = CongressionalRecordIndexInputParser(year=2014)
+            outputs = []
+            async for title, out in LocatorParser(inputparser=inputparser).aparse(
+                    reader, unit_bytes=2000):
+                outputs.append((title, out.read()))
+            return outputs, inputparser.access_index
+
+        outputs, access_index = asyncio.run(from_reader())
+        self.assertEqual(outputs, expected)
+        self.assertEqual(len(access_index.stanzas), len(set(title[0] for title, _ in expected)))
+
+    def test_concurrent(self):
+        '''one loop drives several conversions'''
+        inputs = [daily_digest(20000, seed) for seed in range(4)]
+        expected = [next(DailyDigestInputParser().parse(io.BytesIO(data))).getvalue()
+                    for data in inputs]
+
+        async def convert_all():
+            results = await asyncio.gather(*(aparse(data, DailyDigestInputParser(), unit_bytes=2000)
+                                             for data in inputs))
+            return [output.getvalue() for [output] in results]
+
+        self.assertEqual(asyncio.run(convert_all()), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from locator.archive import ArchiveOutputParser, read_index, read_member
+from locator.parser import LocatorParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+
+DATA = b'''\x07F8383
+\x07I01RYAN PURCELL FOUNDATION
+\x07I03Remarks in House
+\x07I01SECOND STANZA
+\x07I02Senate\x07T1Luja\xffAE1n
+\x07I01RYAN PURCELL FOUNDATION
+\x07I05Anderson, Michael and Kelly, E1369 [28SE]
+'''
+
+
+class ArchiveOutputParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def convert(self, archive, **kwargs):
+        outputparser = ArchiveOutputParser(os.path.join(self.tmp, archive), **kwargs)
+        parser = LocatorParser(inputdata=DATA,
+                               inputparser=CongressionalRecordIndexInputParser(year=2014),
+                               outputparser=outputparser)
+        return [(name, out.getvalue().encode('utf-8')) for (name, line), out in parser.parse()]
+
+    def test_two_inputs(self):
+        '''parse() closes the archive, a second input into the same
+        ArchiveOutputParser is refused and the first archive kept whole'''
+        outputparser = ArchiveOutputParser(os.path.join(self.tmp, 'cri.zip'))
+        parser = LocatorParser(inputdata=DATA,
+                               inputparser=CongressionalRecordIndexInputParser(year=2014),
+                               outputparser=outputparser)
+        self.assertEqual(len(list(parser.parse())), 3)
+        with self.assertRaisesRegex(ValueError, 'ArchiveOutputParser per run'):
+            list(parser.parse(inputdata=DATA))
+        path = os.path.join(self.tmp, 'cri.zip')
+        with zipfile.ZipFile(path) as z:
+            self.assertEqual(len(z.namelist()), 3)
+        self.assertEqual(len(read_index(path + '.index')), 2)
+
+    def test_archives(self):
+        '''Every member can be read back through the index and by zipfile
+        or tarfile, the last of a repeated name wins'''
+        for archive, kwargs in (('cri.zip', {}), ('stored.zip', {'compresslevel': 0}),
+                                ('cri.tar', {}), ('cri.a', {'format': 'tar', 'prepend': 'cri/'})):
+            written = self.convert(archive, **kwargs)
+            self.assertEqual(len(written), 3)
+            prepend = kwargs.get('prepend', '')
+            expected = dict((prepend + name.decode('utf-8'), html) for name, html in written)
+            path = os.path.join(self.tmp, archive)
+            index = read_index(path + '.index')
+            self.assertEqual(sorted(index), sorted(expected))
+            for name, html in expected.items():
+                self.assertEqual(read_member(path, name, format=kwargs.get('format')), html)
+            if path.endswith('.zip'):
+                with zipfile.ZipFile(path) as z:
+                    self.assertEqual(len(z.namelist()), 3)
+                    for name, html in expected.items():
+                        self.assertEqual(z.read(name), html)
+            else:
+                with tarfile.open(path) as t:
+                    self.assertEqual(len(t.getnames()), 3)
+                    name = prepend + 'CRI-2014-SECOND-STANZA.htm'
+                    self.assertEqual(t.extractfile(name).read(), expected[name])
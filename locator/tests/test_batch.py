@@ -0,0 +1,112 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from locator import batch
+
+TESTS = os.path.dirname(__file__)
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_document_type(self):
+        self.assertEqual(batch.document_type('CRI2014.rec', b''), batch.CRI)
+        self.assertEqual(batch.document_type('x.rec', b'\x07F8383\n\n\x07I01RYAN PURCELL'), batch.CRI)
+        self.assertEqual(batch.document_type(os.path.join(TESTS, 'accents.rec')), batch.DAILY_DIGEST)
+        self.assertEqual(batch.document_type('cri_2014.rec', b''), batch.CRI)
+        # cri inside a word is not a CRI file
+        self.assertEqual(batch.document_type('Transcript-2016.rec', b'\x07I01DAILY DIGEST'),
+                         batch.DAILY_DIGEST)
+        self.assertEqual(batch.document_type('description.rec', b'\x07I02Senate'),
+                         batch.DAILY_DIGEST)
+        self.assertEqual(batch.year_of('data/CRI-2014.rec'), 2014)
+
+    def test_duplicate_outputs(self):
+        '''files that would write the same output are refused up front'''
+        for directory in ('a', 'b'):
+            os.mkdir(os.path.join(self.tmp, directory))
+            for name in ('digest.rec', 'CRI-2014.rec'):
+                with open(os.path.join(self.tmp, directory, name), 'wb') as f:
+                    f.write(b'\x07I01RYAN PURCELL FOUNDATION\n')
+        inputs = batch.find_inputs([self.tmp])
+        output_dir = os.path.join(self.tmp, 'out')
+        with self.assertRaisesRegex(ValueError, 'digest.rec'):
+            list(batch.convert_files(inputs, output_dir, jobs=1))
+        self.assertFalse(os.path.exists(output_dir))
+        # the stanzas of CRI files all go in one directory by name
+        cri = [f for f in inputs if 'CRI' in f]
+        self.assertEqual(batch.check_outputs(cri), cri)
+        self.assertEqual(batch.check_outputs(cri[:1]), [])
+        self.assertEqual(len(list(batch.convert_files(cri, output_dir, jobs=1))), 2)
+        with self.assertRaises(ValueError):
+            list(batch.convert_files(cri, output_dir, jobs=1, archive=batch.ZIP))
+
+    def test_jobs(self):
+        '''--jobs below 1 is refused before anything is converted'''
+        output_dir = os.path.join(self.tmp, 'out')
+        for jobs in ('0', '-2'):
+            with mock.patch('sys.stderr', io.StringIO()) as err:
+                with self.assertRaises(SystemExit):
+                    batch.main(['-o', output_dir, '--jobs', jobs, TESTS])
+            self.assertIn('must be at least 1', err.getvalue())
+        with self.assertRaises(ValueError):
+            list(batch.convert_files([], output_dir, jobs=0))
+        self.assertFalse(os.path.exists(output_dir))
+
+    def test_convert_files(self):
+        '''Largest first, and every file converted the same as one at a time'''
+        cri = os.path.join(self.tmp, 'CRI2014.rec')
+        with open(cri, 'wb') as f:
+            f.write(b'\x07F8383\n\n\x07I01RYAN PURCELL FOUNDATION\n\x07I03Remarks in House\n')
+        inputs = batch.find_inputs([TESTS, cri])
+        self.assertEqual(len(inputs), 4)
+        output_dir = os.path.join(self.tmp, 'out')
+        results = list(batch.convert_files(inputs, output_dir, jobs=1))
+        self.assertEqual([r[0] for r in results], batch.schedule(inputs))
+        self.assertEqual([r[5] for r in results], [None] * 4)
+        with open(os.path.join(output_dir, 'accents.htm'), 'rb') as f:
+            self.assertEqual(
+                f.read().decode('utf-8'),
+                '<html><h3><em>Thursday, September 15, 2016 </em></h3><p>Luj&#225;n, Ben<br /></html>')
+        self.assertTrue(os.path.exists(
+            os.path.join(output_dir, 'CRI-2014-RYAN-PURCELL-FOUNDATION.htm')))
+
+    def test_tokens(self):
+        '''--tokens renders the same files, from the cache the second time'''
+        inputs = [os.path.join(TESTS, 'accents.rec'), os.path.join(TESTS, 'tdailydigestchar27.rec')]
+        expected = os.path.join(self.tmp, 'expected')
+        list(batch.convert_files(inputs, expected, jobs=1))
+        tokens = os.path.join(self.tmp, 'tokens')
+        for run in range(2):
+            output_dir = os.path.join(self.tmp, 'out%d' % run)
+            results = list(batch.convert_files(inputs, output_dir, jobs=1, tokens=tokens))
+            self.assertEqual([r[5] for r in results], [None] * 2)
+            for name in ('accents.htm', 'tdailydigestchar27.htm'):
+                with open(os.path.join(expected, name), 'rb') as f, \
+                        open(os.path.join(output_dir, name), 'rb') as g:
+                    self.assertEqual(g.read(), f.read())
+
+    def test_formats(self):
+        cri = os.path.join(self.tmp, 'CRI2014.rec')
+        with open(cri, 'wb') as f:
+            f.write(b'\x07F8383\n\n\x07I01RYAN PURCELL FOUNDATION\n\x07I03Remarks in House\n')
+        inputs = [cri, os.path.join(TESTS, 'accents.rec')]
+        output_dir = os.path.join(self.tmp, 'out')
+        self.assertEqual(batch.main(inputs + ['-o', output_dir, '-j', '1', '--format', 'html',
+                                              '--format', 'text', '--format', 'json']), 0)
+        self.assertEqual(sorted(os.listdir(output_dir)), [
+            'CRI-2014-RYAN-PURCELL-FOUNDATION.htm', 'CRI-2014-RYAN-PURCELL-FOUNDATION.json',
+            'CRI-2014-RYAN-PURCELL-FOUNDATION.txt', 'accents.htm', 'accents.json', 'accents.txt'])
+        with open(os.path.join(output_dir, 'accents.txt'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'Thursday, September 15, 2016\nLuj\xe1n, Ben\n')
+        with open(os.path.join(output_dir, 'CRI-2014-RYAN-PURCELL-FOUNDATION.json'),
+                  encoding='utf-8') as f:
+            self.assertIn('"Remarks in House"', f.read())
@@ -0,0 +1,55 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from locator import benchmark
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+
+
+class GenerateTest(unittest.TestCase):
+
+    def test_generated_input(self):
+        '''The same seed gives the same input, which parses'''
+        for seed in range(3):
+            dd = daily_digest(20000, seed)
+            self.assertEqual(dd, daily_digest(20000, seed))
+            self.assertGreaterEqual(len(dd), 20000)
+            for code in (b'\x07Z', b'\x07I90[', b'\xff', b'\x07T'):
+                self.assertIn(code, dd)
+            out = io.StringIO()
+            DailyDigestInputParser().parse_io(io.BytesIO(dd), outputfile=out)
+            self.assertTrue(out.getvalue().startswith('<html>'))
+            cri = congressional_record_index(20000, seed)
+            self.assertEqual(cri, congressional_record_index(20000, seed))
+            stanzas = list(CongressionalRecordIndexInputParser(year=2014).parse(cri))
+            self.assertEqual(len(stanzas), cri.count(b'\x07I01'))
+        self.assertNotEqual(daily_digest(20000, 0), daily_digest(20000, 1))
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_results(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        results = os.path.join(tmp, 'results.json')
+        out = io.StringIO()
+        benchmark.report(benchmark.run_benchmarks(size=0.02, repeat=1), out)
+        self.assertEqual(len(out.getvalue().splitlines()), len(benchmark.BENCHMARKS) + 1)
+        out = io.StringIO()
+        self.assertEqual(benchmark.main(['--size', '0.02', '--repeat', '1', '-o', results,
+                                         '--only', 'makelines,process_title'], out), 0)
+        self.assertEqual([line.split()[0] for line in out.getvalue().splitlines()],
+                         ['benchmark', 'makelines', 'process_title'])
+        with open(results) as f:
+            baseline = json.load(f)
+        self.assertEqual(sorted(baseline['results']), ['makelines', 'process_title'])
+        self.assertGreater(baseline['results']['makelines']['mb_per_s'], 0)
+        slower = json.loads(json.dumps(baseline))
+        slower['results']['makelines']['mb_per_s'] /= 2
+        rows = benchmark.compare(slower, baseline)
+        self.assertEqual([(row[0], row[4]) for row in rows],
+                         [('makelines', True), ('process_title', False)])
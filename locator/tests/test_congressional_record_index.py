@@ -107,6 +107,8 @@ class CongressionalRecordIndexLocatorTest(unittest.TestCase):
         for stanza in inputparser.make_stanzas(data):
             self.assertEqual( stanza, good_stanzas[cnt])
             cnt = cnt +1
+        # a memoryview (or mmap) is split in place
+        self.assertEqual(list(inputparser.make_stanzas(memoryview(data))), good_stanzas)
 
 
     def test_split_stanza(self):
@@ -144,6 +146,95 @@ class CongressionalRecordIndexLocatorTest(unittest.TestCase):
                     iostream.read())
 
 
+    def test_parallel(self):
+        '''Stanzas rendered by worker processes come back in order and the
+        same as when rendered one at a time'''
+        data = b'''\x07F8383
+
+\x07I01RYAN PURCELL FOUNDATION
+\x07I03Remarks in House
+\x07I05Anderson, Michael and Kelly, E1369 [28SE]
+
+\x07I01SECOND STANZA \x07T1(a former Resident)
+\x07I05Doctor, Don and Patty Jackson, E1368 [28SE]
+
+\x07I01THIRD STANZA
+\x07I02Senate\x07T1Luja\xffAE1n
+\x07I05Page S2128
+'''
+        def parse(**kwargs):
+            inputparser = CongressionalRecordIndexInputParser(year=2014)
+            return [(title, out.read())
+                    for title, out in inputparser.parse(data, **kwargs)]
+        good = parse()
+        self.assertEqual(len(good), 3)
+        self.assertEqual(parse(processes=2), good)
+
+    def test_render_cache(self):
+        '''Unchanged stanzas come from the cache, a changed stanza or table
+        version is rendered again'''
+        import shutil
+        import tempfile
+        from locator.rendercache import RenderCache
+        data = b'''\x07F8383
+\x07I01RYAN PURCELL FOUNDATION
+\x07I03Remarks in House
+\x07I01SECOND STANZA \x07T1(a former Resident)
+\x07I05Doctor, Don and Patty Jackson, E1368 [28SE]
+'''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = RenderCache(directory)
+        def parse(data, year=2014, **kwargs):
+            inputparser = CongressionalRecordIndexInputParser(year=year, cache=cache)
+            return [(title, out.read())
+                    for title, out in inputparser.parse(data, **kwargs)]
+        good = CongressionalRecordIndexInputParser(year=2014).parse(data)
+        good = [(title, out.read()) for title, out in good]
+        self.assertEqual(parse(data), good)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(parse(data), good)
+        self.assertEqual(parse(data, processes=2), good)
+        self.assertEqual((cache.hits, cache.misses), (4, 2))
+        changed = data.replace(b'Jackson', b'Johnson')
+        self.assertEqual(parse(changed)[0], good[0])
+        self.assertEqual((cache.hits, cache.misses), (5, 3))
+        self.assertEqual(parse(data, year=2015)[0][0][0], b'CRI-2015-RYAN-PURCELL-FOUNDATION.htm')
+        self.assertEqual((cache.hits, cache.misses), (5, 5))
+        # new rendering code misses
+        from unittest import mock
+        with mock.patch('locator.rendercache.code_version', return_value='upgraded'):
+            self.assertEqual(parse(data), good)
+        self.assertEqual((cache.hits, cache.misses), (5, 7))
+        cache.max_bytes = cache.size() // 2
+        parse(changed.replace(b'Johnson', b'Jones'))
+        self.assertLessEqual(cache.size(), cache.max_bytes)
+
+    def test_access_ids(self):
+        '''access_ids() names the stanzas as parse() does and reports
+        names given to more than one stanza'''
+        data = b'''\x07F8383
+\x07I01RYAN PURCELL FOUNDATION
+\x07I03Remarks in House
+\x07I01SECOND STANZA \x07T1(a former Resident)
+\x07I05Doctor, Don and Patty Jackson, E1368 [28SE]
+\x07I01Ryan Purcell Foundation
+\x07I05Anderson, Michael and Kelly, E1369 [28SE]
+'''
+        inputparser = CongressionalRecordIndexInputParser(year=2014)
+        index = inputparser.access_ids(data)
+        self.assertEqual(list(index), [b'CRI-2014-RYAN-PURCELL-FOUNDATION.htm',
+                                       b'CRI-2014-SECOND-STANZA-22AD76.htm'])
+        with self.assertLogs('locator.congressionalrecordindex', 'WARNING'):
+            titles = [title for title, out in inputparser.parse(data)]
+        self.assertEqual(sorted((number, name, line) for name in index
+                                for number, line in index.stanzas[name]),
+                         [(number, name, line) for number, (name, line) in enumerate(titles)])
+        self.assertEqual(list(inputparser.access_index.collisions()),
+                         [b'CRI-2014-RYAN-PURCELL-FOUNDATION.htm'])
+        self.assertEqual(index.collisions()[b'CRI-2014-RYAN-PURCELL-FOUNDATION.htm'],
+                         [(0, b'RYAN PURCELL FOUNDATION'), (2, b'Ryan Purcell Foundation')])
+
     def test_find_escapes(self):
         """Test to make sure find_escapes will find multiple escapes in a line"""
         from locator import find_escape
@@ -43,3 +43,67 @@ class DailydigestTest(unittest.TestCase):
         print ("final:\n%s" % final )
         print ("good:\n%s" % '''<html><h3><em>Wednesday, September 14, 2016</em></h3><center><h1>Daily Digest</h1></center><strong> </strong><center><h2>Senate</h2></center><center><h3><em>Chamber Action</em></h3></center><strong> Senate continued consideration of S. 2848, to provide for the conservation and development of water and related resources, to authorize the Secretary of the Army to construct various projects for improvements to rivers and harbors of the United States, taking action on the following amendment proposed thereto: </strong><br /><strong>Pages S5694&ndash;S5718 </strong><br /><br /><p>:<p>McConnell (for Inhofe) Amendment No. 4979, in the nature of a substitute.  E1273<br />\n<center>[Page:D920] </center></html>''')
         self.assertEqual(final,  '''<html><h3><em>Wednesday, September 14, 2016</em></h3><center><h1>Daily Digest</h1></center><strong> </strong><center><h2>Senate</h2></center><center><h3><em>Chamber Action</em></h3></center><strong> Senate continued consideration of S. 2848, to provide for the conservation and development of water and related resources, to authorize the Secretary of the Army to construct various projects for improvements to rivers and harbors of the United States, taking action on the following amendment proposed thereto: </strong><br /><strong>Pages S5694&ndash;S5718 </strong><br /><br /><p>:<p>McConnell (for Inhofe) Amendment No. 4979, in the nature of a substitute.  E1273<br />\n<center>[Page:D920] </center></html>''')
+
+    def test_stream(self):
+        '''Reading the input a few bytes at a time gives the same html'''
+        import io
+        import os
+        for filename in ['dtestPageWhitespace.rec', 'tdailydigestchar27.rec', 'accents.rec']:
+            with open(os.path.join(os.path.dirname(__file__), filename), "rb") as data:
+                whole = DailyDigestInputParser().parse_io(data).getvalue()
+            for chunk_size in [1, 7, 64]:
+                with open(os.path.join(os.path.dirname(__file__), filename), "rb") as data:
+                    out = io.StringIO()
+                    DailyDigestInputParser().parse_io(data, outputfile=out, chunk_size=chunk_size)
+                    self.assertEqual(whole, out.getvalue())
+
+    def test_mmap(self):
+        '''A memory mapped file gives the same html'''
+        import os
+        TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), 'tdailydigestchar27.rec')
+        final = self._load_and_convert('tdailydigestchar27.rec')
+        parser = LocatorParser(inputparser=DailyDigestInputParser(),
+                               outputparser=OutputParser())
+        mapped = ""
+        for outputstream in parser.parse_file(TESTDATA_FILENAME):
+            outputstream.seek(0)
+            mapped = "%s%s" % (mapped, outputstream.read())
+        self.assertEqual(final, mapped)
+
+    def test_parallel(self):
+        '''Chunks rendered by worker processes join up to the same html,
+        page markers and all'''
+        import io
+        from unittest import mock
+        data = b'\x07I01Monday, April 18, 2016\xadD382 \x07I02Daily Digest\x07T1' + b''.join(
+            b'\x07I90[D18AP6-%d]{D%d}\x07I05Senate\x07T2Luja\xffAE1n\x07I11Page S%d\x07T3 end' % (i, 382 + i // 3, i)
+            for i in range(30))
+        whole = DailyDigestInputParser().parse_io(io.BytesIO(data)).getvalue()
+        parser = DailyDigestInputParser()
+        self.assertGreater(len(parser.parallel_cuts(data, 100)), 10)
+        out = io.StringIO()
+        with mock.patch('locator.parser.PARALLEL_CHUNK', 100):
+            parser.parse_io(io.BytesIO(data), outputfile=out, processes=2)
+        self.assertEqual(out.getvalue(), whole)
+
+    def test_iter_html(self):
+        '''The pieces join up to the html of parse_io(), the first is sent
+        before the input is read'''
+        import io
+        import os
+        for filename in ['dtestPageWhitespace.rec', 'tdailydigestchar27.rec', 'accents.rec']:
+            with open(os.path.join(os.path.dirname(__file__), filename), "rb") as data:
+                whole = DailyDigestInputParser().parse_io(data).getvalue()
+            with open(os.path.join(os.path.dirname(__file__), filename), "rb") as data:
+                pieces = DailyDigestInputParser().iter_html(data, chunk_size=7, close_state=False)
+                self.assertEqual(next(pieces), '<html>')
+                self.assertEqual(data.tell(), 0)
+                rest = list(pieces)
+                self.assertGreater(len(rest), 2)
+                self.assertEqual('<html>' + ''.join(rest), whole)
+            with open(os.path.join(os.path.dirname(__file__), filename), "rb") as data:
+                pieces = list(DailyDigestInputParser().iter_html(data, min_bytes=100, binary=True))
+                self.assertTrue(all(len(piece) > 100 for piece in pieces[1:-1]))
+        # the last action is closed
+        self.assertEqual(b''.join(pieces).decode('utf-8'),
+                         '<html><h3><em>Thursday, September 15, 2016 </em></h3><p>Luj&#225;n, Ben<br /></p></html>')
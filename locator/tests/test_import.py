@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# seconds a fresh interpreter may take to import the parsers, checked only
+# when set, wall clock time is too noisy on a loaded machine.  The usual
+# cold start is a few tens of ms, 0.1 is a fair budget.
+IMPORT_BUDGET = os.environ.get('LOCATOR_IMPORT_BUDGET')
+# only imported when a feature that needs them is used
+HEAVY_MODULES = ('argparse', 'concurrent.futures', 'hashlib', 'json',
+                 'multiprocessing', 'random')
+
+TIME_IMPORT = '''
+import sys, time
+start = time.perf_counter()
+import locator.dailydigest, locator.congressionalrecordindex
+print(time.perf_counter() - start)
+print(' '.join(sorted(set(sys.argv[1:]).intersection(sys.modules))))
+'''
+
+
+def run(code, *args):
+    env = dict(os.environ)
+    # time the import, not the compile of the sources
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return subprocess.run([sys.executable, '-c', code] + list(args), cwd=root, env=env,
+                          stdout=subprocess.PIPE, check=True).stdout.decode('utf-8')
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_heavy_modules(self):
+        self.assertEqual(run(TIME_IMPORT, *HEAVY_MODULES).split('\n')[1], '')
+
+    def test_import_time(self):
+        run(TIME_IMPORT)
+        seconds = min(float(run(TIME_IMPORT).split('\n')[0]) for _ in range(3))
+        if IMPORT_BUDGET is None:
+            self.skipTest('import took %.1f ms, set LOCATOR_IMPORT_BUDGET (seconds) '
+                          'to check it' % (seconds * 1000))
+        self.assertLess(seconds, float(IMPORT_BUDGET), 'import took %.1f ms' % (seconds * 1000))
+
+    def test_lazy_submodules(self):
+        self.assertEqual(run('import locator, sys; print("locator.parser" in sys.modules, '
+                             'locator.parser.CHUNK_SIZE, "locator.parser" in sys.modules)'),
+                         'False 1048576 True\n')
+        with self.assertRaises(subprocess.CalledProcessError):
+            run('import locator; locator.nothing')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -201,3 +201,159 @@ class LocatorTest(unittest.TestCase):
             self.assertEqual(
                 contents,
                 "<span class='bell-I67H dailydigest-extension'>")
+
+    def test_makelines_stream(self):
+        '''Bell+Z deletions and lines cut by a chunk boundary'''
+        import io
+        data = b'  \x07I01foo\x07Zjunk\x07e43 bar\x07I02\x0Eshift\x0Fsecond\x07ZRemove all of me  \n'
+        parser = InputParser()
+        want = [line for page, m, line in parser.makelines(data.strip())]
+        for chunk_size in range(1, len(data) + 1):
+            got = [line for page, m, line in parser.makelines_stream(io.BytesIO(data), chunk_size)]
+            self.assertEqual(got, want)
+
+
+class LineNormalizerTest(unittest.TestCase):
+
+    def test_clean_line(self):
+        '''The fused scan gives the same line as the chained passes'''
+        from locator import NORMALIZER
+        data = b'\x07I05Pages\x19S5279\xff0981 under_bar\x18\x0Eshift\x0F end\xa8D382\xad'
+        good = b'\x07I05Pages S5279&ndash;81 under--bar<br /> end'
+        self.assertEqual(NORMALIZER(data), good)
+        self.assertEqual(NORMALIZER.chained(data), good)
+
+    def test_clean_line_joins(self):
+        '''Removing a char can join its neighbours into a new match, the
+        result must still match the chained passes'''
+        from locator import NORMALIZER
+        for data in [b'x\xff\xac09y', b'\x07F1\xac2', b'\x00\x01B9', b'\xa8\xac\xad',
+                     b'\x0Eab\x07I32c|', b'\x07S12\x07I33foo', b'\x07I32foo\nbar']:
+            self.assertEqual(NORMALIZER(data), NORMALIZER.chained(data))
+
+    def test_remove(self):
+        from locator import NORMALIZER
+        for data in [b'\x000\x00A\x00D\x01B\x01C\x07F123', b'ab\x00\x01CAc', b'\x07S0627 Senate\xac']:
+            self.assertEqual(NORMALIZER.remove(data), remove_chars(data, REMOVE_CHARS))
+
+
+
+class DispatchTableTest(unittest.TestCase):
+
+    def test_translate_locator(self):
+        '''Compiled tables give the same actions as translate_locator'''
+        from locator import translate_locator, compile_tables
+        from locator.dailydigest import DailyDigestInputParser
+        from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+        for parser in (DailyDigestInputParser, CongressionalRecordIndexInputParser):
+            dispatch = parser.dispatch_table()
+            self.assertIs(dispatch, compile_tables(parser.LOCATOR_TABLE, parser.FONT_TABLE))
+            for grid in [b'G1', b'G2', b'G3', b'G4', b'G5', b'']:
+                for code in [b'I01', b'I67H', b'T1', b'T4', b'g001', b'L', b'x12']:
+                    self.assertEqual(
+                        dispatch[grid, code],
+                        translate_locator(code, grid, parser.LOCATOR_TABLE, parser.FONT_TABLE))
+
+    def test_compiled_action(self):
+        from locator.dailydigest import DailyDigestInputParser
+        dispatch = DailyDigestInputParser.dispatch_table()
+        action = dispatch[b'G1', b'I41']
+        self.assertEqual(action.start_bytes, b'<br /><strong><em>')
+        self.assertEqual(action.end_bytes, b'</em></strong>')
+        self.assertEqual(action.grid, b'G2')
+        # unknown codes share one blank action per grid
+        self.assertIs(dispatch[b'G1', b'x1'], dispatch[b'G1', b'x2'])
+        self.assertEqual(dispatch[b'G1', b'x1'].start_bytes, b'')
+        with self.assertRaises(TypeError):
+            action['start'] = '<p>'
+
+
+class OutputSinkTest(unittest.TestCase):
+
+    def _write(self, sink):
+        sink.markup(b'<p>')
+        sink.text(b'Luj\xe1n, Ben ')
+        sink.markup('<em>–</em>'.encode('utf-8'))
+        sink.text(b'ascii only')
+        sink.flush()
+
+    def test_targets(self):
+        '''Text, binary and file descriptor targets get the same html'''
+        import io, os, tempfile
+        from locator import OutputSink
+        good = '<p>Luj\xe1n, Ben <em>–</em>ascii only'
+        out = io.StringIO()
+        self._write(OutputSink(out))
+        self.assertEqual(out.getvalue(), good)
+        out = io.BytesIO()
+        self._write(OutputSink(out))
+        self.assertEqual(out.getvalue(), good.encode('utf-8'))
+        with tempfile.TemporaryFile() as tmp:
+            self._write(OutputSink(tmp.fileno()))
+            tmp.seek(0)
+            self.assertEqual(tmp.read(), good.encode('utf-8'))
+
+    def test_buffered(self):
+        '''Nothing is written until the buffer fills or is flushed'''
+        import io
+        from locator import OutputSink
+        out = io.StringIO()
+        sink = OutputSink(out, buffer_size=8)
+        sink.text(b'1234')
+        self.assertEqual(out.getvalue(), '')
+        sink.text(b'5678')
+        self.assertEqual(out.getvalue(), '12345678')
+
+
+class TracingTest(unittest.TestCase):
+
+    def test_tracer(self):
+        '''An installed tracer sees the lines and locators, and is removed
+        again after the with block'''
+        import io
+        from locator import tracing
+        from locator.dailydigest import DailyDigestInputParser
+
+        class Recorder(tracing.Tracer):
+            def __init__(self):
+                self.locators = []
+                self.lines = 0
+            def locator(self, locator, action):
+                self.locators.append(locator)
+            def line(self, page, match, line):
+                self.lines += 1
+
+        recorder = Recorder()
+        with tracing.use_tracer(recorder):
+            DailyDigestInputParser().parse_io(io.BytesIO(b'\x07I01Monday\x07PSenate\x07T1met'))
+        self.assertIsNone(tracing.get_tracer())
+        self.assertEqual(recorder.locators, [b'I01', b'P', b'T1'])
+        self.assertEqual(recorder.lines, 3)
+
+    def test_tracer_per_thread(self):
+        '''A tracer installed in one thread does not see another's parse'''
+        import io
+        import threading
+        from locator import tracing
+        from locator.dailydigest import DailyDigestInputParser
+
+        class Recorder(tracing.Tracer):
+            def __init__(self):
+                self.locators = []
+            def locator(self, locator, action):
+                self.locators.append(locator)
+
+        recorder = Recorder()
+        seen = []
+
+        def other():
+            seen.append(tracing.get_tracer())
+            DailyDigestInputParser().parse_io(io.BytesIO(b'\x07I01Tuesday\x07T1met'))
+
+        with tracing.use_tracer(recorder):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join()
+            DailyDigestInputParser().parse_io(io.BytesIO(b'\x07I01Monday\x07PSenate'))
+        self.assertEqual(seen, [None])
+        self.assertEqual(recorder.locators, [b'I01', b'P'])
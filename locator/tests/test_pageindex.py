@@ -0,0 +1,79 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from locator.generate import daily_digest
+from locator.dailydigest import DailyDigestInputParser
+from locator.pageindex import PageIndex, index_path
+
+
+class CountingFile(io.BytesIO):
+
+    def __init__(self, data):
+        io.BytesIO.__init__(self, data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = io.BytesIO.read(self, size)
+        self.bytes_read += len(data)
+        return data
+
+
+class PageIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_render_pages(self):
+        '''each page is its stretch of the parse_io() html'''
+        data = daily_digest(200000, 2)
+        parser = DailyDigestInputParser()
+        html = parser.parse_io(io.BytesIO(data)).getvalue()
+        index = parser.page_index(io.BytesIO(data))
+        names = index.names()
+        self.assertGreater(len(names), 10)
+        self.assertEqual(index.pages[0][1:], (0, (None, b'G2')))
+        self.assertEqual(parser.render_pages(io.BytesIO(data), index, names[0],
+                                             names[-1]).getvalue(), html)
+        pages = [parser.render_pages(io.BytesIO(data), index, name, chunk_size=1000).getvalue()
+                 for name in names]
+        for name, page in zip(names, pages):
+            self.assertTrue(page.endswith('<center>[Page:%s] </center></html>' % name.decode()))
+        self.assertEqual('<html>' + ''.join(page[6:-7] for page in pages) + '</html>', html)
+        # a page in the middle reads about its share of the input
+        inputfile = CountingFile(data)
+        self.assertEqual(parser.render_pages(inputfile, index, names[5].decode(), names[6],
+                                             chunk_size=1000).getvalue(),
+                         '<html>' + pages[5][6:-7] + pages[6][6:-7] + '</html>')
+        self.assertLess(inputfile.bytes_read, index.pages[7][1] - index.pages[5][1] + 2000)
+        with self.assertRaises(KeyError):
+            parser.render_pages(io.BytesIO(data), index, b'D1')
+        with self.assertRaises(KeyError):
+            parser.render_pages(io.BytesIO(data), index, names[6], names[5])
+
+    def test_file_pages(self):
+        data = daily_digest(50000, 4)
+        filename = os.path.join(self.tmp, 'digest.rec')
+        with open(filename, 'wb') as f:
+            f.write(data)
+        parser = DailyDigestInputParser()
+        index = parser.page_index(io.BytesIO(data))
+        name = index.names()[1]
+        page = parser.render_pages(io.BytesIO(data), index, name).getvalue()
+        self.assertEqual(parser.render_file_pages(filename, name).getvalue(), page)
+        written = PageIndex.read(index_path(filename))
+        self.assertEqual((written.pages, written.size), (index.pages, len(data)))
+        # a changed file is indexed again
+        with open(filename, 'ab') as f:
+            f.write(b'\x07I90 {D999}\x07Pmore')
+        os.utime(filename, (os.path.getmtime(index_path(filename)) + 10,) * 2)
+        self.assertTrue(parser.render_file_pages(filename, b'D999').getvalue().endswith(
+            'more<center>[Page:D999] </center></html>'))
+
+
+if __name__ == '__main__':
+    unittest.main()
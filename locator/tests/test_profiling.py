@@ -0,0 +1,91 @@
+import io
+import unittest
+from locator import profiling
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.parser import LocatorParser, OutputParser
+
+
+def parse_dd(data, profile=None):
+    parser = LocatorParser(inputdata=io.BytesIO(data), inputparser=DailyDigestInputParser(),
+                           outputparser=OutputParser())
+    return parser, [output.getvalue() for output in parser.parse(profile=profile)]
+
+
+def parse_cri(data, profile=None):
+    parser = LocatorParser(inputdata=data,
+                           inputparser=CongressionalRecordIndexInputParser(year=2014),
+                           outputparser=OutputParser())
+    return parser, [(title, output.read()) for title, output in parser.parse(profile=profile)]
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def test_daily_digest(self):
+        data = daily_digest(30000, 1)
+        parser, outputs = parse_dd(data, profile=True)
+        self.assertEqual(outputs, parse_dd(data)[1])
+        self.assertIsNone(profiling.get_profiler())
+        self.assertEqual(len(parser.profiles), 1)
+        report = parser.profiles[0]
+        self.assertEqual(report['document'], 0)
+        self.assertIsNone(report['name'])
+        stages = report['stages']
+        for stage in ('bell_z', 'clean_line', 'process_lines', 'process_actions',
+                      'process_escapes', 'write', 'output', 'other'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['bell_z'], dict(stages['bell_z'], calls=1, bytes_in=len(data.strip())))
+        self.assertEqual(stages['clean_line']['calls'], stages['process_lines']['calls'])
+        self.assertEqual(stages['write']['bytes_out'], len(outputs[0]))
+        self.assertAlmostEqual(sum(s['seconds'] for s in stages.values()), report['seconds'])
+
+    def test_cri_stanzas(self):
+        data = congressional_record_index(20000, 1)
+        profiler = profiling.Profiler()
+        parser, outputs = parse_cri(data, profile=profiler)
+        self.assertEqual(outputs, parse_cri(data)[1])
+        self.assertIs(parser.profiles, profiler.reports)
+        self.assertEqual(len(profiler.reports), len(outputs))
+        self.assertEqual([report['name'] for report in profiler.reports],
+                         [title[0].decode('utf-8') for title, _ in outputs])
+        for report in profiler.reports:
+            self.assertEqual(report['stages']['title']['calls'], 1)
+        total = profiler.total()
+        self.assertEqual(total['documents'], len(outputs))
+        self.assertEqual(total['stages']['title']['calls'], len(outputs))
+        out = io.StringIO()
+        profiling.report(total, out)
+        self.assertIn('process_lines', out.getvalue())
+
+    def test_sample(self):
+        data = congressional_record_index(20000, 1)
+        parser, outputs = parse_cri(data, profile=profiling.Profiler(sample=0))
+        self.assertEqual(parser.profiles, [])
+        parser, outputs = parse_cri(data, profile=profiling.Profiler(sample=0.5, seed=1))
+        self.assertTrue(0 < len(parser.profiles) < len(outputs))
+        numbers = [report['document'] for report in parser.profiles]
+        self.assertEqual(numbers, sorted(set(numbers)))
+
+    def test_per_thread(self):
+        '''A profiler installed in one thread does not time another's parse'''
+        import threading
+        data = daily_digest(3000, 1)
+        profiler = profiling.Profiler()
+        seen = []
+
+        def other():
+            seen.append(profiling.get_profiler())
+            parse_dd(data)
+
+        with profiling.use_profiler(profiler):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, [None])
+        self.assertEqual(profiler.stages(), {})
+        self.assertIsNone(profiling.get_profiler())
+
+
+if __name__ == '__main__':
+    unittest.main()
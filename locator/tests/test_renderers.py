@@ -0,0 +1,89 @@
+import io
+import json
+import unittest
+from locator import process_lines
+from locator.tokens import TokenStream
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.parser import LocatorParser, HtmlOutputParser, OutputParser
+from locator.renderers import (render_text, render_json, fan_out, TextOutputParser,
+                               JsonOutputParser, FanOutOutputParser)
+
+
+class CountingParser(CongressionalRecordIndexInputParser):
+
+    def __init__(self, **kwargs):
+        CongressionalRecordIndexInputParser.__init__(self, **kwargs)
+        self.tokenized = 0
+
+    def tokenize(self, *args, **kwargs):
+        self.tokenized += 1
+        return CongressionalRecordIndexInputParser.tokenize(self, *args, **kwargs)
+
+
+class RenderersTest(unittest.TestCase):
+
+    def test_text_and_json(self):
+        parser = DailyDigestInputParser()
+        dispatch = parser.dispatch_table()
+        stream = TokenStream()
+        for line in (b'\x07I01Monday, April 18, 2016', b'\x07I05Luja\xffAE1n x\xff09y',
+                     b'\x07P\x07T3more\x07T1 text'):
+            process_lines(line, (None, b'G2'), outputf=stream, dispatch=dispatch)
+        self.assertEqual(render_text(stream).getvalue(),
+                         'Monday, April 18, 2016\nLuj\xe1n x\u2013y\nmore text\n')
+        document = json.loads(render_json(stream, dispatch).getvalue())
+        self.assertEqual(document, {
+            'name': None, 'title': None, 'pages': [],
+            'sections': [{'code': 'I01', 'text': 'Monday, April 18, 2016'},
+                         {'code': 'I05', 'text': 'Luj\xe1n x\u2013y'},
+                         {'code': 'P', 'text': 'more text'}]})
+        # entities in the text spans too
+        stream = TokenStream()
+        process_lines(b'\x07I05Pages\x19S5279\xff0981', (None, b'G2'), outputf=stream,
+                      dispatch=dispatch)
+        self.assertIn('S5279\u201381', render_text(stream).getvalue())
+        self.assertNotIn('&', render_json(stream, dispatch).getvalue())
+
+    def test_fan_out(self):
+        '''one tokenize() for every format, each the same as on its own'''
+        data = congressional_record_index(20000, 1)
+        html = [(title, out.read())
+                for title, out in CongressionalRecordIndexInputParser(year=2014).parse(data)]
+        inputparser = CountingParser(year=2014)
+        outputs = list(LocatorParser(inputdata=data, inputparser=inputparser,
+                                     outputparser=fan_out(('html', 'text', 'json'),
+                                                          inputparser.dispatch_table())
+                                     ).parse(tokens=True))
+        self.assertEqual(inputparser.tokenized, 1)
+        self.assertEqual([(title, out.read()) for title, out in
+                          (output['html'] for output in outputs)], html)
+        for output, (title, _) in zip(outputs, html):
+            name, line = title
+            self.assertEqual(output['text'][0], (name[:-4] + b'.txt', line))
+            self.assertEqual(output['json'][0], (name[:-4] + b'.json', line))
+            document = json.loads(output['json'][1].read())
+            self.assertEqual(document['name'], name.decode('utf-8'))
+            self.assertEqual('\n'.join(section['text'] for section in document['sections']) + '\n',
+                             output['text'][1].read())
+        with self.assertRaises(ValueError):
+            fan_out(('pdf',), None)
+
+    def test_daily_digest(self):
+        data = daily_digest(20000, 1)
+        parser = DailyDigestInputParser()
+        fan = FanOutOutputParser({'html': HtmlOutputParser(), 'text': TextOutputParser(),
+                                  'json': JsonOutputParser(parser.dispatch_table(), OutputParser())})
+        [output] = LocatorParser(inputdata=io.BytesIO(data), inputparser=parser,
+                                 outputparser=fan).parse(tokens=True)
+        self.assertEqual(output['html'].getvalue(), parser.parse_io(io.BytesIO(data)).getvalue())
+        self.assertNotIn('<', output['text'].getvalue())
+        self.assertNotIn('&', output['text'].getvalue())
+        document = json.loads(output['json'].getvalue())
+        self.assertTrue(document['pages'])
+        self.assertEqual(document['sections'][0]['code'], 'I01')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import email.parser
+import email.policy
+import http.client
+import io
+import json
+import os
+import shutil
+import socket
+import tarfile
+import tempfile
+import threading
+import unittest
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.server import (ConversionServer, DirectorySink, Job, UnixHTTPConnection,
+                            MAX_BYTES)
+
+
+def request(connection, method, url, body=None):
+    connection.request(method, url, body)
+    response = connection.getresponse()
+    return response.status, response.getheader('Content-Type'), response.read()
+
+
+def parts(content_type, body):
+    '''(file name, html) of each part of a multipart/mixed body.'''
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('ascii') + b'\r\n\r\n' + body)
+    return [(part.get_filename().encode('utf-8'), part.get_payload(decode=True))
+            for part in message.iter_parts()]
+
+
+class ConversionServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.inputs = os.path.join(cls.tmp, 'in')
+        os.mkdir(cls.inputs)
+        cls.server = ConversionServer(workers=2, jobs=2, queue=1, input_root=cls.inputs,
+                                      output_root=os.path.join(cls.tmp, 'out'),
+                                      unit_bytes=2000)
+        cls.server.warm()
+        cls.socket = os.path.join(cls.tmp, 'locator.sock')
+        cls.httpds = [cls.server.serve_tcp(), cls.server.serve_unix(cls.socket)]
+        for httpd in cls.httpds:
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for httpd in cls.httpds:
+            httpd.shutdown()
+            httpd.server_close()
+        cls.server.close()
+        shutil.rmtree(cls.tmp)
+
+    def tcp(self):
+        return http.client.HTTPConnection(*self.httpds[0].server_address, timeout=60)
+
+    def unix(self):
+        return UnixHTTPConnection(self.socket, timeout=60)
+
+    def test_daily_digest(self):
+        data = daily_digest(20000, 1)
+        html = DailyDigestInputParser().parse_io(io.BytesIO(data)).getvalue().encode('utf-8')
+        connection = self.unix()
+        # two jobs on one connection
+        for _ in range(2):
+            self.assertEqual(request(connection, 'POST', '/convert', data),
+                             (200, 'text/html; charset=utf-8', html))
+        status, content_type, body = request(self.tcp(), 'POST',
+                                             '/convert?type=dd&sink=tar&name=d.htm', data)
+        self.assertEqual((status, content_type), (200, 'application/x-tar'))
+        with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+            self.assertEqual(tar.getnames(), ['d.htm'])
+            self.assertEqual(tar.extractfile('d.htm').read(), html)
+
+    def test_cri(self):
+        data = congressional_record_index(20000, 2)
+        expected = [(name, out.read().encode('utf-8')) for (name, line), out in
+                    CongressionalRecordIndexInputParser(year=2014).parse(data)]
+        status, content_type, body = request(self.tcp(), 'POST', '/convert?year=2014', data)
+        self.assertEqual(status, 200)
+        self.assertEqual(parts(content_type, body), expected)
+        # a file under the input root, written under the output root
+        with open(os.path.join(self.inputs, 'CRI-2014.rec'), 'wb') as f:
+            f.write(data)
+        status, _, body = request(self.unix(), 'POST',
+                                  '/convert?path=CRI-2014.rec&sink=dir&dir=2014', b'')
+        self.assertEqual(status, 200)
+        names = body.decode('utf-8').split()
+        self.assertEqual(names, [os.path.join('2014', name.decode('utf-8'))
+                                 for name, _ in expected])
+        for name, html in expected:
+            with open(os.path.join(self.tmp, 'out', '2014', name.decode('utf-8')), 'rb') as f:
+                # the last of the same name wins
+                self.assertEqual(f.read(), dict(expected)[name])
+
+    def test_errors_and_limits(self):
+        connection = self.tcp()
+        self.assertEqual(request(connection, 'POST', '/convert?type=pdf', b'x')[0], 400)
+        self.assertEqual(request(self.tcp(), 'POST', '/convert?type=cri', b'x')[0], 400)
+        self.assertEqual(request(self.tcp(), 'POST', '/convert?path=../x.rec', b'')[0], 403)
+        self.assertEqual(request(self.tcp(), 'POST', '/convert?path=none.rec', b'')[0], 404)
+        self.assertEqual(request(self.tcp(), 'GET', '/convert')[0], 404)
+        for length in (b'abc', b'-5'):
+            with socket.create_connection(self.httpds[0].server_address, timeout=60) as client:
+                client.sendall(b'POST /convert HTTP/1.1\r\nHost: x\r\n'
+                               b'Content-Length: %s\r\n\r\n\x07I01' % length)
+                self.assertTrue(client.makefile('rb').readline().startswith(b'HTTP/1.1 400'))
+        with open(os.path.join(self.inputs, 'big.rec'), 'wb') as f:
+            f.write(b'\x07I01x' * 100)
+        self.server.max_bytes = 100
+        try:
+            self.assertEqual(request(self.tcp(), 'POST', '/convert?path=big.rec', b'')[0], 413)
+        finally:
+            self.server.max_bytes = MAX_BYTES
+        # every slot taken
+        for _ in range(3):
+            self.server._admitted.acquire()
+        try:
+            self.assertEqual(request(self.tcp(), 'POST', '/convert', b'\x07I01x')[0], 503)
+        finally:
+            for _ in range(3):
+                self.server._admitted.release()
+        with open(os.path.join(self.inputs, 'slow.rec'), 'wb') as f:
+            f.write(daily_digest(20000, 3))
+        self.server.timeout = 0
+        try:
+            self.assertEqual(request(self.tcp(), 'POST', '/convert?path=slow.rec', b'')[0], 504)
+        finally:
+            self.server.timeout = 300
+        # a body that stops coming frees its slot
+        self.server.timeout = 0.5
+        try:
+            with socket.create_connection(self.httpds[0].server_address, timeout=60) as client:
+                client.sendall(b'POST /convert HTTP/1.1\r\nHost: x\r\n'
+                               b'Content-Length: 100\r\n\r\n\x07I01')
+                self.assertTrue(client.makefile('rb').readline().startswith(b'HTTP/1.1 408'))
+        finally:
+            self.server.timeout = 300
+        status, content_type, body = request(self.unix(), 'GET', '/status')
+        counts = json.loads(body.decode('utf-8'))
+        self.assertEqual((counts['rejected'], counts['timeouts'], counts['running']), (1, 1, 0))
+        self.assertEqual(counts['failed'], 8)
+        self.assertEqual((counts['workers'], counts['jobs'], counts['queue']), (2, 2, 1))
+
+    def test_directory_sink_abort(self):
+        '''a failed conversion leaves no half written file behind'''
+        job = Job({'dir': 'aborted'}, b'', output_root=os.path.join(self.tmp, 'out'))
+        sink = DirectorySink(None, job)
+        sink.start(b'CRI-2014-X.htm')
+        sink.write(b'<p>half')
+        path = sink.path
+        self.assertTrue(os.path.exists(path))
+        sink.abort()
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(sink.file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from locator.generate import congressional_record_index
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.titleindex import TitleIndex, index_path
+
+
+class TitleIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_extract(self):
+        '''the stanzas picked are those of parse(), in order'''
+        data = congressional_record_index(30000, 3)
+        parser = CongressionalRecordIndexInputParser(year=2014)
+        expected = [(title, out.read()) for title, out in parser.parse(data)]
+        index = parser.title_index(data)
+        self.assertEqual([(name, line) for name, line, _, _, _ in index],
+                         [title for title, _ in expected])
+        self.assertEqual([(title, out.read()) for title, out in
+                          parser.extract(io.BytesIO(data), index)], expected)
+        (name, line), html = expected[7]
+        self.assertEqual([(title, out.read()) for title, out in
+                          parser.extract(io.BytesIO(data), index, names={name.decode()})],
+                         [stanza for stanza in expected if stanza[0][0] == name])
+        self.assertEqual([title for title, out in
+                          parser.extract(data, index, names=[line], prefix=b'U.S.',
+                                         pattern=r'\(MAP')],
+                         [title for title, _ in expected if title[1] == line
+                          or title[1].startswith(b'U.S.') or b'(MAP' in title[1]])
+        self.assertEqual(list(parser.extract(data, index, names=['NOBODY'])), [])
+
+    def test_shifted_stanzas(self):
+        '''a section that is not one stanza is paired as make_stanzas()
+        pairs it'''
+        parser = CongressionalRecordIndexInputParser(year=2014)
+        data = b'\x07I01A TITLE\n\x07I03x\n\x07I01B TITLE\n\x07I05y\n\x07I01\n'
+        index = parser.title_index(data)
+        self.assertEqual([(title, out.read()) for title, out in parser.extract(data, index)],
+                         [(title, out.read()) for title, out in parser.parse(data)])
+        data = b'\x07I01A TITLE\n\x07I03x\n\x07I01\n\x07I01B TITLE\n\x07I05y\n\x07I01C\n'
+        index = parser.title_index(data)
+        self.assertEqual([(start, end, piece) for _, _, start, end, piece in index],
+                         [(0, 18, 0), (18, 41, 0), (23, 47, 1), (41, 47, 1)])
+        # the \x07I01\x07I01 stanza fails as it does in parse()
+        with self.assertRaises(IndexError):
+            list(parser.parse(data))
+        with self.assertRaises(IndexError):
+            list(parser.extract(data, index, pattern=b'^$'))
+        self.assertEqual(parser.extract(data, index, b'A TITLE').__next__()[1].read(),
+                         '<h2>x</h2>')
+
+    def test_file_index(self):
+        data = congressional_record_index(10000, 4)
+        filename = os.path.join(self.tmp, 'CRI-2014.rec')
+        with open(filename, 'wb') as f:
+            f.write(data)
+        parser = CongressionalRecordIndexInputParser(year=2014)
+        index = parser.title_index(data)
+        name = index.names()[2]
+        expected = [(title, out.read()) for title, out in parser.extract(data, index, name)]
+        self.assertEqual([(title, out.read()) for title, out in
+                          parser.extract_file(filename, name)], expected)
+        written = TitleIndex.read(index_path(filename))
+        self.assertEqual((written.stanzas, written.size, written.year),
+                         (index.stanzas, len(data), 2014))
+        # another year is indexed again
+        parser = CongressionalRecordIndexInputParser(year=2015)
+        names = [title[0] for title, _ in parser.extract_file(filename, prefix=b'')]
+        self.assertTrue(names and all(name.startswith(b'CRI-2015-') for name in names))
+        self.assertEqual(TitleIndex.read(index_path(filename)).year, 2015)
+
+
+if __name__ == '__main__':
+    unittest.main()
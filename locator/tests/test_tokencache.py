@@ -0,0 +1,109 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.parser import render_html
+from locator.rendercache import code_version
+from locator.tokencache import TokenCache
+
+
+# different html for one code, the same tokens
+RED_HEADINGS = dict(DailyDigestInputParser.LOCATOR_TABLE)
+RED_HEADINGS[b'I01'] = dict(RED_HEADINGS[b'I01'], start='<h2 class="red">')
+
+
+class TokenCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_daily_digest(self):
+        data = daily_digest(30000, 3)
+        cache = TokenCache(self.tmp)
+        parser = DailyDigestInputParser()
+        html = parser.parse_io(io.BytesIO(data)).getvalue()
+        for _ in range(2):
+            stream = parser.tokenize(io.BytesIO(data), cache=cache)
+            self.assertEqual(render_html(stream).getvalue(), html)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # new html for a code is rendered from the cached tokens
+        red_html = parser.parse_io(io.BytesIO(data), locator_table=RED_HEADINGS).getvalue()
+        self.assertNotEqual(red_html, html)
+        stream = parser.tokenize(io.BytesIO(data), locator_table=RED_HEADINGS, cache=cache)
+        self.assertEqual(render_html(stream).getvalue(), red_html)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        # other input, or a chunked read of the same input
+        parser.tokenize(io.BytesIO(data + b'\x07I01x'), cache=cache)
+        parser.tokenize(io.BytesIO(data), chunk_size=100, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (3, 2))
+
+    def test_damaged_entry(self):
+        data = daily_digest(5000, 1)
+        cache = TokenCache(self.tmp)
+        parser = DailyDigestInputParser()
+        html = render_html(parser.tokenize(io.BytesIO(data), cache=cache)).getvalue()
+        for path, size, _ in list(cache._entries()):
+            with open(path, 'r+b') as f:
+                f.truncate(size - 1)
+        stream = parser.tokenize(io.BytesIO(data), cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(render_html(stream).getvalue(), html)
+        self.assertEqual(render_html(parser.tokenize(io.BytesIO(data), cache=cache)).getvalue(),
+                         html)
+        self.assertEqual(cache.hits, 1)
+
+    def test_code_version(self):
+        '''new tokenizing code misses'''
+        data = daily_digest(5000, 1)
+        cache = TokenCache(self.tmp)
+        parser = DailyDigestInputParser()
+        for _ in range(2):
+            parser.tokenize(io.BytesIO(data), cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        with mock.patch('locator.tokencache.code_version', return_value='upgraded'):
+            parser.tokenize(io.BytesIO(data), cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        # the version is that of the module sources
+        sys.path.insert(0, self.tmp)
+        versions = []
+        try:
+            for source in ('X = 1\n', 'X = 2\n'):
+                with open(os.path.join(self.tmp, 'locator_upgraded.py'), 'w') as f:
+                    f.write(source)
+                sys.modules.pop('locator_upgraded', None)
+                code_version.cache_clear()
+                versions.append(code_version(('locator_upgraded',)))
+            self.assertNotEqual(versions[0], versions[1])
+        finally:
+            sys.path.remove(self.tmp)
+            sys.modules.pop('locator_upgraded', None)
+            code_version.cache_clear()
+
+    def test_cri_stanzas(self):
+        data = congressional_record_index(20000, 2)
+        expected = [(title, out.read())
+                    for title, out in CongressionalRecordIndexInputParser(year=2014).parse(data)]
+        parser = CongressionalRecordIndexInputParser(year=2014, token_cache=self.tmp)
+        for _ in range(2):
+            stream = parser.tokenize(io.BytesIO(data))
+            self.assertEqual([(title, render_html(stream.slice(start, stop)).getvalue())
+                              for title, start, stop in stream.documents()],
+                             expected)
+        self.assertEqual((parser.token_cache.hits, parser.token_cache.misses), (1, 1))
+        # another year is another tokenizer version
+        CongressionalRecordIndexInputParser(year=2015, token_cache=parser.token_cache).tokenize(
+            io.BytesIO(data))
+        self.assertEqual(parser.token_cache.misses, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import io
+import os
+import unittest
+from locator import process_lines, OutputSink
+from locator import tokens
+from locator.tokens import TokenStream, TokenRenderer
+from locator.generate import daily_digest, congressional_record_index
+from locator.dailydigest import DailyDigestInputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+from locator.parser import LocatorParser, HtmlOutputParser, render_html
+
+DATA_DIR = os.path.dirname(__file__)
+
+
+class TextRenderer(TokenRenderer):
+    '''Text and escapes, to check what the tokens hold.'''
+
+    def __init__(self):
+        self.parts = []
+
+    def text(self, data):
+        self.parts.append(bytes(data))
+
+    def escape(self, replace, esc, replacement):
+        self.parts.append(b'[' + replace + b'\xff' + esc + b']')
+
+    def stanza(self, title):
+        self.parts.append(b'|')
+
+
+class TokenStreamTest(unittest.TestCase):
+
+    def test_daily_digest(self):
+        '''render_html() of the tokens is the html parse_io() writes'''
+        parser = DailyDigestInputParser()
+        with open(os.path.join(DATA_DIR, 'tdailydigestchar27.rec'), 'rb') as f:
+            char27 = f.read()
+        for data in (daily_digest(50000, 2), char27):
+            html = parser.parse_io(io.BytesIO(data)).getvalue()
+            stream = parser.tokenize(io.BytesIO(data))
+            self.assertEqual(render_html(stream).getvalue(), html)
+            self.assertEqual(render_html(parser.tokenize(io.BytesIO(data), chunk_size=100)).getvalue(),
+                             html)
+            outputs = list(LocatorParser(inputdata=io.BytesIO(data), inputparser=parser,
+                                         outputparser=HtmlOutputParser()).parse(tokens=True))
+            self.assertEqual([out.getvalue() for out in outputs], [html])
+        kinds = set(stream.kinds)
+        for kind in (tokens.TEXT, tokens.MARKUP, tokens.START, tokens.END, tokens.PAGE,
+                     tokens.PAGES_END):
+            self.assertIn(kind, kinds)
+        # no object per token, runs of text are one token
+        self.assertEqual(len(stream.a), len(stream))
+        self.assertLess(len(stream.actions), 100)
+        for index in range(1, len(stream)):
+            self.assertFalse(stream.kinds[index] == stream.kinds[index - 1] == tokens.TEXT)
+
+    def test_escapes(self):
+        parser = DailyDigestInputParser()
+        stream = TokenStream()
+        state, output_line = process_lines(b'\x07I05Luja\xffAE1n x\xff09y', (None, b'G2'),
+                                           outputf=stream, dispatch=parser.dispatch_table())
+        self.assertEqual(output_line, b'Luj&#225;n x&#150;y')
+        renderer = TextRenderer()
+        stream.render(renderer)
+        self.assertEqual(b''.join(renderer.parts), b'Luj[a\xffAE1]n [x\xff09]y')
+        self.assertEqual(render_html(stream).getvalue(), '<center><h2>Luj&#225;n x&#150;y')
+
+    def test_escape_before_locator(self):
+        '''line_start comes from the line before its escapes were converted'''
+        dispatch = CongressionalRecordIndexInputParser.dispatch_table()
+        for line in (b'\x07I01\x07T1E\xffE1 a\xff1Ab\x07T1Re\xffAE1sume\xffAE1 ',
+                     b'\x07I01Re\xffAE1sume\xffAE1\x07T1x\xff09y',
+                     b'\x07G1\xffE\xffE1plainE\xffE1\xffAF1\xff'):
+            out = io.StringIO()
+            sink = OutputSink(out)
+            expected = process_lines(line, (None, b'G2'), outputf=sink, dispatch=dispatch)
+            sink.flush()
+            stream = TokenStream()
+            self.assertEqual(process_lines(line, (None, b'G2'), outputf=stream, dispatch=dispatch),
+                             expected)
+            self.assertEqual(render_html(stream).getvalue(), out.getvalue())
+
+    def test_cri_stanzas(self):
+        data = congressional_record_index(30000, 2)
+        expected = [(title, out.read())
+                    for title, out in CongressionalRecordIndexInputParser(year=2014).parse(data)]
+        parser = LocatorParser(inputdata=data,
+                               inputparser=CongressionalRecordIndexInputParser(year=2014),
+                               outputparser=HtmlOutputParser())
+        self.assertEqual([(title, out.read()) for title, out in parser.parse(tokens=True)],
+                         expected)
+        stream = CongressionalRecordIndexInputParser(year=2014).tokenize(io.BytesIO(data))
+        documents = list(stream.documents())
+        self.assertEqual(len(documents), len(expected))
+        self.assertEqual([title for title, start, stop in documents],
+                         [title for title, html in expected])
+        renderer = TextRenderer()
+        stream.render(renderer)
+        self.assertEqual(b''.join(renderer.parts).count(b'|'), len(expected))
+
+    def test_cri_empty(self):
+        '''an empty CRI file has no stanzas, with tokens as without'''
+        from locator.renderers import fan_out, FORMATS
+        inputparser = CongressionalRecordIndexInputParser(year=2014)
+        for data in (b'', b'  \n'):
+            self.assertEqual(list(inputparser.parse(data)), [])
+            self.assertEqual(list(inputparser.parse(data, tokens=True)), [])
+            self.assertEqual(list(inputparser.tokenize(io.BytesIO(data)).documents()), [])
+            parser = LocatorParser(inputdata=data, inputparser=inputparser,
+                                   outputparser=fan_out(FORMATS, inputparser.dispatch_table()))
+            self.assertEqual(list(parser.parse(tokens=True)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from locator.writer import FileWriter
+from locator.parser import LocatorParser, MultipleOutputFilesOutputParser
+from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+
+
+class FileWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def read(self, *path):
+        with open(os.path.join(self.tmp, *path), 'rb') as f:
+            return f.read()
+
+    def test_write(self):
+        for kwargs in ({}, {'threaded': False}, {'durable': True, 'fsync_batch': 2}):
+            with FileWriter(**kwargs) as writer:
+                writer.write(os.path.join(self.tmp, 'a', 'b', 'one.htm'), b'one')
+                writer.write(os.path.join(self.tmp, 'a', 'two.htm'), b'two')
+                writer.write(os.path.join(self.tmp, 'a', 'two.htm'), b'2\xc3\xa9')
+            self.assertEqual(self.read('a', 'b', 'one.htm'), b'one')
+            self.assertEqual(self.read('a', 'two.htm'), b'2\xc3\xa9')
+            self.assertEqual(sorted(os.listdir(os.path.join(self.tmp, 'a'))), ['b', 'two.htm'])
+            self.assertEqual((writer.files, writer.bytes), (3, 9))
+
+    def test_error(self):
+        '''An error on the writer thread is raised by close()'''
+        with open(os.path.join(self.tmp, 'file'), 'wb'):
+            pass
+        writer = FileWriter()
+        writer.write(os.path.join(self.tmp, 'file', 'under a file.htm'), b'')
+        self.assertRaises(OSError, writer.close)
+        writer.close()
+        self.assertRaises(OSError, writer.write, os.path.join(self.tmp, 'x'), b'')
+
+    def test_output_parser(self):
+        data = b'''\x07F8383
+\x07I01RYAN PURCELL FOUNDATION
+\x07I03Remarks in House
+\x07I01SECOND STANZA
+\x07I02Senate\x07T1Luja\xffAE1n
+'''
+        # each file is there once parse() has given its stanza
+        outputparser = MultipleOutputFilesOutputParser(basedir=os.path.join(self.tmp, 'sync'))
+        parser = LocatorParser(inputdata=data,
+                               inputparser=CongressionalRecordIndexInputParser(year=2014),
+                               outputparser=outputparser)
+        for (name, line), stream in parser.parse():
+            self.assertTrue(os.path.exists(os.path.join(self.tmp, 'sync', name.decode())))
+        outputparser = MultipleOutputFilesOutputParser(basedir=os.path.join(self.tmp, 'cri'),
+                                                       threaded=True)
+        parser = LocatorParser(inputdata=data,
+                               inputparser=CongressionalRecordIndexInputParser(year=2014),
+                               outputparser=outputparser)
+        self.assertEqual(len(list(parser.parse())), 2)
+        self.assertIsNone(outputparser.writer)
+        self.assertEqual(self.read('cri', 'CRI-2014-SECOND-STANZA.htm').decode('utf-8'),
+                         '<h2>Senate</h2><strong>Luj&#225;n</strong>')
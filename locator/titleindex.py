@@ -0,0 +1,177 @@
+'''Title index of a Congressional Record Index, to render a few entries
+without the whole year.
+
+parse() only learns the name of a stanza by rendering it.  A TitleIndex
+lists the accessId name and title line of each stanza and where in the file
+it is, so CongressionalRecordIndexInputParser.extract() can read and render
+just the stanzas it is asked for:
+
+    parser = CongressionalRecordIndexInputParser(year=2014)
+    for (name, title), output in parser.extract_file('CRI-2014.rec',
+                                                     prefix=b'AAGENES'):
+        ...
+
+extract_file() keeps the index next to the file (the file name +
+TITLE_INDEX_SUFFIX) and makes it the first time, or again when the file is
+newer or the year has changed.  The stanzas come in the order parse() gives
+them, with the same ((name, title line), output), so correcting a handful
+of entries writes the same files converting the whole year would.
+
+A stanza is two pieces make_stanzas() pairs up.  They are nearly always
+the two halves of one \x07I01 section, but text before the first \x07I01
+shifts the pairing, so a stanza is kept as the sections it comes from
+(start and end in the file) and the number of its first piece among their
+section_pieces().
+
+The index file is a header line and a tab separated line per stanza:
+
+    locator-title-index<TAB>1<TAB>size of the file<TAB>year
+    name<TAB>title line<TAB>start<TAB>end<TAB>piece
+
+with \\, tabs and newlines in the title line escaped as \\\\, \\t, \\n, \\r.
+'''
+import os
+import re
+
+TITLE_INDEX_SUFFIX = '.titles'
+_MAGIC = 'locator-title-index'
+TITLE_INDEX_VERSION = 1
+
+_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_UNESCAPES = dict((v[1], k) for k, v in _ESCAPES.items())
+_ESCAPE_RE = re.compile(r'[\\\t\n\r]')
+_UNESCAPE_RE = re.compile(r'\\(.)')
+
+
+def _field(value):
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], value.decode('latin1'))
+
+
+def _value(field):
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES[m.group(1)], field).encode('latin1')
+
+
+def _bytes(value):
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+
+class TitleIndex(object):
+    '''The stanzas of one input: (name, title line, start, end, piece) of
+    each, in the order they come.  A stanza with no title of its own has
+    the name of the one before it, as in parse().  size is the size of the
+    input and year the year the names were made for.'''
+
+    def __init__(self, stanzas=None, size=None, year=None):
+        self.stanzas = stanzas or []
+        self.size = size
+        self.year = year
+
+    def __len__(self):
+        return len(self.stanzas)
+
+    def __iter__(self):
+        return iter(self.stanzas)
+
+    def names(self):
+        return [name for name, _, _, _, _ in self.stanzas]
+
+    def select(self, names=None, prefix=None, pattern=None):
+        '''The stanzas named (accessId or title line) in names, whose title
+        line starts with prefix or has a match of pattern (a regular
+        expression, compiled or not) in it, every stanza if none of them is
+        given.  Names, prefix and pattern are bytes or str.'''
+        if names is None and prefix is None and pattern is None:
+            return list(self.stanzas)
+        if isinstance(names, (bytes, str)):
+            names = [names]
+        names = set(_bytes(name) for name in names or ())
+        prefix = _bytes(prefix)
+        if pattern is not None and not hasattr(pattern, 'search'):
+            pattern = re.compile(_bytes(pattern))
+        return [stanza for stanza in self.stanzas
+                if stanza[0] in names or stanza[1] in names
+                or (prefix is not None and stanza[1].startswith(prefix))
+                or (pattern is not None and pattern.search(stanza[1]))]
+
+    def write(self, filename):
+        with open(filename, 'w', encoding='utf-8', newline='\n') as index:
+            index.write('%s\t%d\t%d\t%s\n' % (_MAGIC, TITLE_INDEX_VERSION, self.size,
+                                              self.year or ''))
+            for name, line, start, end, piece in self.stanzas:
+                index.write('%s\t%s\t%d\t%d\t%d\n' % (_field(name), _field(line),
+                                                      start, end, piece))
+
+    @classmethod
+    def read(cls, filename):
+        '''The TitleIndex write() wrote, ValueError if filename is not one.'''
+        with open(filename, encoding='utf-8', newline='\n') as index:
+            header = index.readline().rstrip('\n').split('\t')
+            if len(header) != 4 or header[0] != _MAGIC or header[1] != str(TITLE_INDEX_VERSION):
+                raise ValueError("not a title index: %s" % filename)
+            stanzas = []
+            for line in index:
+                name, title, start, end, piece = line.rstrip('\n').split('\t')
+                stanzas.append((_value(name), _value(title), int(start), int(end), int(piece)))
+        return cls(stanzas, int(header[2]), int(header[3]) if header[3] else None)
+
+
+def index_path(filename):
+    '''Where extract_file() keeps the index of filename.'''
+    return filename + TITLE_INDEX_SUFFIX
+
+
+def file_title_index(inputparser, filename):
+    '''The TitleIndex of filename for inputparser's year, read from next to
+    it if it is there and up to date, made and written there if not.'''
+    path = index_path(filename)
+    stat = os.stat(filename)
+    try:
+        if os.path.getmtime(path) >= stat.st_mtime:
+            index = TitleIndex.read(path)
+            if index.size == stat.st_size and index.year == inputparser.year:
+                return index
+    except (OSError, ValueError):
+        pass
+    with open(filename, 'rb') as inputfile:
+        index = inputparser.title_index(inputfile)
+    index.write(path)
+    return index
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(
+        description='Index the stanzas of a Congressional Record Index, or '
+                    'convert some of them.')
+    parser.add_argument('input')
+    parser.add_argument('year', type=int)
+    parser.add_argument('--name', action='append',
+                        help='accessId or title of a stanza to convert, can be repeated')
+    parser.add_argument('--prefix', help='convert the stanzas whose title starts with this')
+    parser.add_argument('--match', help='convert the stanzas whose title matches this regex')
+    parser.add_argument('-o', '--output', default='.', help='directory to write them to')
+    args = parser.parse_args(argv)
+    from locator.congressionalrecordindex import CongressionalRecordIndexInputParser
+    from locator.parser import MultipleOutputFilesOutputParser
+    inputparser = CongressionalRecordIndexInputParser(year=args.year)
+    if args.name is None and args.prefix is None and args.match is None:
+        for name, line, start, end, _ in file_title_index(inputparser, args.input):
+            sys.stdout.write('%s\t%d\t%d\t%s\n' % (name.decode('utf-8', 'replace'), start,
+                                                   end, line.decode('utf-8', 'replace')))
+        return 0
+    outputparser = MultipleOutputFilesOutputParser(basedir=args.output, threaded=True)
+    try:
+        for parsed in inputparser.extract_file(args.input, args.name, args.prefix,
+                                               args.match):
+            outputparser.parse(parsed)
+            sys.stdout.write('%s\n' % parsed[0][0].decode('utf-8', 'replace'))
+    finally:
+        outputparser.close()
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+'''On-disk cache of token streams, to render again without tokenizing.
+
+A change to the html of a LOCATOR_TABLE or FONT_TABLE entry used to mean
+running makelines(), clean_line() and process_lines() over every file
+again.  A TokenCache keeps the TokenStream of each input (see
+locator.tokens) under a hash of the input bytes and the tokenizer version,
+so the next run only renders:
+
+    cache = TokenCache('/var/cache/locator/tokens')
+    stream = DailyDigestInputParser().tokenize(inputfile, cache=cache)
+    render_html(stream, outputfile)
+
+The tokenizer version (see tokenizer_version()) covers the tables with
+their 'start' and 'end' html left out, the normalizer, the escape table,
+the postfix, the starting state, for the CRI the year, and the source of
+the TOKEN_MODULES, so a locator upgrade misses rather than returning stale
+tokens.  START and END tokens are saved as the (grid, code) that found
+their action, and looked up in the parser's current tables when the entry
+is read, so new html takes effect without a miss.  Bump
+TOKEN_CACHE_VERSION when the entry format changes.
+
+An entry is one file, read with mmap:
+
+    header      _HEADER, the token count and the data and meta lengths
+    kinds       a byte a token, padded to 4 bytes
+    a, b        4 byte unsigned ints a token each, native byte order
+    data        the span bytes
+    meta        JSON: the actions and escapes the tokens index
+
+so a stream read from the cache costs a page fault for the parts a
+renderer touches.  Entries are stored, touched and evicted as RenderCache
+entries are.
+'''
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from locator import fragment_bytes, CompiledAction
+from locator.rendercache import RenderCache, _fingerprint, code_version
+from locator.tokens import TokenStream
+
+# bump to drop every cached entry after a change to the entry format
+TOKEN_CACHE_VERSION = 1
+# the modules whose code the tokens come from
+TOKEN_MODULES = ('locator', 'locator.parser', 'locator.dailydigest',
+                 'locator.congressionalrecordindex', 'locator.tokens', 'locator.tokencache')
+_MAGIC = b'LOCTOKS1'
+# magic, little endian, int size, token count, data length, meta length
+_HEADER = struct.Struct('<8sBB2xQQQ')
+_SUFFIX = '.tokens'
+_LITTLE = sys.byteorder == 'little'
+# the itemsize of the a and b arrays, 4 on the usual platforms
+_INT_SIZE = array('I').itemsize
+
+
+def without_html(table):
+    '''A LOCATOR_TABLE or FONT_TABLE without the 'start' and 'end' html,
+    what the tokens depend on.'''
+    stripped = {}
+    for code, value in table.items():
+        if isinstance(value, dict) and ('start' in value or 'end' in value):
+            value = dict((key, item) for key, item in value.items()
+                         if key not in ('start', 'end'))
+        elif isinstance(value, dict):
+            value = without_html(value)
+        stripped[code] = value
+    return stripped
+
+
+def tokenizer_version(*parts):
+    '''Hex digest of everything besides the input that the tokens depend
+    on.'''
+    md5 = hashlib.md5()
+    _fingerprint((TOKEN_CACHE_VERSION, code_version(TOKEN_MODULES)) + parts, md5)
+    return md5.hexdigest()
+
+
+def _text(value):
+    return None if value is None else value.decode('latin1')
+
+
+def _bytes(value):
+    return None if value is None else value.encode('latin1')
+
+
+class TokenCache(RenderCache):
+    '''A directory of token streams, at most about max_bytes big.
+
+    get(key, dispatch) returns a TokenStream or None, put(key, stream,
+    dispatch) stores one, key(version, data) makes the key of an input.
+    dispatch is the DispatchTable the tokens' actions come from.
+    '''
+    suffix = _SUFFIX
+
+    def get(self, key, dispatch):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # ValueError: an empty file can't be mapped
+            self.misses += 1
+            return None
+        try:
+            stream = self._read(mapped, dispatch)
+        except (struct.error, ValueError, KeyError, TypeError):
+            # a damaged entry is a miss, the put() that follows replaces it
+            stream = None
+        if stream is None:
+            mapped.close()
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return stream
+
+    def _read(self, mapped, dispatch):
+        magic, little, size, count, data_length, meta_length = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC or bool(little) != _LITTLE or size != _INT_SIZE:
+            return None
+        kinds_start = _HEADER.size
+        a_start = kinds_start + count + -count % 4
+        b_start = a_start + size * count
+        data_start = b_start + size * count
+        meta_start = data_start + data_length
+        if meta_start + meta_length != len(mapped):
+            return None
+        meta = json.loads(mapped[meta_start:meta_start + meta_length].decode('utf-8'))
+        actions = []
+        for record in meta['actions']:
+            if record[0] == 'key':
+                actions.append(dispatch[_bytes(record[1]), _bytes(record[2])])
+            else:
+                actions.append(CompiledAction({'start': record[1], 'end': record[2],
+                                               'grid': _bytes(record[3])}))
+        escapes = [tuple(_bytes(item) for item in escape) for escape in meta['escapes']]
+        # nothing can fail from here on, the views keep mapped open
+        view = memoryview(mapped)
+        return TokenStream.from_buffers(
+            view[kinds_start:kinds_start + count],
+            view[a_start:b_start].cast('I'),
+            view[b_start:data_start].cast('I'),
+            _Data(mapped, data_start, data_length), actions, escapes)
+
+    def put(self, key, stream, dispatch):
+        keys = dict((id(action), code) for code, action in dispatch.items())
+        actions = []
+        for action in stream.actions:
+            code = keys.get(id(action))
+            if code is not None:
+                actions.append(['key', _text(code[0]), _text(code[1])])
+            else:
+                # not from the tables, keep its html
+                actions.append(['html', fragment_bytes(action, 'start').decode('utf-8'),
+                                fragment_bytes(action, 'end').decode('utf-8'),
+                                _text(action.get('grid'))])
+        meta = json.dumps({
+            'actions': actions,
+            'escapes': [[_text(item) for item in escape] for escape in stream.escapes],
+        }).encode('utf-8')
+        count = len(stream)
+        header = _HEADER.pack(_MAGIC, _LITTLE, _INT_SIZE, count, len(stream.data), len(meta))
+        self._store(key, (header, stream.kinds, b'\0' * (-count % 4),
+                          stream.a, stream.b, stream.data, meta))
+
+
+class _Data(object):
+    '''The data section of an entry, sliced like the bytearray of a
+    stream being built.'''
+
+    def __init__(self, mapped, start, length):
+        self.mapped = mapped
+        self.start = start
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        start = self.start
+        return self.mapped[start + index.start:start + index.stop]
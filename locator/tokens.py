@@ -0,0 +1,335 @@
+'''Compact token stream between the input parsers and the renderers.
+
+InputParser.tokenize() runs the usual makelines() -> process_lines()
+pipeline with a TokenStream in place of the OutputSink, so instead of html
+it records what process_lines() found:
+
+    TEXT        a span of input text (latin1 bytes, escapes not included)
+    MARKUP      utf-8 bytes the parser adds itself, <html>, a postfix
+    START, END  a LOCATOR_TABLE or FONT_TABLE action opened or closed
+    ESCAPE      an escape sequence and its replacement
+    PAGE        a page found by find_page(), PAGES_END after the last line
+    STANZA      the end of a CRI stanza, followed by TITLE if it had one
+
+A token is a kind byte and two unsigned ints in three arrays, text, markup,
+page and title bytes are appended to one bytearray and the spans point
+into it, and runs of TEXT (or MARKUP) are merged into one token.  Actions
+and escapes are kept once each in a table the tokens index.  So building a
+stream allocates no object per token, and a stream takes about the size of
+its text plus nine bytes a token.
+
+A renderer walks the tokens, TokenRenderer calls a method per token:
+
+    stream = DailyDigestInputParser().tokenize(inputfile)
+    render_html(stream, outputfile)     # the html parse_io() writes
+
+parse(inputdata, tokens=True) yields the streams instead of html, see
+locator.parser.HtmlOutputParser.
+'''
+from array import array
+
+from locator import ESCAPE_PATTERN, ESCAPE_TABLE, OutputSink
+
+TEXT = 0
+MARKUP = 1
+START = 2
+END = 3
+ESCAPE = 4
+PAGE = 5
+PAGES_END = 6
+STANZA = 7
+TITLE = 8
+KIND_NAMES = ['TEXT', 'MARKUP', 'START', 'END', 'ESCAPE', 'PAGE', 'PAGES_END',
+              'STANZA', 'TITLE']
+
+
+class TokenStream(OutputSink):
+    '''An array backed stream of tokens, see the module docstring.
+
+    It is the OutputSink process_lines() writes to (text(), markup(),
+    start(), end(), escaped(), ...), and takes page(), pages_end() and
+    stanza() from the parsers.
+    '''
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.a = array('I')
+        self.b = array('I')
+        # text, markup, page and title bytes the spans point into
+        self.data = bytearray()
+        # the actions START/END tokens index, and (replace, esc,
+        # replacement) for ESCAPE tokens
+        self.actions = []
+        self.escapes = []
+        self._action_index = {}
+        self._escape_index = {}
+        # every token is appended here, these are hot
+        self._last = None
+        self._kind = self.kinds.append
+        self._a = self.a.append
+        self._b = self.b.append
+
+    @classmethod
+    def from_buffers(cls, kinds, a, b, data, actions, escapes):
+        '''A read only stream over saved tokens, kinds, a and b can be
+        memoryviews and data an mmap, see locator.tokencache.'''
+        stream = cls.__new__(cls)
+        stream.kinds = kinds
+        stream.a = a
+        stream.b = b
+        stream.data = data
+        stream.actions = actions
+        stream.escapes = escapes
+        return stream
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def _token(self, kind, a=0, b=0):
+        self._last = kind
+        self._kind(kind)
+        self._a(a)
+        self._b(b)
+
+    def text(self, data):
+        '''latin1 bytes from the input.'''
+        if data:
+            if self._last == TEXT:
+                # data follows the last span
+                self.b[-1] += len(data)
+            else:
+                self._last = TEXT
+                self._kind(TEXT)
+                self._a(len(self.data))
+                self._b(len(data))
+            self.data += data
+
+    def markup(self, data):
+        '''utf-8 bytes.'''
+        if data:
+            if self._last == MARKUP:
+                self.b[-1] += len(data)
+            else:
+                self._last = MARKUP
+                self._kind(MARKUP)
+                self._a(len(self.data))
+                self._b(len(data))
+            self.data += data
+
+    def write(self, data):
+        '''str, or utf-8 bytes.'''
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.markup(data)
+
+    def flush(self):
+        pass
+
+    def _add_action(self, action):
+        index = self._action_index[id(action)] = len(self.actions)
+        self.actions.append(action)
+        return index
+
+    def start(self, action):
+        index = self._action_index.get(id(action))
+        if index is None:
+            index = self._add_action(action)
+        self._last = START
+        self._kind(START)
+        self._a(index)
+        self._b(0)
+
+    def end(self, action):
+        index = self._action_index.get(id(action))
+        if index is None:
+            index = self._add_action(action)
+        self._last = END
+        self._kind(END)
+        self._a(index)
+        self._b(0)
+
+    def escaped(self, line, line_start, current_grid):
+        '''OutputSink.escaped() as tokens: the text between the escapes and
+        an ESCAPE token for each escape.  An escape cut by line_start is
+        kept as the TEXT left of it.'''
+        table = ESCAPE_TABLE
+        if not table.converts(line, current_grid):
+            output_line = line[line_start:]
+            self.text(output_line)
+            return output_line
+        lookup = table.lookup
+        pieces = []
+        pos = out = 0
+        for found in ESCAPE_PATTERN.finditer(line):
+            out = self._literal(line, pos, found.start(), out, line_start, pieces)
+            key = found.group(1, 2)
+            replacement = lookup[key]
+            if out >= line_start:
+                self._escape(key, replacement)
+                pieces.append(replacement)
+            elif out + len(replacement) > line_start:
+                piece = replacement[line_start - out:]
+                self.text(piece)
+                pieces.append(piece)
+            out += len(replacement)
+            pos = found.end()
+        self._literal(line, pos, len(line), out, line_start, pieces)
+        return b''.join(pieces)
+
+    def _literal(self, line, start, end, out, line_start, pieces):
+        '''line[start:end], which starts at out in the converted line.'''
+        stop = out + end - start
+        if stop > line_start:
+            if out < line_start:
+                start += line_start - out
+            piece = line[start:end]
+            self.text(piece)
+            pieces.append(piece)
+        return stop
+
+    def _escape(self, key, replacement):
+        index = self._escape_index.get(key)
+        if index is None:
+            index = self._escape_index[key] = len(self.escapes)
+            self.escapes.append(key + (replacement,))
+        self._token(ESCAPE, index)
+
+    def page(self, page):
+        self._token(PAGE, len(self.data), len(page))
+        self.data += page
+
+    def pages_end(self):
+        self._token(PAGES_END)
+
+    def stanza(self, title):
+        '''End a CRI stanza, title is (name, title line) or None.'''
+        if title is None:
+            self._token(STANZA)
+            return
+        name, line = title
+        self._token(STANZA, len(self.data), len(name))
+        self.data += name
+        self._token(TITLE, len(self.data), len(line))
+        self.data += line
+
+    def span(self, index):
+        '''The bytes of a TEXT, MARKUP, PAGE, STANZA or TITLE token.'''
+        start = self.a[index]
+        return bytes(self.data[start:start + self.b[index]])
+
+    def documents(self):
+        '''(title, start, stop) of each CRI stanza, title as for
+        stanza(), stop the index of its STANZA token.  A stream without
+        stanzas, that of an empty CRI file, has none.'''
+        kinds = self.kinds.tobytes()
+        marker = bytes([STANZA])
+        start = 0
+        stop = kinds.find(marker)
+        while stop >= 0:
+            title = None
+            after = stop + 1
+            if after < len(kinds) and kinds[after] == TITLE:
+                title = (self.span(stop), self.span(after))
+                after += 1
+            yield title, start, stop
+            start = after
+            stop = kinds.find(marker, start)
+
+    def slice(self, start=0, stop=None):
+        return TokenSlice(self, start, len(self) if stop is None else stop)
+
+    def render(self, renderer):
+        return renderer.render(self)
+
+
+class TokenSlice(object):
+    '''The tokens start to stop of a stream, one CRI stanza.'''
+
+    def __init__(self, stream, start, stop):
+        self.stream = stream
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def render(self, renderer):
+        return renderer.render(self.stream, self.start, self.stop)
+
+
+class PageTokens(object):
+    '''PageMarkers for a TokenStream, a PAGE token for every page found,
+    the renderer places the markers.'''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.current_page = None
+
+    def __call__(self, page):
+        # kept as PageMarkers keeps it, for the tracer
+        if not self.current_page or page != self.current_page:
+            self.current_page = page
+        self.stream.page(page)
+
+    def close(self):
+        self.stream.pages_end()
+
+
+class TokenRenderer(object):
+    '''Base renderer, render() calls a method per token, override the ones
+    of interest.  Every method does nothing.'''
+
+    def text(self, data):
+        '''A TEXT span, latin1 bytes.'''
+
+    def markup(self, data):
+        '''A MARKUP span, utf-8 bytes.'''
+
+    def start(self, action):
+        pass
+
+    def end(self, action):
+        pass
+
+    def escape(self, replace, esc, replacement):
+        '''The char and escape code of an escape sequence, and what
+        process_escapes_in_line() replaces them with.'''
+
+    def page(self, page):
+        pass
+
+    def pages_end(self):
+        pass
+
+    def stanza(self, title):
+        '''The end of a CRI stanza, title is (name, title line) or None.'''
+
+    def render(self, stream, start=0, stop=None):
+        if stop is None:
+            stop = len(stream)
+        kinds, a, b, data = stream.kinds, stream.a, stream.b, stream.data
+        actions, escapes = stream.actions, stream.escapes
+        index = start
+        while index < stop:
+            kind = kinds[index]
+            if kind == TEXT:
+                self.text(data[a[index]:a[index] + b[index]])
+            elif kind == START:
+                self.start(actions[a[index]])
+            elif kind == END:
+                self.end(actions[a[index]])
+            elif kind == ESCAPE:
+                self.escape(*escapes[a[index]])
+            elif kind == MARKUP:
+                self.markup(data[a[index]:a[index] + b[index]])
+            elif kind == PAGE:
+                self.page(bytes(data[a[index]:a[index] + b[index]]))
+            elif kind == PAGES_END:
+                self.pages_end()
+            elif kind == STANZA:
+                title = None
+                if index + 1 < len(kinds) and kinds[index + 1] == TITLE:
+                    title = (stream.span(index), stream.span(index + 1))
+                    index += 1
+                self.stanza(title)
+            index += 1
@@ -0,0 +1,142 @@
+'''Tracing hooks for the parse engine.
+
+makelines(), process_lines(), process_actions(), remove_chars() and the
+parse_io()s report each line, locator and state change to the installed
+tracer.  With no tracer installed (the default) all they pay is a check for
+None, so nothing is formatted or logged in production.
+
+To get the old DEBUG diagnostics for a bad file:
+
+    import logging
+    from locator import tracing
+    logging.basicConfig(level=logging.DEBUG)
+    with tracing.use_tracer(tracing.LoggingTracer()):
+        ... parse the file ...
+
+or subclass Tracer to count or record just the events you want, every
+method of Tracer does nothing.
+
+The tracer is kept in a context variable, so one installed in a thread (a
+ConversionServer request, say) is not seen by the others.
+'''
+import contextvars
+import logging
+from contextlib import contextmanager
+
+# The installed tracer, None when tracing is off.  Hot loops get() this once
+# per call and skip the hooks entirely when it is None.
+_tracer = contextvars.ContextVar('locator_tracer', default=None)
+
+
+class Tracer(object):
+    '''Base tracer, override the events of interest.'''
+
+    def input(self, data):
+        '''makelines() was given data.'''
+
+    def line(self, page, match, line):
+        '''makelines() made a cleaned line, page is from find_page().'''
+
+    def page(self, page):
+        '''find_page() looked for a page marker, page is None if none.'''
+
+    def replace(self, pattern, replacement):
+        '''remove_chars() replaced pattern in a line.'''
+
+    def locator(self, locator, action):
+        '''process_lines() found a locator code and its action.'''
+
+    def action(self, locator, end, start):
+        '''process_actions() closed the previous action with end and opened
+        locator's with start.'''
+
+    def state(self, current_state, page, current_page):
+        '''InputParser.parse_io() finished a line.'''
+
+    def stanza(self, stanza):
+        '''CongressionalRecordIndexInputParser.parse_io() started a stanza.'''
+
+    def stanza_line(self, count, line, states):
+        '''A stanza line was processed, states is the process_lines() state
+        stack, previous state first.'''
+
+    def stanza_end(self, end):
+        '''A stanza was closed with the end of its last action.'''
+
+
+class LoggingTracer(Tracer):
+    '''Logs every event, these are the DEBUG messages the parser used to log
+    unconditionally.'''
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('locator')
+        self.level = level
+
+    def log(self, msg, *args):
+        # stacklevel 3: report the parser line that raised the event
+        self.logger.log(self.level, msg, *args, stacklevel=3)
+
+    def input(self, data):
+        self.log("makelines input:%s", data)
+
+    def line(self, page, match, line):
+        self.log("\tyield:%s %s %s", page, match, line)
+
+    def page(self, page):
+        self.log("find_page->(%s)", page)
+
+    def replace(self, pattern, replacement):
+        self.log("Replaced [%s] with [%s] in input", pattern, replacement)
+
+    def locator(self, locator, action):
+        self.log("Found locator:%s", locator)
+        self.log("Found Action:%s", action)
+
+    def action(self, locator, end, start):
+        if end:
+            self.log("\tcurrent_state.end:%s", end)
+        self.log("\tlocator:%s action start:%s", locator, start)
+
+    def state(self, current_state, page, current_page):
+        self.log("Current_state:%s", current_state)
+        self.log("Page:%s Current_page:%s", page, current_page)
+
+    def stanza(self, stanza):
+        self.log("CRI stanza:%s", stanza)
+
+    def stanza_line(self, count, line, states):
+        self.log("Current state:%s", states[-1])
+        self.log("Previous state :%s", states[0])
+        self.log("[%d] line:[%s] states[%s]", count, line, states)
+
+    def stanza_end(self, end):
+        self.log("\tcurrent_state.end:%s", end)
+
+
+def set_tracer(new_tracer):
+    '''Install new_tracer (None turns tracing off), returns the previous
+    tracer.'''
+    previous = _tracer.get()
+    _tracer.set(new_tracer)
+    return previous
+
+
+get_tracer = _tracer.get
+
+
+@contextmanager
+def use_tracer(new_tracer):
+    '''Install new_tracer for the duration of a with block.'''
+    token = _tracer.set(new_tracer)
+    try:
+        yield new_tracer
+    finally:
+        _tracer.reset(token)
+
+
+def debug_logging():
+    '''The logging setup the package used to force on import, plus a
+    LoggingTracer, for the command line --debug options.'''
+    logging.basicConfig(format='%(levelname)s %(pathname)s %(lineno)s:%(message)s',
+                        level=logging.DEBUG)
+    set_tracer(LoggingTracer())
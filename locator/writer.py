@@ -0,0 +1,173 @@
+'''Background writer for the many small files of a CRI run.
+
+MultipleOutputFilesOutputParser used to makedirs(), open and write every
+stanza on the parsing thread.  A FileWriter takes (path, bytes) pairs on a
+bounded queue and writes them on its own thread, so parsing and disk waits
+overlap, with the queue keeping at most queue_size files in memory:
+
+    with FileWriter() as writer:
+        writer.write('out/CRI-2014-FOO.htm', html_bytes)
+
+Each file is written to a temporary name and renamed into place, so a
+reader never sees half a file, and directories are only created the first
+time they are seen.  With durable=True the files are fsynced FSYNC_BATCH at
+a time, renamed, and then their directories fsynced once per batch, rather
+than paying an fsync per file.
+
+An error on the writer thread stops the writer, the next write() or close()
+raises it.
+'''
+import atexit
+import os
+import queue
+import threading
+
+QUEUE_SIZE = 64
+# files fsynced together with durable=True
+FSYNC_BATCH = 64
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+
+class FileWriter(object):
+    '''Write files on a background thread, or on the calling thread with
+    threaded=False.'''
+
+    def __init__(self, queue_size=QUEUE_SIZE, durable=False,
+                 fsync_batch=FSYNC_BATCH, threaded=True):
+        self.durable = durable
+        self.fsync_batch = fsync_batch
+        self.files = 0
+        self.bytes = 0
+        self._dirs = set()
+        # (fd, temporary path, path) written but not yet fsynced and renamed
+        self._pending = []
+        self._error = None
+        self._reported = False
+        self._closed = False
+        self._queue = None
+        self._thread = None
+        if threaded:
+            self._queue = queue.Queue(queue_size)
+            self._thread = threading.Thread(target=self._run, name='locator-writer',
+                                            daemon=True)
+            self._thread.start()
+            # a writer nobody closed still finishes its files at exit
+            atexit.register(self.close)
+
+    def write(self, path, data):
+        '''Write bytes data to path, replacing any file that is there.'''
+        if self._error is not None:
+            self._reported = True
+            raise self._error
+        if self._closed:
+            raise ValueError("write to a closed FileWriter")
+        if self._queue is None:
+            try:
+                self._write(path, data)
+            except BaseException as e:
+                self._error = e
+                self._reported = True
+                raise
+        else:
+            self._queue.put((path, data))
+
+    def close(self):
+        '''Finish every write and stop the thread.  Raises the writer's
+        error if write() hasn't already.'''
+        if not self._closed:
+            self._closed = True
+            if self._thread is not None:
+                atexit.unregister(self.close)
+                self._queue.put(None)
+                self._thread.join()
+            else:
+                self._run_finish()
+        if self._error is not None and not self._reported:
+            self._reported = True
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # drain the queue so write() never blocks
+                continue
+            try:
+                self._write(*item)
+            except BaseException as e:
+                self._error = e
+        self._run_finish()
+
+    def _run_finish(self):
+        if self._error is None:
+            try:
+                self._flush()
+            except BaseException as e:
+                self._error = e
+        else:
+            self._discard()
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        if directory not in self._dirs:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+        # unique to the write, a path can be pending twice with durable=True
+        temp = '%s.%d.%x.%d.tmp' % (path, os.getpid(), id(self), self.files)
+        fd = os.open(temp, _OPEN_FLAGS, 0o666)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        except BaseException:
+            os.close(fd)
+            os.unlink(temp)
+            raise
+        self.files += 1
+        self.bytes += len(data)
+        if not self.durable:
+            os.close(fd)
+            os.replace(temp, path)
+            return
+        self._pending.append((fd, temp, path))
+        if len(self._pending) >= self.fsync_batch:
+            self._flush()
+
+    def _flush(self):
+        '''fsync, close and rename the pending files, then fsync their
+        directories.'''
+        pending, self._pending = self._pending, []
+        try:
+            for fd, temp, path in pending:
+                os.fsync(fd)
+        finally:
+            for fd, temp, path in pending:
+                os.close(fd)
+        for fd, temp, path in pending:
+            os.replace(temp, path)
+        for directory in set(os.path.dirname(path) for _, _, path in pending):
+            fd = os.open(directory or '.', os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _discard(self):
+        '''Drop the pending files after an error.'''
+        pending, self._pending = self._pending, []
+        for fd, temp, path in pending:
+            os.close(fd)
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
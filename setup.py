@@ -25,6 +25,13 @@ setup(name = "locator",
     package_data = {'package' : files },
     #'runner' is in the root.
     #scripts = ["runner"],
+    entry_points = {
+        'console_scripts': [
+            'locator = locator.parser:main',
+            'locator-batch = locator.batch:main',
+            'locator-server = locator.server:main',
+        ],
+    },
     long_description = """Ported the Thomas/LIS dailydigest parser code from C/ICON to simple python.""",
     #
     #This next part it for the Cheese Shop, look a little down the page.